@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+from os import environ
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "price_m2.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -108,6 +110,88 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Resultados de `price_m2.cache.CachedPriceM2Service`. Las entradas no
+    # expiran por tiempo: se invalidan con cada nueva versión de los datos y
+    # LocMemCache descarta las menos usadas al superar MAX_ENTRIES.
+    "price_m2": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "price-m2",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 10000, "CULL_FREQUENCY": 10},
+    },
+}
+
+PRICE_M2_CACHE_ALIAS = "price_m2"
+
+# Segundos que cada proceso reutiliza la versión de datos antes de volver
+# a consultarla en db. Ver `price_m2.dataset_version`.
+PRICE_M2_DATASET_VERSION_TTL = 5
+
+# Motor de agregación de la API de price_m2:
+#   * "db": lee `CatastroResumen` de la db, con el caché `PRICE_M2_CACHE_ALIAS`.
+#   * "columnar": carga los `CatastroInfo` en memoria en cada proceso y no
+#     consulta la db por request. Ver `price_m2.columnar`.
+PRICE_M2_ENGINE = "db"
+
+# Directorio de los snapshots del motor "columnar" (`None` para no usarlos).
+# `price-m2_pull-prices-to-db` escribe un snapshot por versión de datos y los
+# procesos de la API lo abren con mmap, compartiendo una única copia en memoria.
+PRICE_M2_SNAPSHOT_DIR = None
+
+# Sirve los endpoints de consulta con las vistas async de `price_m2.async_views`
+# (ver `price_m2.urls`). Se activa al servir la API con ASGI (`construction.asgi`).
+PRICE_M2_ASYNC_VIEWS = False
+
+# Alias de `DATABASES` de las réplicas de lectura de la API. Las lecturas de las
+# vistas de consulta usan una réplica al día con la versión vigente de los datos
+# y el resto de las consultas usan `default`. Ver `price_m2.replicas`.
+PRICE_M2_DB_REPLICAS = []
+DATABASE_ROUTERS = ["price_m2.replicas.ReplicaRouter"]
+
+# Segundos que un cliente, CDN o reverse proxy puede usar una respuesta de
+# consulta sin revalidarla. Luego la revalida con el ETag, que cambia con la
+# versión de los datos. Ver `price_m2.http_cache`.
+PRICE_M2_HTTP_CACHE_MAX_AGE = 300
+
+# Instrumentación de la API (ver `price_m2.metrics`): las métricas se exponen
+# en formato Prometheus en `/metrics`, sólo para las IPs de la lista. Detrás
+# de un reverse proxy, la IP del cliente se toma de `X-Forwarded-For` sólo si
+# el request llega de uno de `PRICE_M2_METRICS_TRUSTED_PROXIES`. Con
+# `PRICE_M2_SERVER_TIMING` cada respuesta incluye el header `Server-Timing`
+# con la duración de sus etapas y de sus consultas a la db.
+PRICE_M2_METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+PRICE_M2_METRICS_TRUSTED_PROXIES = []
+PRICE_M2_SERVER_TIMING = False
+
+# Reglas de calidad de los `CatastroInfo` (ver `price_m2.quality`): las filas
+# con `valor_suelo` menor a `min_valor_suelo` o con superficies negativas no
+# se agregan. Con `trim` ("iqr" o "percentile") se descartan además los precios
+# atípicos de cada código postal y uso de construcción al reconstruir el
+# resumen; las llaves con menos de `trim_min_elements` filas no se recortan.
+PRICE_M2_QUALITY_RULES = {
+    "min_valor_suelo": 1.0,
+    "non_negative_surfaces": True,
+    "trim": None,
+    "iqr_factor": 1.5,
+    "trim_percentiles": (0.01, 0.99),
+    "trim_min_elements": 10,
+}
+
+# Directorio donde `price-m2_pull-prices-to-db` guarda los archivos descargados.
+PRICE_M2_DOWNLOAD_CACHE_DIR = (
+    Path(environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "price-m2"
+)
+
+# Segundos de espera de la conexión y de cada lectura de esas descargas.
+PRICE_M2_DOWNLOAD_TIMEOUT = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
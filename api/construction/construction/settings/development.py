@@ -8,3 +8,7 @@ DATABASES = {
         "NAME": BASE_DIR / "db.sqlite3",
     }
 }
+
+# SQLite crea los índices sin las columnas INCLUDE (v.g., el índice de
+# `price_m2.models.CatastroInfo`), que sólo son necesarias en PostgreSQL.
+SILENCED_SYSTEM_CHECKS = ["models.W040"]
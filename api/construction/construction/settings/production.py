@@ -14,5 +14,98 @@ DATABASES = {
         "PASSWORD": environ["PRICE_M2_DB_PASSWORD"],
         "HOST": environ["PRICE_M2_DB_HOST"],
         "PORT": environ["PRICE_M2_DB_PORT"],
+        "CONN_MAX_AGE": int(environ.get("PRICE_M2_DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        # Detrás de pgbouncer en modo transaction los cursores del lado del
+        # servidor (v.g., de `QuerySet.iterator`) no sobreviven entre queries.
+        "DISABLE_SERVER_SIDE_CURSORS": (
+            environ.get("PRICE_M2_DB_PGBOUNCER") == "1"
+        ),
     }
 }
+
+# Pool de conexiones por proceso (ver `price_m2.postgresql_pool`), también con
+# ASGI: `PRICE_M2_DB_POOL_MAX_SIZE` conexiones, esperando hasta
+# `PRICE_M2_DB_POOL_TIMEOUT` segundos por una libre. Con "0" no se usa el pool
+# y cada thread mantiene su conexión `PRICE_M2_DB_CONN_MAX_AGE` segundos.
+PRICE_M2_DB_POOL_MAX_SIZE = int(environ.get("PRICE_M2_DB_POOL_MAX_SIZE", "10"))
+if PRICE_M2_DB_POOL_MAX_SIZE:
+    DATABASES["default"].update(
+        {
+            "ENGINE": "price_m2.postgresql_pool",
+            # La conexión vuelve al pool al final de cada request.
+            "CONN_MAX_AGE": 0,
+            "OPTIONS": {
+                "pool": {
+                    "max_size": PRICE_M2_DB_POOL_MAX_SIZE,
+                    "timeout": float(
+                        environ.get("PRICE_M2_DB_POOL_TIMEOUT", "30")
+                    ),
+                }
+            },
+        }
+    )
+
+# Réplicas de lectura: "host[:port]" separados por comas, con las mismas
+# credenciales y configuración que `default`. Ver settings.base.
+for index, replica in enumerate(
+    filter(None, environ.get("PRICE_M2_DB_REPLICA_HOSTS", "").split(","))
+):
+    host, _, port = replica.strip().partition(":")
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    PRICE_M2_DB_REPLICAS.append(f"replica_{index}")
+
+# Permite usar un backend compartido (v.g., redis o memcached) para el caché de
+# price_m2 en lugar del LocMemCache por proceso.
+if "PRICE_M2_CACHE_BACKEND" in environ:
+    CACHES["price_m2"] = {
+        "BACKEND": environ["PRICE_M2_CACHE_BACKEND"],
+        "LOCATION": environ.get("PRICE_M2_CACHE_LOCATION", ""),
+        "TIMEOUT": None,
+    }
+
+# Motor de agregación: "db" (por defecto) o "columnar", y directorio de los
+# snapshots del motor "columnar". Ver settings.base.
+PRICE_M2_ENGINE = environ.get("PRICE_M2_ENGINE", PRICE_M2_ENGINE)
+PRICE_M2_SNAPSHOT_DIR = environ.get("PRICE_M2_SNAPSHOT_DIR")
+
+# "1" al servir la API con ASGI (workers de uvicorn). Ver settings.base.
+PRICE_M2_ASYNC_VIEWS = environ.get("PRICE_M2_ASYNC_VIEWS") == "1"
+
+# IPs que pueden leer `/metrics` (v.g., la del scraper de Prometheus) e IPs de
+# los reverse proxies de confianza, separadas por comas, y "1" para agregar el
+# header `Server-Timing` a las respuestas. Ver settings.base.
+if "PRICE_M2_METRICS_ALLOWED_IPS" in environ:
+    PRICE_M2_METRICS_ALLOWED_IPS = environ[
+        "PRICE_M2_METRICS_ALLOWED_IPS"
+    ].split(",")
+PRICE_M2_METRICS_TRUSTED_PROXIES = list(
+    filter(
+        None, environ.get("PRICE_M2_METRICS_TRUSTED_PROXIES", "").split(",")
+    )
+)
+PRICE_M2_SERVER_TIMING = environ.get("PRICE_M2_SERVER_TIMING") == "1"
+
+# Mínimo de `valor_suelo` y recorte de precios atípicos ("iqr" o
+# "percentile") de las reglas de calidad. Ver settings.base.
+PRICE_M2_QUALITY_RULES = {
+    **PRICE_M2_QUALITY_RULES,
+    "min_valor_suelo": float(
+        environ.get(
+            "PRICE_M2_MIN_VALOR_SUELO",
+            PRICE_M2_QUALITY_RULES["min_valor_suelo"],
+        )
+    ),
+    "trim": environ.get("PRICE_M2_QUALITY_TRIM") or None,
+}
+
+# Segundos de espera de las descargas de `price-m2_pull-prices-to-db`. Ver
+# settings.base.
+PRICE_M2_DOWNLOAD_TIMEOUT = float(
+    environ.get("PRICE_M2_DOWNLOAD_TIMEOUT", PRICE_M2_DOWNLOAD_TIMEOUT)
+)
@@ -0,0 +1,17 @@
+from os import environ
+
+from .development import *
+
+# Ejecuta los tests con PostgreSQL, v.g., los de `TableSwapReplace` y
+# `CopyWriter`, que se omiten con SQLite:
+# manage.py test --settings construction.settings.test_postgresql
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": environ.get("PRICE_M2_DB_NAME", "price_m2"),
+        "USER": environ.get("PRICE_M2_DB_USER", "postgres"),
+        "PASSWORD": environ.get("PRICE_M2_DB_PASSWORD", ""),
+        "HOST": environ.get("PRICE_M2_DB_HOST", "localhost"),
+        "PORT": environ.get("PRICE_M2_DB_PORT", "5432"),
+    }
+}
@@ -17,6 +17,7 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import include, path
+from price_m2.metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -24,4 +25,5 @@ urlpatterns = [
     # los cambios de versión de la api.
     # Sugerencia: path("api/v1/", include("price_m2.urls")),
     path("price-m2/", include("price_m2.urls")),
+    path("metrics", metrics_view),
 ]
@@ -1,6 +1,13 @@
 from django.contrib import admin
 
-from .models import Alcaldia, CatastroInfo, UsoConstruccion
+from .models import (
+    Alcaldia,
+    CatastroImport,
+    CatastroInfo,
+    CatastroResumen,
+    DatasetVersion,
+    UsoConstruccion,
+)
 
 
 @admin.register(Alcaldia)
@@ -16,3 +23,18 @@ class UsoConstruccionAdmin(admin.ModelAdmin):
 @admin.register(CatastroInfo)
 class CatastroInfoAdmin(admin.ModelAdmin):
     list_display = [f.name for f in CatastroInfo._meta.fields]
+
+
+@admin.register(CatastroResumen)
+class CatastroResumenAdmin(admin.ModelAdmin):
+    list_display = [f.name for f in CatastroResumen._meta.fields]
+
+
+@admin.register(DatasetVersion)
+class DatasetVersionAdmin(admin.ModelAdmin):
+    list_display = [f.name for f in DatasetVersion._meta.fields]
+
+
+@admin.register(CatastroImport)
+class CatastroImportAdmin(admin.ModelAdmin):
+    list_display = [f.name for f in CatastroImport._meta.fields]
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
     OpenApiExample,
@@ -5,18 +7,40 @@ from drf_spectacular.utils import (
     OpenApiResponse,
     extend_schema,
 )
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
-from .services import PriceM2Service, ServiceError
+from .cache import CachedPriceM2Service
+from .columnar import ColumnarPriceM2Service
+from .constants import AGGREGATE_TYPES, BATCH_AGGREGATE_LIMIT
+from .http_cache import dataset_cached
+from .metrics import stage
+from .replicas import read_from_replica
+from .serializers import BatchAggregateSerializer
+from .services import ServiceError
+
+
+def get_price_m2_service():
+    """Retorna el `PriceM2Service` del motor `settings.PRICE_M2_ENGINE`."""
+    match settings.PRICE_M2_ENGINE:
+        case "db":
+            return CachedPriceM2Service()
+        case "columnar":
+            return ColumnarPriceM2Service()
+        case engine:
+            raise ImproperlyConfigured(
+                f"PRICE_M2_ENGINE '{engine}' no soportado. Valores válidos: db, columnar."
+            )
 
 
 @extend_schema(
     summary="Cálculo del precio agregado por m2.",
     description=(
         "Dado un código postal y un tipo de construcción,"
-        " se calcula el precio por m2 agregado (promedio, máximo o mínimo)"
+        " se calcula el precio por m2 agregado (promedio, máximo, mínimo,"
+        " percentiles, desviación estándar o histograma)"
         " de la alcaldía Álvaro Obregón del Gobierno de la Ciudad de México."
     ),
     responses={
@@ -63,6 +87,49 @@ from .services import PriceM2Service, ServiceError
                     },
                     summary='Ejemplo de salida con la agregación "min"',
                 ),
+                OpenApiExample(
+                    name="respponse_histogram",
+                    value={
+                        "status": True,
+                        "payload": {
+                            "type": "histogram",
+                            "price_unit": [
+                                {"from": 1250, "to": 2885, "count": 40},
+                                {"from": 2885, "to": 4520, "count": 20},
+                            ],
+                            "price_unit_construction": [
+                                {"from": 2120, "to": 3620, "count": 35},
+                                {"from": 3620, "to": 5120, "count": 25},
+                            ],
+                            "elements": 60,
+                        },
+                    },
+                    summary=(
+                        'Ejemplo de salida con la agregación "histogram"'
+                        " (con 2 intervalos)"
+                    ),
+                ),
+                OpenApiExample(
+                    name="respponse_several",
+                    value={
+                        "status": True,
+                        "payload": [
+                            {
+                                "type": "max",
+                                "price_unit": 4520,
+                                "price_unit_construction": 5120,
+                                "elements": 80,
+                            },
+                            {
+                                "type": "min",
+                                "price_unit": 1250,
+                                "price_unit_construction": 2120,
+                                "elements": 80,
+                            },
+                        ],
+                    },
+                    summary='Ejemplo de salida con las agregaciones "max,min"',
+                ),
             ],
         ),
         400: OpenApiResponse(
@@ -107,15 +174,31 @@ from .services import PriceM2Service, ServiceError
         ),
         OpenApiParameter(
             name="aggregate",
-            description="Agregación usada para la evaluación. Debe ser uno de los siguientes valores: avg, max o min.",
+            description=(
+                "Agregación usada para la evaluación. Debe ser uno de los"
+                f" siguientes valores: {', '.join(AGGREGATE_TYPES)}. Varias"
+                " agregaciones separadas por comas, o `all` para todas, se"
+                " evalúan juntas y retornan la lista de sus resultados."
+            ),
             required=True,
             type=str,
-            pattern="^avg|max|min$",
+            pattern=(
+                f"^(all|({'|'.join(AGGREGATE_TYPES)})"
+                f"(,({'|'.join(AGGREGATE_TYPES)}))*)$"
+            ),
             location=OpenApiParameter.PATH,
             examples=[
                 OpenApiExample(name="Promedio ", value="avg"),
                 OpenApiExample(name="Máximo ", value="max"),
                 OpenApiExample(name="Mínimo ", value="min"),
+                OpenApiExample(name="Mediana ", value="median"),
+                OpenApiExample(name="Percentil 90 ", value="p90"),
+                OpenApiExample(name="Desviación estándar ", value="stddev"),
+                OpenApiExample(name="Histograma ", value="histogram"),
+                OpenApiExample(
+                    name="Promedio, máximo y mínimo ", value="avg,max,min"
+                ),
+                OpenApiExample(name="Todas ", value="all"),
             ],
         ),
         OpenApiParameter(
@@ -137,7 +220,9 @@ from .services import PriceM2Service, ServiceError
         ),
     ],
 )
+@dataset_cached
 @api_view(["GET"])
+@read_from_replica
 def aggregated_price_by_m2(request, zip_code=None, aggregate=None):
     if zip_code is None:
         raise ValidationError("Path-parameter `zip_code` nulo.")
@@ -145,34 +230,183 @@ def aggregated_price_by_m2(request, zip_code=None, aggregate=None):
     if aggregate is None:
         raise ValidationError("Path-parameter `aggregate` nulo.")
 
+    with stage("parse"):
+        construction_type = parse_construction_type(request)
+        aggregates = parse_aggregates(aggregate)
+
+    price_m2_service = get_price_m2_service()
+
     try:
-        construction_type = int(request.GET.get("construction_type"))
+        with stage("service"):
+            if aggregates is None:
+                payload = aggregate_payload(
+                    price_m2_service.calculate(
+                        zip_code=zip_code,
+                        aggregate=aggregate,
+                        construction_type=construction_type,
+                    )
+                )
+            else:
+                payload = [
+                    aggregate_payload(price_m2_result)
+                    for price_m2_result in price_m2_service.calculate_aggregates(
+                        zip_code=zip_code,
+                        aggregates=aggregates,
+                        construction_type=construction_type,
+                    )
+                ]
+    except ServiceError as error:
+        raise ValidationError(str(error)) from error
+
+    return Response({"status": True, "payload": payload})
+
+
+def parse_construction_type(request) -> int:
+    try:
+        return int(request.GET.get("construction_type"))
     except (ValueError, TypeError) as error:
         raise ValidationError(
             "Query-parameter `construction_type` inválido: Uso: '?construction_type={1-7}'"
         ) from error
 
-    price_m2_service = PriceM2Service()
 
-    try:
-        price_m2_result = price_m2_service.calculate(
-            zip_code=zip_code,
-            aggregate=aggregate,
-            construction_type=construction_type,
-        )
-    except ServiceError as error:
-        raise ValidationError(str(error)) from error
+def parse_aggregates(aggregate: str):
+    """Retorna las agregaciones del path-parameter `aggregate` cuando son varias, o `None`.
+
+    `all` o varias agregaciones separadas por comas se evalúan juntas sobre el
+    mismo resumen, y el payload es la lista de sus resultados. Las repetidas
+    se evalúan una vez: `avg,avg` es la lista con el resultado de `avg`.
+    """
+    if aggregate == "all":
+        return list(AGGREGATE_TYPES)
+
+    if "," not in aggregate:
+        return None
+    return list(dict.fromkeys(aggregate.split(",")))
 
-    return Response(
-        {
-            "status": True,
-            "payload": {
-                "type": price_m2_result["type"],
-                "price_unit": price_m2_result["price_unit"],
-                "price_unit_construction": price_m2_result[
-                    "price_unit_construction"
-                ],
-                "elements": price_m2_result["elements"],
+
+def aggregate_payload(price_m2_result):
+    return {
+        "type": price_m2_result["type"],
+        "price_unit": price_m2_result["price_unit"],
+        "price_unit_construction": price_m2_result["price_unit_construction"],
+        "elements": price_m2_result["elements"],
+    }
+
+
+@extend_schema(
+    summary="Cálculo del precio agregado por m2 para varios códigos postales.",
+    description=(
+        "Evalúa en un solo request varias consultas (código postal, tipo de"
+        " construcción y agregación) como `zip-codes/{zip_code}/aggregate/{aggregate}`."
+        f" Admite hasta {BATCH_AGGREGATE_LIMIT} consultas. Los resultados se"
+        " retornan en el orden de las consultas, junto con la consulta que los"
+        " generó. Una consulta con error no afecta a las demás: su resultado"
+        " tiene `status` false y sus `errors`."
+    ),
+    request=BatchAggregateSerializer,
+    responses={
+        200: OpenApiResponse(
+            OpenApiTypes.OBJECT,
+            description="Precio por m2 agregado de cada consulta",
+            examples=[
+                OpenApiExample(
+                    name="response_batch",
+                    value={
+                        "status": True,
+                        "payload": [
+                            {
+                                "zip_code": "1430",
+                                "construction_type": 4,
+                                "aggregate": "avg",
+                                "status": True,
+                                "payload": {
+                                    "type": "avg",
+                                    "price_unit": 1420,
+                                    "price_unit_construction": 3120,
+                                    "elements": 100,
+                                },
+                            },
+                            {
+                                "zip_code": "99999",
+                                "construction_type": 4,
+                                "aggregate": "max",
+                                "status": False,
+                                "errors": [
+                                    "No se halló el código zip solicitado"
+                                ],
+                            },
+                        ],
+                    },
+                    summary="Ejemplo de salida con una consulta con error",
+                ),
+            ],
+        ),
+        400: OpenApiResponse(
+            OpenApiTypes.OBJECT,
+            description="Error en el formato de las consultas",
+            examples=[
+                OpenApiExample(
+                    name="error_aggregate",
+                    summary="Error response on aggregate",
+                    value={
+                        "status": False,
+                        "errors": {
+                            "queries": [
+                                {"aggregate": ['"sum" is not a valid choice.']}
+                            ]
+                        },
+                    },
+                ),
+            ],
+        ),
+    },
+    examples=[
+        OpenApiExample(
+            name="request_batch",
+            request_only=True,
+            value={
+                "queries": [
+                    {
+                        "zip_code": "1430",
+                        "construction_type": 4,
+                        "aggregate": "avg",
+                    },
+                    {
+                        "zip_code": "99999",
+                        "construction_type": 4,
+                        "aggregate": "max",
+                    },
+                ]
             },
-        }
+        ),
+    ],
+)
+@api_view(["POST"])
+# Es una consulta: no requiere autenticación aunque use POST.
+@permission_classes([AllowAny])
+@read_from_replica
+def aggregated_prices_by_m2(request):
+    serializer = BatchAggregateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    queries = serializer.validated_data["queries"]
+
+    price_m2_service = get_price_m2_service()
+
+    price_m2_results = price_m2_service.calculate_many(
+        (query["zip_code"], query["aggregate"], query["construction_type"])
+        for query in queries
     )
+
+    payload = []
+    for query, price_m2_result in zip(queries, price_m2_results):
+        if isinstance(price_m2_result, ServiceError):
+            payload.append(
+                {**query, "status": False, "errors": [str(price_m2_result)]}
+            )
+        else:
+            payload.append(
+                {**query, "status": True, "payload": price_m2_result}
+            )
+
+    return Response({"status": True, "payload": payload})
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class PriceM2Config(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "price_m2"
+
+    def ready(self):
+        from .metrics import install_query_metrics
+
+        connection_created.connect(install_query_metrics)
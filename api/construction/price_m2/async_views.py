@@ -0,0 +1,149 @@
+"""Versiones async de los endpoints de consulta, para servir la API con ASGI.
+
+`urls.py` las monta antes que las vistas de DRF cuando
+`settings.PRICE_M2_ASYNC_VIEWS` está activo: con workers de uvicorn cada
+worker atiende muchos requests concurrentes mientras esperan a la db.
+
+Retornan las mismas respuestas que `api_views` y `viewsets`; las vistas de
+DRF se mantienen como documentación de la API (drf-spectacular) y para WSGI.
+"""
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+
+from .api_views import (
+    aggregate_payload,
+    get_price_m2_service,
+    parse_aggregates,
+    parse_construction_type,
+)
+from .constants import (
+    ALCALDIA_ACTUAL_LIMIT,
+    ALCALDIA_LIMIT_WARNING,
+    USO_CONSTRUCCION_ACTUAL_LIMIT,
+    USO_CONSTRUCCION_LIMIT_WARNING,
+)
+from .http_cache import dataset_cached
+from .metrics import stage
+from .models import Alcaldia, UsoConstruccion
+from .replicas import read_from_replica
+from .serializers import (
+    AlcaldiaCompletionSerializer,
+    UsoConstruccionCompletionSerializer,
+)
+from .services import ServiceError
+from .viewsets import warn_completion_limit
+
+
+@require_GET
+@dataset_cached
+@read_from_replica
+async def aggregated_price_by_m2(request, zip_code, aggregate):
+    price_m2_service = get_price_m2_service()
+
+    try:
+        with stage("parse"):
+            construction_type = parse_construction_type(request)
+            aggregates = parse_aggregates(aggregate)
+
+        with stage("service"):
+            if aggregates is None:
+                payload = aggregate_payload(
+                    await price_m2_service.acalculate(
+                        zip_code=zip_code,
+                        aggregate=aggregate,
+                        construction_type=construction_type,
+                    )
+                )
+            else:
+                payload = [
+                    aggregate_payload(price_m2_result)
+                    for price_m2_result in await price_m2_service.acalculate_aggregates(
+                        zip_code=zip_code,
+                        aggregates=aggregates,
+                        construction_type=construction_type,
+                    )
+                ]
+    except ValidationError as error:
+        return JsonResponse(
+            {"status": False, "errors": error.detail}, status=400
+        )
+    except ServiceError as error:
+        return JsonResponse(
+            {"status": False, "errors": [str(error)]}, status=400
+        )
+
+    with stage("render"):
+        return JsonResponse({"status": True, "payload": payload})
+
+
+@require_GET
+@dataset_cached
+@read_from_replica
+async def alcaldia_completion_list(request):
+    alcaldias = [
+        alcaldia
+        async for alcaldia in Alcaldia.objects.only("id", "name")[
+            :ALCALDIA_ACTUAL_LIMIT
+        ]
+    ]
+    warn_completion_limit("Alcaldia", len(alcaldias), ALCALDIA_LIMIT_WARNING)
+
+    return JsonResponse(
+        AlcaldiaCompletionSerializer(alcaldias, many=True).data, safe=False
+    )
+
+
+@require_GET
+@dataset_cached
+@read_from_replica
+async def alcaldia_completion_detail(request, pk):
+    return await _completion_detail(
+        Alcaldia.objects.only("id", "name"), AlcaldiaCompletionSerializer, pk
+    )
+
+
+@require_GET
+@dataset_cached
+@read_from_replica
+async def uso_construccion_completion_list(request):
+    usos = [
+        uso
+        async for uso in UsoConstruccion.objects.only("id", "name")[
+            :USO_CONSTRUCCION_ACTUAL_LIMIT
+        ]
+    ]
+    warn_completion_limit(
+        "UsoConstruccion", len(usos), USO_CONSTRUCCION_LIMIT_WARNING
+    )
+
+    return JsonResponse(
+        UsoConstruccionCompletionSerializer(usos, many=True).data, safe=False
+    )
+
+
+@require_GET
+@dataset_cached
+@read_from_replica
+async def uso_construccion_completion_detail(request, pk):
+    return await _completion_detail(
+        UsoConstruccion.objects.only("id", "name"),
+        UsoConstruccionCompletionSerializer,
+        pk,
+    )
+
+
+async def _completion_detail(queryset, serializer_class, pk):
+    try:
+        instance = await queryset.aget(pk=pk)
+    except (queryset.model.DoesNotExist, ValueError):
+        # Mismo mensaje que `get_object_or_404` de DRF.
+        return JsonResponse(
+            {
+                "detail": f"No {queryset.model._meta.object_name} matches the given query."
+            },
+            status=404,
+        )
+
+    return JsonResponse(serializer_class(instance).data)
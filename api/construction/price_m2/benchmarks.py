@@ -0,0 +1,217 @@
+"""Utilidades de los comandos de benchmark (`price-m2_benchmark-*`).
+
+* `synthetic_catastro_rows` genera filas del CSV de catastro con
+  distribuciones similares a las de los datos publicados por CDMX, a la
+  escala que se necesite (v.g., de 100 mil a 20 millones de filas).
+* `time_calls` mide la latencia de cada llamada a una función.
+* `latency_summary` resume las latencias medidas con sus percentiles.
+* `save_results` registra los resultados como JSON, junto con el commit y el
+  entorno, para compararlos entre commits con `price-m2_benchmark-compare`.
+"""
+
+import csv
+import itertools
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.db import connection
+
+from .models import CatastroInfo
+from .utils import batched
+
+# Columnas del CSV de catastro usadas por la carga.
+CATASTRO_CSV_FIELDNAMES = (
+    "codigo_postal",
+    "uso_construccion",
+    "superficie_terreno",
+    "superficie_construccion",
+    "valor_suelo",
+    "subsidio",
+)
+
+# Proporción aproximada de cada uso de construcción en el catastro.
+USO_CONSTRUCCION_WEIGHTS = {
+    "Habitacional": 70,
+    "Habitacional y comercial": 14,
+    "Sin Zonificación": 5,
+    "Equipamiento": 4,
+    "Centro de barrio": 3,
+    "Industrial": 2,
+    "Áreas verdes": 2,
+}
+
+# Filas generadas por cada llamada a `random.choices`.
+GENERATOR_CHUNK_SIZE = 10000
+
+
+def synthetic_catastro_rows(
+    rows: int,
+    seed: int = 0,
+    zip_codes: int = 150,
+    invalid_ratio: float = 0.0,
+):
+    """Genera `rows` filas del CSV de catastro (tuplas de strings, ver `CATASTRO_CSV_FIELDNAMES`).
+
+    * `codigo_postal`: `zip_codes` códigos postales con una popularidad tipo
+      Zipf, como las colonias densas frente a las residenciales.
+    * `uso_construccion`: según `USO_CONSTRUCCION_WEIGHTS`.
+    * `superficie_terreno`: log-normal, con mediana de unos 180 m2.
+    * `superficie_construccion`: proporcional al terreno, log-normal.
+    * `valor_suelo`: un valor base por código postal (la zona) con ruido.
+    * `subsidio`: cero en la mayoría de las filas.
+
+    Una fracción `invalid_ratio` de las filas tiene un `valor_suelo` inválido.
+    Las filas se generan bajo demanda: la memoria no depende de `rows`.
+    """
+    generator = random.Random(seed)
+
+    zip_code_values = [f"{1000 + index:05d}" for index in range(zip_codes)]
+    zip_code_weights = list(
+        itertools.accumulate(
+            1 / (rank + 1) ** 0.8 for rank in range(zip_codes)
+        )
+    )
+    zip_code_land_values = {
+        zip_code: generator.lognormvariate(math.log(8), 0.6)
+        for zip_code in zip_code_values
+    }
+    usos = list(USO_CONSTRUCCION_WEIGHTS)
+    uso_weights = list(itertools.accumulate(USO_CONSTRUCCION_WEIGHTS.values()))
+
+    remaining = rows
+    while remaining > 0:
+        size = min(remaining, GENERATOR_CHUNK_SIZE)
+        remaining -= size
+        for zip_code, uso in zip(
+            generator.choices(
+                zip_code_values, cum_weights=zip_code_weights, k=size
+            ),
+            generator.choices(usos, cum_weights=uso_weights, k=size),
+        ):
+            superficie_terreno = generator.lognormvariate(math.log(180), 0.7)
+            superficie_construccion = (
+                superficie_terreno * generator.lognormvariate(0, 0.5)
+            )
+            if generator.random() < invalid_ratio:
+                valor_suelo = "NOT-A-NUMBER"
+            else:
+                valor_suelo = f"{zip_code_land_values[zip_code] * generator.lognormvariate(0, 0.2):.2f}"
+            subsidio = (
+                generator.uniform(1, 50) if generator.random() < 0.3 else 0
+            )
+            yield (
+                zip_code,
+                uso,
+                f"{superficie_terreno:.2f}",
+                f"{superficie_construccion:.2f}",
+                valor_suelo,
+                f"{subsidio:.2f}",
+            )
+
+
+def write_catastro_csv(path, rows) -> int:
+    """Escribe las filas `rows` en el CSV de catastro `path`. Retorna la cantidad de filas."""
+    total = 0
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(CATASTRO_CSV_FIELDNAMES)
+        for batch in batched(rows, GENERATOR_CHUNK_SIZE):
+            writer.writerows(batch)
+            total += len(batch)
+    return total
+
+
+def time_calls(function, arguments) -> dict:
+    """Llama a `function(*args)` con cada elemento de `arguments` y resume sus latencias."""
+    latencies = []
+    start = time.perf_counter()
+    for args in arguments:
+        call_start = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - call_start)
+    return latency_summary(latencies, time.perf_counter() - start)
+
+
+def latency_summary(latencies, elapsed=None) -> dict:
+    """Resume las latencias (en segundos) en milisegundos, con sus percentiles.
+
+    Con `elapsed` (segundos de la medición) incluye el throughput.
+    """
+    latencies = sorted(latencies)
+    summary = {"count": len(latencies)}
+    if not latencies:
+        return summary
+
+    summary.update(
+        {
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "p50_ms": _percentile(latencies, 0.5) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+        }
+    )
+    if elapsed:
+        summary["throughput_per_s"] = len(latencies) / elapsed
+    return summary
+
+
+def format_summary(summary: dict) -> str:
+    """Formatea un resumen de `latency_summary` (o un tiempo `elapsed_ms`) en una línea."""
+    if "elapsed_ms" in summary:
+        return f"{summary['elapsed_ms']:.1f}ms"
+    if not summary["count"]:
+        return "sin llamadas"
+    line = (
+        f"n={summary['count']} p50={summary['p50_ms']:.3f}ms"
+        f" p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms"
+    )
+    if "throughput_per_s" in summary:
+        line += f" ({summary['throughput_per_s']:,.0f}/s)"
+    return line
+
+
+def _percentile(values, fraction):
+    # Percentil por rango más cercano, sobre `values` ordenados.
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def save_results(path, benchmark: str, parameters: dict, results: dict):
+    """Registra los resultados del benchmark en el archivo JSON `path`."""
+    document = {
+        "benchmark": benchmark,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "catastro_rows": CatastroInfo.objects.count(),
+        },
+        "parameters": parameters,
+        "results": results,
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(document, indent=2, ensure_ascii=False))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
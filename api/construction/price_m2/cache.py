@@ -0,0 +1,178 @@
+"""Caché de resultados de `PriceM2Service` usando el cache-framework de Django.
+
+El backend se configura con el alias `settings.PRICE_M2_CACHE_ALIAS` dentro de
+`settings.CACHES`. Por defecto es un `LocMemCache` acotado por `MAX_ENTRIES`,
+que descarta primero las entradas usadas menos recientemente (LRU).
+
+Las llaves se versionan con `dataset_version.dataset_version_for(zip_code)`,
+de modo que una nueva carga invalida todas las entradas anteriores sin
+recorrerlas, y una sincronización incremental sólo invalida las entradas de
+los códigos postales que modificó.
+"""
+
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .dataset_version import dataset_version_for
+from .metrics import record_cache, stage
+from .services import PriceM2Service, ServiceError
+
+
+def price_m2_cache():
+    return caches[settings.PRICE_M2_CACHE_ALIAS]
+
+
+def calculate_cache_key(
+    zip_code: str, aggregate: str, construction_type: int
+) -> str:
+    # `zip_code` viene del path de la url: se escapa para que la llave sea
+    # válida en cualquier backend (v.g., memcached no admite espacios).
+    return (
+        f"calculate:{quote(zip_code, safe='')}:{aggregate}:{construction_type}"
+    )
+
+
+class CachedPriceM2Service(PriceM2Service):
+    """`PriceM2Service` con caché de resultados por versión de datos.
+
+    Sólo se almacenan los resultados exitosos; los `ServiceError` se vuelven
+    a evaluar en cada llamada.
+    """
+
+    def calculate(self, zip_code: str, aggregate: str, construction_type: int):
+        cache = price_m2_cache()
+        key = calculate_cache_key(zip_code, aggregate, construction_type)
+        with stage("cache"):
+            version = dataset_version_for(zip_code)
+            result = cache.get(key, version=version)
+        record_cache(hits=int(result is not None), misses=int(result is None))
+
+        if result is None:
+            result = super().calculate(
+                zip_code=zip_code,
+                aggregate=aggregate,
+                construction_type=construction_type,
+            )
+            cache.set(key, result, version=version)
+
+        return result
+
+    def calculate_aggregates(
+        self, zip_code: str, aggregates, construction_type: int
+    ):
+        cache = price_m2_cache()
+        aggregates = list(aggregates)
+        keys = {
+            aggregate: calculate_cache_key(
+                zip_code, aggregate, construction_type
+            )
+            for aggregate in aggregates
+        }
+        with stage("cache"):
+            version = dataset_version_for(zip_code)
+            cached = cache.get_many(keys.values(), version=version)
+        missing = [
+            aggregate for aggregate in keys if keys[aggregate] not in cached
+        ]
+        record_cache(hits=len(keys) - len(missing), misses=len(missing))
+        if missing:
+            calculated = super().calculate_aggregates(
+                zip_code, missing, construction_type
+            )
+            entries = {
+                keys[aggregate]: result
+                for aggregate, result in zip(missing, calculated)
+            }
+            cache.set_many(entries, version=version)
+            cached.update(entries)
+
+        return [cached[keys[aggregate]] for aggregate in aggregates]
+
+    async def acalculate(
+        self, zip_code: str, aggregate: str, construction_type: int
+    ):
+        cache = price_m2_cache()
+        key = calculate_cache_key(zip_code, aggregate, construction_type)
+        with stage("cache"):
+            version = await sync_to_async(dataset_version_for)(zip_code)
+            result = await cache.aget(key, version=version)
+        record_cache(hits=int(result is not None), misses=int(result is None))
+
+        if result is None:
+            result = await super().acalculate(
+                zip_code=zip_code,
+                aggregate=aggregate,
+                construction_type=construction_type,
+            )
+            await cache.aset(key, result, version=version)
+
+        return result
+
+    async def acalculate_aggregates(
+        self, zip_code: str, aggregates, construction_type: int
+    ):
+        cache = price_m2_cache()
+        aggregates = list(aggregates)
+        keys = {
+            aggregate: calculate_cache_key(
+                zip_code, aggregate, construction_type
+            )
+            for aggregate in aggregates
+        }
+        with stage("cache"):
+            version = await sync_to_async(dataset_version_for)(zip_code)
+            cached = await cache.aget_many(keys.values(), version=version)
+        missing = [
+            aggregate for aggregate in keys if keys[aggregate] not in cached
+        ]
+        record_cache(hits=len(keys) - len(missing), misses=len(missing))
+        if missing:
+            calculated = await super().acalculate_aggregates(
+                zip_code, missing, construction_type
+            )
+            entries = {
+                keys[aggregate]: result
+                for aggregate, result in zip(missing, calculated)
+            }
+            await cache.aset_many(entries, version=version)
+            cached.update(entries)
+
+        return [cached[keys[aggregate]] for aggregate in aggregates]
+
+    def calculate_many(self, queries):
+        cache = price_m2_cache()
+        queries = list(queries)
+        keys = [calculate_cache_key(*query) for query in queries]
+        versions = [
+            dataset_version_for(zip_code) for zip_code, _, _ in queries
+        ]
+
+        # Las llaves se leen con `get_many`, agrupadas por versión: salvo
+        # luego de una sincronización, todas tienen la misma versión.
+        results = [None] * len(queries)
+        for version in set(versions):
+            indexes = [i for i, v in enumerate(versions) if v == version]
+            cached = cache.get_many(
+                [keys[i] for i in indexes], version=version
+            )
+            for i in indexes:
+                results[i] = cached.get(keys[i])
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        record_cache(hits=len(queries) - len(missing), misses=len(missing))
+        if not missing:
+            return results
+
+        calculated = super().calculate_many(queries[i] for i in missing)
+        to_cache = {}
+        for i, result in zip(missing, calculated):
+            results[i] = result
+            if not isinstance(result, ServiceError):
+                to_cache.setdefault(versions[i], {})[keys[i]] = result
+        for version, entries in to_cache.items():
+            cache.set_many(entries, version=version)
+
+        return results
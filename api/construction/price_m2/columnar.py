@@ -0,0 +1,466 @@
+"""Motor de agregación en memoria para `PriceM2Service`.
+
+Se activa con `settings.PRICE_M2_ENGINE = "columnar"`. Cada proceso carga
+una vez los `CatastroInfo` en columnas contiguas (`array.array`) y resuelve
+las agregaciones sin consultar la db en cada request. Los datos se recargan
+cuando cambia `dataset_version.current_dataset_version()`.
+
+Estructura de `ColumnarDataset`:
+    * las filas se ordenan por (`codigo_postal`, `uso_construccion`) y cada
+      llave tiene un índice en `keys`;
+    * por cada precio (`price_unit` y `price_unit_construction`) hay una
+      columna con los valores de todas las llaves, una tras otra, y un índice
+      `offsets` tal que los valores de la llave `i` son
+      `values[offsets[i]:offsets[i + 1]]`;
+    * los valores de cada llave están ordenados, de modo que el mínimo y el
+      máximo son el primer y el último valor del slice.
+
+Sólo se cargan los `CatastroInfo` válidos (ver `price_m2.quality`), con sus
+precios precalculados: son las mismas filas que agrega `CatastroResumen`.
+
+Snapshots: con `settings.PRICE_M2_SNAPSHOT_DIR`, el comando
+`price-m2_pull-prices-to-db` escribe las columnas en un archivo binario por
+versión de datos (`catastro-<stamp>.snapshot`) antes de publicarla, y cada
+proceso de la API lo abre con `mmap` de sólo lectura en lugar de leer la db.
+Los workers de gunicorn comparten así una única copia de las columnas en el
+page cache del sistema operativo. El archivo se escribe con otro nombre y se
+renombra al terminar, por lo que nunca se lee un snapshot incompleto.
+
+Formato del snapshot (en el byte order nativo de la máquina): el header
+`SNAPSHOT_HEADER`, seguido de las secciones de enteros de 8 bytes o floats
+de 8 bytes, en el orden de `ColumnarDataset.write_snapshot`, y al final los
+códigos postales de cada llave separados por "\n".
+"""
+
+import bisect
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from array import array
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .constants import AGGREGATE_TYPES, HISTOGRAM_BINS, PERCENTILES
+from .dataset_version import current_dataset_version
+from .models import CatastroInfo, CatastroResumen, UsoConstruccion
+from .services import (
+    PriceM2Service,
+    ServiceError,
+    construction_type_not_found,
+    histogram_bin,
+    percentile_cont,
+    population_stddev,
+    zip_code_not_found,
+)
+
+# Filas leídas de la db por cada round-trip durante la carga.
+LOAD_CHUNK_SIZE = 10000
+
+PRICE_COLUMNS = ("price_unit", "price_unit_construction")
+
+SNAPSHOT_MAGIC = b"PM2COL01"
+# magic, stamp, cantidad de tipos de construcción, de llaves y de valores de
+# cada columna de `PRICE_COLUMNS`.
+SNAPSHOT_HEADER = struct.Struct("=8s32sqqqq")
+# Cantidad de snapshots que conserva `remove_old_snapshots`: los workers que
+# aún no vieron la última versión siguen usando la anterior.
+SNAPSHOTS_KEPT = 2
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def snapshot_path(directory, stamp: str) -> Path:
+    return Path(directory) / f"catastro-{stamp}.snapshot"
+
+
+class PriceColumn:
+    """Valores de un precio agrupados por llave. Ver el docstring del módulo."""
+
+    __slots__ = ("values", "offsets")
+
+    def __init__(self):
+        self.values = array("d")
+        self.offsets = array("q", [0])
+
+    def append_group(self, values):
+        values.sort()
+        self.values.extend(values)
+        self.offsets.append(len(self.values))
+
+    def group(self, index: int) -> memoryview:
+        """Retorna los valores ordenados de la llave `index`, sin copiarlos."""
+        return memoryview(self.values)[
+            self.offsets[index] : self.offsets[index + 1]
+        ]
+
+
+class ColumnarDataset:
+    """Los `CatastroInfo` de una versión de datos en columnas en memoria."""
+
+    def __init__(self, version: str, construction_types):
+        self.version = version
+        # Registro de los `UsoConstruccion` válidos.
+        self.construction_types = frozenset(construction_types)
+        self.zip_codes = set()
+        self.keys = {}
+        self.elements = array("q")
+        self.columns = {name: PriceColumn() for name in PRICE_COLUMNS}
+        # Estadísticas O(n) ya calculadas por `resumen`, por (campo, llave):
+        # los datos de la versión no cambian.
+        self.stats = {}
+
+    @classmethod
+    def load(cls, version: str):
+        """Lee los `CatastroInfo` válidos ordenados por llave y construye las columnas."""
+        dataset = cls(
+            version, UsoConstruccion.objects.values_list("id", flat=True)
+        )
+        rows = (
+            CatastroInfo.objects.filter(quality=CatastroInfo.Quality.VALID)
+            .order_by("codigo_postal", "uso_construccion_id")
+            .values_list(
+                "codigo_postal",
+                "uso_construccion_id",
+                "price_unit",
+                "price_unit_construction",
+            )
+            .iterator(chunk_size=LOAD_CHUNK_SIZE)
+        )
+
+        key = None
+        elements = 0
+        price_units = []
+        price_unit_constructions = []
+        for row in rows:
+            row_key = row[0], row[1]
+            if row_key != key:
+                if key is not None:
+                    dataset._append_group(
+                        key, elements, price_units, price_unit_constructions
+                    )
+                key = row_key
+                elements = 0
+                price_units = []
+                price_unit_constructions = []
+
+            _, _, price_unit, price_unit_construction = row
+            elements += 1
+            # Como los NULL en las agregaciones de SQL.
+            if price_unit is not None:
+                price_units.append(price_unit)
+            if price_unit_construction is not None:
+                price_unit_constructions.append(price_unit_construction)
+
+        if key is not None:
+            dataset._append_group(
+                key, elements, price_units, price_unit_constructions
+            )
+
+        return dataset
+
+    def _append_group(
+        self, key, elements, price_units, price_unit_constructions
+    ):
+        self.keys[key] = len(self.elements)
+        self.zip_codes.add(key[0])
+        self.elements.append(elements)
+        self.columns["price_unit"].append_group(price_units)
+        self.columns["price_unit_construction"].append_group(
+            price_unit_constructions
+        )
+
+    def write_snapshot(self, directory) -> Path:
+        """Escribe el snapshot de la versión en `directory` y retorna su ruta."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = snapshot_path(directory, self.version)
+        columns = [self.columns[name] for name in PRICE_COLUMNS]
+
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC,
+            self.version.encode(),
+            len(self.construction_types),
+            len(self.keys),
+            *(len(column.values) for column in columns),
+        )
+        sections = [
+            array("q", sorted(self.construction_types)),
+            self.elements,
+            array("q", (uso for _, uso in self.keys)),
+        ]
+        for column in columns:
+            sections += [column.offsets, column.values]
+        zip_codes = "\n".join(zip_code for zip_code, _ in self.keys)
+
+        with tempfile.NamedTemporaryFile(
+            dir=directory, prefix=f".{path.name}.", delete=False
+        ) as file:
+            try:
+                file.write(header)
+                for section in sections:
+                    file.write(section)
+                file.write(zip_codes.encode())
+                file.flush()
+                os.fsync(file.fileno())
+            except BaseException:
+                os.unlink(file.name)
+                raise
+        os.replace(file.name, path)
+
+        return path
+
+    @classmethod
+    def open_snapshot(cls, path):
+        """Abre el snapshot `path` con `mmap`, sin copiar las columnas a memoria."""
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < SNAPSHOT_HEADER.size:
+                raise SnapshotError(f"El snapshot '{path}' está incompleto.")
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, stamp, total_types, total_keys, *total_values = (
+            SNAPSHOT_HEADER.unpack_from(mapped)
+        )
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"El archivo '{path}' no es un snapshot.")
+
+        view = memoryview(mapped)
+        offset = SNAPSHOT_HEADER.size
+
+        def section(typecode, length):
+            nonlocal offset
+            end = offset + 8 * length
+            if end > len(view):
+                raise SnapshotError(f"El snapshot '{path}' está incompleto.")
+            data = view[offset:end].cast(typecode)
+            offset = end
+            return data
+
+        dataset = cls(stamp.rstrip(b"\0").decode(), section("q", total_types))
+        dataset.elements = section("q", total_keys)
+        usos = section("q", total_keys)
+        for name, total in zip(PRICE_COLUMNS, total_values):
+            column = dataset.columns[name]
+            column.offsets = section("q", total_keys + 1)
+            column.values = section("d", total)
+
+        zip_codes = bytes(view[offset:]).decode().split("\n")
+        if total_keys:
+            dataset.keys = {
+                key: index for index, key in enumerate(zip(zip_codes, usos))
+            }
+            dataset.zip_codes = set(zip_codes)
+
+        return dataset
+
+    def resumen(
+        self, zip_code: str, construction_type: int, aggregates=AGGREGATE_TYPES
+    ):
+        """Retorna el `CatastroResumen` (sin registrar en db) de la llave, o `None`.
+
+        Sólo calcula los campos que usan `aggregates` (ver
+        `services.aggregate_resumen`). Los valores de cada llave están
+        ordenados: el mínimo, el máximo y los percentiles se leen sin
+        recorrerlos, y la suma, la desviación estándar y el histograma se
+        calculan una sola vez por llave.
+        """
+        index = self.keys.get((zip_code, construction_type))
+        if index is None:
+            return None
+
+        fields = {}
+        for name, column in self.columns.items():
+            values = column.group(index)
+            if not len(values):
+                continue
+            fields[f"{name}_min"] = values[0]
+            fields[f"{name}_max"] = values[-1]
+            for aggregate in aggregates:
+                if aggregate in PERCENTILES:
+                    fields[f"{name}_{aggregate}"] = percentile_cont(
+                        values, PERCENTILES[aggregate]
+                    )
+                elif aggregate in COLUMN_STATS:
+                    field, function = COLUMN_STATS[aggregate]
+                    fields[f"{name}_{field}"] = self._stat(
+                        f"{name}_{field}", index, function, values
+                    )
+
+        return CatastroResumen(
+            codigo_postal=zip_code,
+            uso_construccion_id=construction_type,
+            elements=self.elements[index],
+            **fields,
+        )
+
+    def _stat(self, field: str, index: int, function, values):
+        key = field, index
+        value = self.stats.get(key)
+        if value is None:
+            value = self.stats[key] = function(values)
+        return value
+
+
+def histogram_counts(values) -> list:
+    """Cuenta los `values` (ordenados) de cada intervalo de `histogram_bin`.
+
+    Como `histogram_bin` no decrece con el valor, el inicio de cada intervalo
+    se busca con bisect, sin recorrer los valores.
+    """
+    low, high = values[0], values[-1]
+    starts = [
+        bisect.bisect_left(
+            values, bin, key=lambda value: histogram_bin(value, low, high)
+        )
+        for bin in range(HISTOGRAM_BINS)
+    ]
+    starts.append(len(values))
+    return [end - start for start, end in zip(starts, starts[1:])]
+
+
+# Agregaciones que necesitan recorrer los valores de la llave: campo del
+# resumen y función que lo calcula.
+COLUMN_STATS = {
+    "avg": ("sum", math.fsum),
+    "stddev": ("stddev", population_stddev),
+    "histogram": ("histogram", histogram_counts),
+}
+
+
+_dataset_lock = threading.Lock()
+_dataset = None
+
+
+def columnar_dataset() -> ColumnarDataset:
+    """Retorna el `ColumnarDataset` de la versión vigente de los datos.
+
+    Lo carga la primera vez y lo recarga cuando cambia la versión. Mientras un
+    thread recarga los datos, los demás siguen usando la versión anterior.
+    """
+    global _dataset
+
+    version = current_dataset_version()
+    dataset = _dataset
+    if dataset is not None and dataset.version == version:
+        return dataset
+
+    if not _dataset_lock.acquire(blocking=dataset is None):
+        return dataset
+
+    try:
+        if _dataset is None or _dataset.version != version:
+            _dataset = _load_dataset(version)
+        return _dataset
+    finally:
+        _dataset_lock.release()
+
+
+def _load_dataset(version: str) -> ColumnarDataset:
+    """Abre el snapshot de la versión o, si no existe, carga los datos desde la db."""
+    if settings.PRICE_M2_SNAPSHOT_DIR:
+        path = snapshot_path(settings.PRICE_M2_SNAPSHOT_DIR, version)
+        try:
+            dataset = ColumnarDataset.open_snapshot(path)
+        except FileNotFoundError:
+            logging.warning(
+                "No existe el snapshot %s. Se cargan los datos desde la db.",
+                path,
+            )
+        except SnapshotError as error:
+            logging.warning("%s Se cargan los datos desde la db.", error)
+        else:
+            if dataset.version == version:
+                return dataset
+            logging.warning(
+                "El snapshot %s no es de la versión %s. Se cargan los datos desde la db.",
+                path,
+                version,
+            )
+
+    logging.info("Cargando el dataset columnar (versión %s)", version)
+    return ColumnarDataset.load(version)
+
+
+def write_snapshot(stamp: str) -> Path:
+    """Escribe el snapshot de los `CatastroInfo` actuales con el `stamp` dado.
+
+    Se usa antes de publicar la versión `stamp`, de modo que los procesos de
+    la API encuentren el snapshot apenas vean la nueva versión.
+    """
+    path = ColumnarDataset.load(stamp).write_snapshot(
+        settings.PRICE_M2_SNAPSHOT_DIR
+    )
+    remove_old_snapshots(keep=path)
+    return path
+
+
+def remove_old_snapshots(keep: Path):
+    """Elimina los snapshots anteriores salvo los `SNAPSHOTS_KEPT` más recientes.
+
+    Los procesos que tienen abierto un snapshot eliminado lo siguen leyendo
+    sin problemas: el `mmap` mantiene el archivo hasta que se cierra.
+    """
+    snapshots = sorted(
+        keep.parent.glob("catastro-*.snapshot"),
+        key=lambda path: (path == keep, path.stat().st_mtime),
+        reverse=True,
+    )
+    for path in snapshots[SNAPSHOTS_KEPT:]:
+        path.unlink(missing_ok=True)
+
+
+class ColumnarPriceM2Service(PriceM2Service):
+    """`PriceM2Service` que evalúa las agregaciones sobre `columnar_dataset`.
+
+    Sólo reemplaza la búsqueda del resumen de cada llave, de modo que retorna
+    los mismos resultados y errores que `PriceM2Service`.
+    """
+
+    def _find_resumen(
+        self, zip_code: str, aggregate: str, construction_type: int
+    ):
+        dataset = columnar_dataset()
+        # `aggregate` puede ser una lista separada por comas, ver
+        # `PriceM2Service.calculate_aggregates`.
+        resumen = dataset.resumen(
+            zip_code, construction_type, aggregate.split(",")
+        )
+
+        if resumen is None:
+            if construction_type not in dataset.construction_types:
+                raise construction_type_not_found(
+                    zip_code, aggregate, construction_type
+                )
+            if zip_code not in dataset.zip_codes:
+                raise zip_code_not_found(
+                    zip_code, aggregate, construction_type
+                )
+
+        return resumen
+
+    async def _afind_resumen(
+        self, zip_code: str, aggregate: str, construction_type: int
+    ):
+        # La búsqueda no consulta la db salvo al (re)cargar el dataset, que
+        # debe ejecutarse fuera del event loop.
+        return await sync_to_async(self._find_resumen)(
+            zip_code, aggregate, construction_type
+        )
+
+    def calculate_many(self, queries):
+        results = []
+        for zip_code, aggregate, construction_type in queries:
+            try:
+                results.append(
+                    self.calculate(zip_code, aggregate, construction_type)
+                )
+            except ServiceError as error:
+                results.append(error)
+        return results
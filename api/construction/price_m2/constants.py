@@ -20,3 +20,34 @@ USO_CONSTRUCCION_ACTUAL_LIMIT = 50
 # Mensajes del cálculo de agregación de price_m2
 NO_CONSTRUCTION_FOUND_MESSAGE = "No se halló el tipo de construcción"
 NO_ZIP_CODE_FOUND_MESSAGE = "No se halló el código zip solicitado"
+
+# Agregaciones soportadas por `PriceM2Service.calculate`
+AGGREGATE_TYPES = (
+    "avg",
+    "max",
+    "min",
+    "median",
+    "p25",
+    "p75",
+    "p90",
+    "stddev",
+    "histogram",
+)
+
+# Percentiles precalculados en `CatastroResumen` (interpolados como
+# PERCENTILE_CONT), indexados por el nombre de la agregación.
+PERCENTILES = {"p25": 0.25, "median": 0.5, "p75": 0.75, "p90": 0.9}
+
+# Cantidad de intervalos (de igual ancho entre el mínimo y el máximo) del
+# histograma precalculado en `CatastroResumen`.
+HISTOGRAM_BINS = 10
+
+# Límite de consultas por request en el endpoint de agregaciones en batch
+BATCH_AGGREGATE_LIMIT = 1000
+
+# Archivos de catastro publicados por el Gobierno de la CDMX por alcaldía.
+# Ver https://sig.cdmx.gob.mx/datos/#d_datos_cat
+# Las alcaldías sin url deben cargarse con `--source` en `price-m2_pull-prices-to-db`.
+CATASTRO_SOURCES = {
+    "Álvaro Obregón": "https://catalogo.sig.cdmx.gob.mx/documents/75/download",
+}
@@ -0,0 +1,118 @@
+"""Acceso a la versión vigente de los datos de catastro (`models.DatasetVersion`).
+
+Cada proceso (v.g., cada worker de gunicorn) memoriza las versiones vigentes
+durante `settings.PRICE_M2_DATASET_VERSION_TTL` segundos para no consultar
+la db en cada request. Luego de una carga, los workers toman la nueva versión
+como máximo al vencer ese intervalo.
+
+Hay dos niveles de versión:
+    * `current_dataset_version`: cambia con cualquier carga o sincronización.
+    * `dataset_version_for(zip_code)`: sólo cambia con una carga completa o con
+      una sincronización que modificó ese código postal. Es la que deben usar
+      los cachés de resultados por código postal.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+
+from .models import DatasetVersion
+
+# Stamp usado cuando aún no se ha registrado ninguna carga.
+INITIAL_DATASET_STAMP = "0"
+
+_memo_lock = threading.Lock()
+_memo = {
+    "expires_at": 0.0,
+    "stamp": INITIAL_DATASET_STAMP,
+    "full_stamp": INITIAL_DATASET_STAMP,
+    "zip_stamps": {},
+}
+
+
+def _dataset_versions():
+    """Retorna las versiones vigentes, consultando la db al vencer el TTL."""
+    now = time.monotonic()
+
+    with _memo_lock:
+        if now < _memo["expires_at"]:
+            return _memo
+
+    # La última carga completa y las sincronizaciones posteriores a ella.
+    latest_full_id = DatasetVersion.objects.filter(
+        zip_codes__isnull=True
+    ).aggregate(id=Coalesce(Max("id"), 0))["id"]
+    versions = (
+        DatasetVersion.objects.filter(id__gte=latest_full_id)
+        .order_by("id")
+        .values_list("stamp", "zip_codes")
+    )
+
+    stamp = full_stamp = INITIAL_DATASET_STAMP
+    zip_stamps = {}
+    for stamp, zip_codes in versions:
+        if zip_codes is None:
+            full_stamp = stamp
+        else:
+            zip_stamps.update((zip_code, stamp) for zip_code in zip_codes)
+
+    with _memo_lock:
+        _memo["stamp"] = stamp
+        _memo["full_stamp"] = full_stamp
+        _memo["zip_stamps"] = zip_stamps
+        _memo["expires_at"] = now + settings.PRICE_M2_DATASET_VERSION_TTL
+        return _memo
+
+
+def current_dataset_version() -> str:
+    """Retorna el `stamp` de la última versión registrada de los datos."""
+    return _dataset_versions()["stamp"]
+
+
+def dataset_version_for(zip_code: str) -> str:
+    """Retorna la versión de los datos del código postal `zip_code`.
+
+    Se compone del `stamp` de la última carga completa y, si una
+    sincronización posterior modificó el código postal, del `stamp` de esa
+    sincronización.
+    """
+    versions = _dataset_versions()
+    zip_stamp = versions["zip_stamps"].get(zip_code)
+    if zip_stamp is None:
+        return versions["full_stamp"]
+    return f"{versions['full_stamp']}.{zip_stamp}"
+
+
+def new_dataset_stamp() -> str:
+    """Genera un `stamp` nuevo para `publish_dataset_version`.
+
+    Permite preparar los archivos de una versión (v.g., el snapshot de
+    `price_m2.columnar`) antes de publicarla.
+    """
+    return DatasetVersion._meta.get_field("stamp").get_default()
+
+
+def publish_dataset_version(
+    checksum: str = "", zip_codes=None, stamp=None
+) -> DatasetVersion:
+    """Registra una nueva versión de los datos.
+
+    Debe llamarse una vez que los datos nuevos están confirmados en la db.
+    El proceso que publica ve la nueva versión de inmediato.
+    `checksum` identifica los archivos fuente de la carga y `zip_codes` los
+    códigos postales modificados por una sincronización incremental
+    (`None` para una carga completa). Sin `stamp`, se genera uno nuevo.
+    """
+    dataset_version = DatasetVersion.objects.create(
+        stamp=stamp or new_dataset_stamp(),
+        checksum=checksum,
+        zip_codes=None if zip_codes is None else sorted(zip_codes),
+    )
+
+    with _memo_lock:
+        _memo["expires_at"] = 0.0
+
+    return dataset_version
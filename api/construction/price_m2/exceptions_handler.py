@@ -1,13 +1,16 @@
 from rest_framework.exceptions import ValidationError
 from rest_framework.views import exception_handler
 
+from .metrics import stage
+
 
 def price_m2_exception_handler(exc, context):
-    response = exception_handler(exc, context)
+    with stage("exception_handler"):
+        response = exception_handler(exc, context)
 
-    if isinstance(exc, ValidationError):
-        data = {"status": False, "errors": exc.detail}
+        if isinstance(exc, ValidationError):
+            data = {"status": False, "errors": exc.detail}
 
-        response.data = data
+            response.data = data
 
     return response
@@ -0,0 +1,89 @@
+"""Caché HTTP de las respuestas de consulta, atado a la versión de los datos.
+
+Los datos sólo cambian con una carga, de modo que las respuestas se pueden
+cachear (v.g., en un CDN o un reverse proxy) y revalidar con un ETag que se
+calcula sin evaluar la vista: la versión de los datos más el request.
+"""
+
+import functools
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .dataset_version import current_dataset_version, dataset_version_for
+
+
+def dataset_etag(request, zip_code=None) -> str:
+    """Retorna el ETag de la respuesta a `request` con la versión vigente de los datos.
+
+    Con `zip_code` se usa la versión de ese código postal, que no cambia con
+    las sincronizaciones de otros códigos postales. El ETag incluye el path
+    con sus query-parameters y el header `Accept`, que elige el formato de la
+    respuesta.
+    """
+    version = (
+        current_dataset_version()
+        if zip_code is None
+        else dataset_version_for(zip_code)
+    )
+    key = "\n".join(
+        (version, request.get_full_path(), request.headers.get("Accept", ""))
+    )
+    return quote_etag(
+        hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    )
+
+
+def dataset_cached(view):
+    """Decorador de vistas (sync o async) de consulta con caché HTTP.
+
+    Los GET y HEAD con un `If-None-Match` vigente se responden con un 304 sin
+    evaluar la vista. Las respuestas exitosas incluyen el `ETag` y un
+    `Cache-Control` con `settings.PRICE_M2_HTTP_CACHE_MAX_AGE`.
+    """
+
+    def not_modified(request, etag):
+        if request.method not in ("GET", "HEAD"):
+            return None
+        return get_conditional_response(request, etag=etag)
+
+    def add_headers(request, response, etag):
+        if request.method in ("GET", "HEAD") and response.status_code in (
+            200,
+            304,
+        ):
+            response.headers.setdefault("ETag", etag)
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=settings.PRICE_M2_HTTP_CACHE_MAX_AGE,
+            )
+        return response
+
+    if iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            # La versión de los datos puede consultar la db.
+            etag = await sync_to_async(dataset_etag)(
+                request, kwargs.get("zip_code")
+            )
+            response = not_modified(request, etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            return add_headers(request, response, etag)
+
+        return async_view
+
+    @functools.wraps(view)
+    def sync_view(request, *args, **kwargs):
+        etag = dataset_etag(request, kwargs.get("zip_code"))
+        response = not_modified(request, etag)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        return add_headers(request, response, etag)
+
+    return sync_view
@@ -0,0 +1,1585 @@
+"""Utilidades para la carga del CSV de catastro en `CatastroInfo`.
+
+El proceso completo está pensado como un pipeline en streaming: el zip se
+descarga a disco (o se usa un archivo local), el CSV se descomprime de manera incremental, las filas se
+convierten con generadores y se registran en batches. De esta forma la memoria
+usada no depende del tamaño del archivo.
+
+La conversión de las filas puede repartirse entre varios procesos
+(`parse_catastro_parallel`): cada proceso convierte un rango de bytes del CSV y
+retorna un `CatastroBatch` compacto, que un único writer registra en la db.
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from io import StringIO, TextIOWrapper
+from itertools import islice
+from pathlib import Path
+from zipfile import ZipFile, is_zipfile
+
+import django
+from django.db import connection, transaction
+
+from .models import CatastroImport, CatastroInfo
+from .profiling import IngestionProfile, TimedReader
+from .quality import QualityRules
+from .utils import batched
+
+# Tamaño de bloque usado para copiar la descarga a disco.
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Segundos de espera de cada operación de red de la descarga (conexión y
+# lectura de cada bloque), ver `settings.PRICE_M2_DOWNLOAD_TIMEOUT`.
+DOWNLOAD_TIMEOUT = 60
+
+# Tamaño de bloque con el que psycopg2 lee el stream de `COPY FROM STDIN`.
+COPY_CHUNK_SIZE = 64 * 1024
+
+# Tamaño aproximado (en bytes) de los rangos del CSV que se convierten en
+# paralelo, ver `parse_catastro_parallel`.
+PARSE_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Columnas de los archivos de filas con error de `RejectLog`, antes de las
+# columnas del CSV.
+REJECT_FIELDS = ("line", "error_type", "error")
+
+# Orden de los valores en las filas generadas por `parse_catastro_rows`.
+CATASTRO_FIELDS = (
+    "alcaldia_id",
+    "uso_construccion_id",
+    "codigo_postal",
+    "superficie_terreno",
+    "superficie_construccion",
+    "valor_suelo",
+    "subsidio",
+    "price_unit",
+    "price_unit_construction",
+    "quality",
+    "row_hash",
+)
+
+
+class IngestionError(Exception):
+    """Error en el formato de los archivos de catastro."""
+
+
+class CatastroSource:
+    """Archivo local (zip o CSV) con los datos de catastro y su checksum SHA-256."""
+
+    __slots__ = ("path", "checksum", "downloaded")
+
+    def __init__(self, path, checksum: str, downloaded=False):
+        self.path = Path(path)
+        self.checksum = checksum
+        # Falso cuando se usó un archivo local o la copia en caché seguía vigente.
+        self.downloaded = downloaded
+
+
+def copy_with_checksum(source, destination, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Copia el archivo binario `source` en `destination` por bloques.
+
+    Retorna el SHA-256 (hex) del contenido copiado.
+    """
+    digest = hashlib.sha256()
+    while chunk := source.read(chunk_size):
+        digest.update(chunk)
+        destination.write(chunk)
+    return digest.hexdigest()
+
+
+def file_checksum(path, chunk_size=DOWNLOAD_CHUNK_SIZE) -> str:
+    """Retorna el SHA-256 (hex) del archivo `path`."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def local_source(path) -> CatastroSource:
+    """Usa un zip o CSV del disco como fuente de los datos."""
+    return CatastroSource(path, file_checksum(path))
+
+
+def download_source(
+    url: str, cache_dir, timeout: float = DOWNLOAD_TIMEOUT
+) -> CatastroSource:
+    """Descarga `url` en el directorio de caché `cache_dir`, salvo que la copia siga vigente.
+
+    Junto al archivo se guardan los headers `ETag` y `Last-Modified` de la
+    respuesta y el SHA-256 del contenido. En las siguientes ejecuciones la
+    descarga es condicional (`If-None-Match` / `If-Modified-Since`): ante un
+    `304 Not Modified` se reutiliza el archivo en caché. Si el archivo en caché
+    no coincide con su checksum se descarta y se descarga de nuevo.
+
+    Lanza `IngestionError` cuando la conexión o la lectura de un bloque
+    demoran más de `timeout` segundos, para que un servidor que no responde
+    no bloquee la carga.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    key = hashlib.sha256(url.encode()).hexdigest()[:16]
+    data_path = cache_dir / f"{key}.data"
+    metadata_path = cache_dir / f"{key}.json"
+
+    metadata = {}
+    if data_path.exists() and metadata_path.exists():
+        metadata = json.loads(metadata_path.read_text())
+        if file_checksum(data_path) != metadata.get("sha256"):
+            metadata = {}
+
+    headers = {}
+    if metadata.get("etag"):
+        headers["If-None-Match"] = metadata["etag"]
+    if metadata.get("last_modified"):
+        headers["If-Modified-Since"] = metadata["last_modified"]
+
+    timeout_error = IngestionError(
+        f"La descarga de '{url}' superó el timeout de {timeout}s."
+    )
+    try:
+        response = urllib.request.urlopen(
+            urllib.request.Request(url, headers=headers), timeout=timeout
+        )
+    except urllib.error.HTTPError as error:
+        if error.code == 304 and metadata:
+            return CatastroSource(data_path, metadata["sha256"])
+        raise
+    except urllib.error.URLError as error:
+        if isinstance(error.reason, TimeoutError):
+            raise timeout_error from error
+        raise
+    except TimeoutError as error:
+        raise timeout_error from error
+
+    with (
+        response,
+        tempfile.NamedTemporaryFile(
+            dir=cache_dir, delete=False
+        ) as partial_file,
+    ):
+        try:
+            checksum = copy_with_checksum(response, partial_file)
+        except BaseException as error:
+            os.unlink(partial_file.name)
+            if isinstance(error, TimeoutError):
+                raise timeout_error from error
+            raise
+        response_headers = response.headers
+
+    os.replace(partial_file.name, data_path)
+    metadata_path.write_text(
+        json.dumps(
+            {
+                "url": url,
+                "etag": response_headers.get("ETag"),
+                "last_modified": response_headers.get("Last-Modified"),
+                "sha256": checksum,
+            }
+        )
+    )
+
+    return CatastroSource(data_path, checksum, downloaded=True)
+
+
+@contextmanager
+def open_catastro_csv(path, profile=None):
+    """Abre como texto el CSV de catastro en `path`, que puede ser un zip, un CSV o un CSV comprimido con gzip.
+
+    Genera el par (nombre del CSV, archivo de texto). Con `profile`
+    (un `IngestionProfile`) mide la lectura del archivo en la etapa "read"
+    (o la descompresión en la etapa "unzip").
+    """
+    if is_zipfile(path):
+        with open_zipped_csv(path, profile) as (filename, csv_file):
+            yield filename, csv_file
+    elif is_gzip_file(path):
+        with gzip.open(path, "rb") as binary_file:
+            yield Path(path).name, _text_file(binary_file, profile, "unzip")
+    else:
+        with open(path, "rb") as binary_file:
+            yield Path(path).name, _text_file(binary_file, profile, "read")
+
+
+@contextmanager
+def open_zipped_csv(zip_path, profile=None):
+    """Abre como texto el único CSV dentro del zip `zip_path`.
+
+    El contenido se descomprime a medida que se lee. Lanza `IngestionError`
+    cuando el zip no contiene exactamente un archivo.
+    Lanza `zipfile.BadZipFile` cuando `zip_path` no es un zip.
+    Con `profile` mide la descompresión en la etapa "unzip".
+    """
+    with ZipFile(zip_path, "r") as zip_catalog:
+        filenames = zip_catalog.namelist()
+
+        if len(filenames) != 1:  # el zip tiene otro formato
+            raise IngestionError(
+                "Hay más de un archivo. El nuevo formato necesita una actualización a este comando."
+            )
+
+        with zip_catalog.open(filenames[0]) as csv_file:
+            yield filenames[0], _text_file(csv_file, profile, "unzip")
+
+
+def is_gzip_file(path) -> bool:
+    """Indica si `path` es un archivo comprimido con gzip (v.g., de `RejectLog`)."""
+    with open(path, "rb") as file:
+        return file.read(2) == b"\x1f\x8b"
+
+
+def is_reject_file(path) -> bool:
+    """Indica si `path` es un archivo de filas con error de `RejectLog`."""
+    with open_catastro_csv(path) as (_, csv_file):
+        header = next(csv.reader(csv_file), [])
+    return tuple(header[: len(REJECT_FIELDS)]) == REJECT_FIELDS
+
+
+def _text_file(binary_file, profile, stage: str):
+    if profile is not None:
+        binary_file = io.BufferedReader(
+            TimedReader(binary_file, profile[stage]), COPY_CHUNK_SIZE
+        )
+    return TextIOWrapper(binary_file, encoding="utf-8", newline="")
+
+
+def catastro_row_hash(values) -> str:
+    """Hash (hex, 32 caracteres) del contenido de una fila de `CatastroInfo`.
+
+    `values` son los valores de `CATASTRO_FIELDS` sin `row_hash`. Dos filas
+    con el mismo contenido tienen el mismo hash.
+    """
+    content = "\x1f".join(map(repr, values)).encode()
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def catastro_row(values, rules: QualityRules) -> tuple:
+    """Completa los valores del CSV de una fila con sus precios, su calidad y su hash.
+
+    `values` son los valores de `CATASTRO_FIELDS` hasta `subsidio`. El hash
+    incluye la calidad: al cambiar las reglas, la sincronización reemplaza
+    las filas cuya calidad cambió.
+    """
+    values += rules.evaluate(*values[3:])
+    return values + (catastro_row_hash(values),)
+
+
+def parse_catastro_rows(
+    csv_file,
+    alcaldia_id: int,
+    uso_construccion_map: dict,
+    rejects,
+    profile=None,
+    fieldnames=None,
+    rules=None,
+):
+    """Genera una tupla con los valores de `CATASTRO_FIELDS` por cada fila válida del CSV.
+
+    `uso_construccion_map` asocia el texto de la columna `uso_construccion`
+    con el id de `UsoConstruccion`. Sin `fieldnames`, los nombres de las
+    columnas se leen de la primera fila del CSV.
+
+    Los precios y la calidad de cada fila se evalúan con las reglas `rules`
+    (por defecto, las de `settings.PRICE_M2_QUALITY_RULES`); las filas que no
+    las cumplen se generan como `CatastroInfo.Quality.INVALID`, no son filas
+    con error.
+
+    Las filas que no pueden convertirse se agregan a `rejects` (una lista o
+    un `RejectLog`) como una tupla con el número de línea en el CSV, el tipo
+    de error (ver `reject_error_type`), el mensaje de la excepción y la fila
+    (el diccionario de `csv.DictReader`).
+
+    Con `profile` (un `IngestionProfile`) mide el parseo del CSV ("csv_parse")
+    y la conversión de los valores ("convert"), sin el tiempo que el
+    consumidor de las filas usa entre una fila y la siguiente.
+    """
+    rules = rules or QualityRules.from_settings()
+    clock = time.perf_counter
+    parse_seconds = convert_seconds = 0.0
+    total = 0
+    try:
+        start = clock()
+        reader = csv.DictReader(csv_file, fieldnames)
+        for row in reader:
+            parsed = clock()
+            parse_seconds += parsed - start
+            total += 1
+            try:
+                values = (
+                    alcaldia_id,
+                    uso_construccion_map[row["uso_construccion"]],
+                    row["codigo_postal"],
+                    float(row["superficie_terreno"]),
+                    float(row["superficie_construccion"]),
+                    float(row["valor_suelo"]),
+                    float(row["subsidio"]),
+                )
+            except Exception as error:
+                rejects.append(
+                    (
+                        reader.line_num,
+                        reject_error_type(row, uso_construccion_map, error),
+                        str(error),
+                        row,
+                    )
+                )
+                values = None
+            else:
+                values = catastro_row(values, rules)
+            convert_seconds += clock() - parsed
+
+            if values is not None:
+                yield values
+            start = clock()
+        parse_seconds += clock() - start
+    finally:
+        if profile is not None:
+            profile.add("csv_parse", parse_seconds, total)
+            profile.add("convert", convert_seconds, total)
+
+
+def reject_error_type(row, uso_construccion_map: dict, error) -> str:
+    """Tipo de error de una fila que no pudo convertirse: "<columna>:<excepción>".
+
+    V.g., "valor_suelo:ValueError" o "uso_construccion:KeyError".
+    """
+    converters = (
+        ("uso_construccion", uso_construccion_map.__getitem__),
+        ("codigo_postal", str),
+        ("superficie_terreno", float),
+        ("superficie_construccion", float),
+        ("valor_suelo", float),
+        ("subsidio", float),
+    )
+    for column, convert in converters:
+        try:
+            convert(row[column])
+        except Exception as column_error:
+            return f"{column}:{type(column_error).__name__}"
+    return type(error).__name__
+
+
+class RejectLog:
+    """Filas con error de la carga de una alcaldía, ver `parse_catastro_rows`.
+
+    Cuenta las filas por tipo de error y, con `path`, las escribe a medida que
+    se agregan en un CSV comprimido con gzip, por lo que la memoria no depende
+    de la cantidad de filas con error. El CSV tiene las columnas
+    `REJECT_FIELDS` seguidas de las columnas originales, por lo que es un CSV
+    de catastro válido (`parse_catastro_rows` ignora las columnas extra): una
+    vez corregidas, sus filas pueden cargarse de nuevo con LOAD_APPEND (ver
+    `is_reject_file`). El archivo se crea con la primera fila.
+
+    Con `max_errors` lanza `IngestionError` al superar esa cantidad de filas
+    con error, para no completar la carga de un archivo roto.
+    """
+
+    def __init__(self, path=None, max_errors=None):
+        """Elimina el archivo `path` de una carga anterior, si existe."""
+        self.path = Path(path) if path else None
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+        self.max_errors = max_errors
+        self.total = 0
+        # Cantidad de filas por tipo de error.
+        self.counts = {}
+        self._file = None
+        self._writer = None
+        self._fieldnames = None
+
+    def __len__(self):
+        return self.total
+
+    def append(self, reject):
+        """Agrega una fila con error: (línea, tipo de error, mensaje, fila)."""
+        line, error_type, _, _ = reject
+        self.total += 1
+        self.counts[error_type] = self.counts.get(error_type, 0) + 1
+        if self.path is not None:
+            self._write(reject)
+
+        if self.max_errors is not None and self.total > self.max_errors:
+            raise IngestionError(
+                f"Se superó el máximo de {self.max_errors} filas con error"
+                f" (línea {line}: {error_type})."
+            )
+
+    def extend(self, rejects):
+        for reject in rejects:
+            self.append(reject)
+
+    def _write(self, reject):
+        line, error_type, error, row = reject
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = gzip.open(
+                self.path, "wt", encoding="utf-8", newline=""
+            )
+            self._writer = csv.writer(self._file)
+            self._fieldnames = [name for name in row if name is not None]
+            self._writer.writerow((*REJECT_FIELDS, *self._fieldnames))
+
+        # Los valores de las filas con más columnas que los encabezados
+        # (la clave None de `csv.DictReader`) se conservan al final.
+        self._writer.writerow(
+            (
+                line,
+                error_type,
+                error,
+                *(row.get(name) for name in self._fieldnames),
+                *row.get(None, ()),
+            )
+        )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CatastroBatch:
+    """Filas válidas de un rango del CSV, en columnas de tipos compactos.
+
+    Es el resultado de `parse_catastro_chunk` en los procesos del pool de
+    `parse_catastro_parallel`: los valores numéricos se guardan en `array`s y
+    el hash de cada fila en 16 bytes, por lo que el batch se serializa con
+    pickle mucho más rápido que una lista de tuplas o de instancias del ORM.
+    Al iterarlo se generan las tuplas con los valores de `CATASTRO_FIELDS`.
+    """
+
+    __slots__ = (
+        "alcaldia_id",
+        "uso_construccion_ids",
+        "codigos_postales",
+        "superficies_terreno",
+        "superficies_construccion",
+        "valores_suelo",
+        "subsidios",
+        "price_units",
+        "price_unit_constructions",
+        "qualities",
+        "row_hashes",
+        "rejects",
+        "lines",
+        "profile",
+    )
+
+    # Bytes del hash de cada fila, ver `catastro_row_hash`.
+    ROW_HASH_SIZE = 16
+
+    def __init__(self, alcaldia_id: int):
+        self.alcaldia_id = alcaldia_id
+        self.uso_construccion_ids = array("l")
+        # Los códigos postales se repiten: pickle serializa una sola vez
+        # cada string compartido.
+        self.codigos_postales = []
+        self.superficies_terreno = array("d")
+        self.superficies_construccion = array("d")
+        self.valores_suelo = array("d")
+        self.subsidios = array("d")
+        # Los precios None se guardan como NaN.
+        self.price_units = array("d")
+        self.price_unit_constructions = array("d")
+        self.qualities = array("b")
+        self.row_hashes = bytearray()
+        # Filas con error, con el número de línea relativo al rango del CSV.
+        self.rejects = []
+        # Líneas del rango del CSV.
+        self.lines = 0
+        self.profile = IngestionProfile()
+
+    def __len__(self):
+        return len(self.codigos_postales)
+
+    def extend(self, rows):
+        """Agrega las tuplas de `rows` (ver `parse_catastro_rows`)."""
+        codigos_postales = {}
+        for (
+            _,
+            uso_construccion_id,
+            codigo_postal,
+            superficie_terreno,
+            superficie_construccion,
+            valor_suelo,
+            subsidio,
+            price_unit,
+            price_unit_construction,
+            quality,
+            row_hash,
+        ) in rows:
+            self.uso_construccion_ids.append(uso_construccion_id)
+            self.codigos_postales.append(
+                codigos_postales.setdefault(codigo_postal, codigo_postal)
+            )
+            self.superficies_terreno.append(superficie_terreno)
+            self.superficies_construccion.append(superficie_construccion)
+            self.valores_suelo.append(valor_suelo)
+            self.subsidios.append(subsidio)
+            self.price_units.append(
+                math.nan if price_unit is None else price_unit
+            )
+            self.price_unit_constructions.append(
+                math.nan
+                if price_unit_construction is None
+                else price_unit_construction
+            )
+            self.qualities.append(quality)
+            self.row_hashes += bytes.fromhex(row_hash)
+
+    def __iter__(self):
+        size = self.ROW_HASH_SIZE
+        for index, values in enumerate(
+            zip(
+                self.uso_construccion_ids,
+                self.codigos_postales,
+                self.superficies_terreno,
+                self.superficies_construccion,
+                self.valores_suelo,
+                self.subsidios,
+            )
+        ):
+            price_unit = self.price_units[index]
+            price_unit_construction = self.price_unit_constructions[index]
+            yield (
+                self.alcaldia_id,
+                *values,
+                None if math.isnan(price_unit) else price_unit,
+                (
+                    None
+                    if math.isnan(price_unit_construction)
+                    else price_unit_construction
+                ),
+                self.qualities[index],
+                self.row_hashes[index * size : (index + 1) * size].hex(),
+            )
+
+
+def csv_chunks(path, chunk_size: int):
+    """Divide el CSV `path` en rangos de bytes de ~`chunk_size` que empiezan y terminan en un salto de línea.
+
+    Retorna el par (nombres de las columnas, lista de rangos `(start, end)`);
+    el primer rango empieza luego de la fila de encabezados.
+
+    NOTA: supone que los valores del CSV no contienen saltos de línea, como en
+    los archivos publicados por CDMX. Una fila que quede partida entre dos
+    rangos se reporta como fila con error.
+    """
+    with open(path, "rb") as csv_file:
+        header = csv_file.readline()
+        fieldnames = next(csv.reader([header.decode("utf-8")]), None)
+        if not fieldnames:
+            raise IngestionError(f"El CSV '{path}' no tiene encabezados.")
+
+        size = os.fstat(csv_file.fileno()).st_size
+        chunks = []
+        start = csv_file.tell()
+        while start < size:
+            csv_file.seek(min(start + chunk_size, size))
+            csv_file.readline()
+            end = min(csv_file.tell(), size)
+            chunks.append((start, end))
+            start = end
+    return fieldnames, chunks
+
+
+def parse_catastro_chunk(
+    path,
+    start: int,
+    end: int,
+    fieldnames,
+    alcaldia_id: int,
+    uso_construccion_map: dict,
+    rules=None,
+) -> CatastroBatch:
+    """Lee y convierte las filas del rango de bytes `[start, end)` del CSV `path`.
+
+    Está pensada para ejecutarse en los procesos de `parse_catastro_parallel`.
+    Las filas con error y las métricas ("read", "csv_parse" y "convert") se
+    retornan en el batch.
+    """
+    batch = CatastroBatch(alcaldia_id)
+    with batch.profile.stage("read") as stats, open(path, "rb") as csv_file:
+        csv_file.seek(start)
+        content = csv_file.read(end - start)
+        stats.bytes += len(content)
+    batch.lines = content.count(b"\n")
+
+    batch.extend(
+        parse_catastro_rows(
+            io.StringIO(content.decode("utf-8"), newline=""),
+            alcaldia_id,
+            uso_construccion_map,
+            batch.rejects,
+            batch.profile,
+            fieldnames=fieldnames,
+            rules=rules,
+        )
+    )
+    return batch
+
+
+def parse_catastro_parallel(
+    path,
+    alcaldia_id: int,
+    uso_construccion_map: dict,
+    rejects,
+    profile=None,
+    jobs: int = 2,
+    chunk_size=None,
+    rules=None,
+):
+    """Como `parse_catastro_rows`, pero convierte el CSV `path` en `jobs` procesos.
+
+    El CSV se divide en rangos de ~`chunk_size` bytes (por defecto
+    `PARSE_CHUNK_SIZE`, ver `csv_chunks`) que se leen y convierten en un
+    `ProcessPoolExecutor` con `parse_catastro_chunk`. Las filas se generan en
+    el orden del CSV a medida que llegan los batches; como mucho hay
+    `2 * jobs` rangos en proceso, por lo que la memoria no depende del tamaño
+    del archivo aunque el consumidor (el writer) sea más lento.
+
+    Con `profile` las etapas "read", "csv_parse" y "convert" suman el tiempo
+    de los procesos del pool; "parse_wait" mide el tiempo del consumidor
+    esperando y desempaquetando los batches.
+    """
+    fieldnames, chunks = csv_chunks(path, chunk_size or PARSE_CHUNK_SIZE)
+    clock = time.perf_counter
+    wait_seconds = 0.0
+    total = 0
+    # Líneas del CSV antes del rango en curso (empezando por los encabezados).
+    lines = 1
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    ) as executor:
+        pending = deque()
+        chunks = iter(chunks)
+        try:
+            while True:
+                start = clock()
+                for chunk_start, chunk_end in islice(
+                    chunks, 2 * jobs - len(pending)
+                ):
+                    pending.append(
+                        executor.submit(
+                            parse_catastro_chunk,
+                            str(path),
+                            chunk_start,
+                            chunk_end,
+                            fieldnames,
+                            alcaldia_id,
+                            uso_construccion_map,
+                            rules,
+                        )
+                    )
+                if not pending:
+                    break
+
+                batch = pending.popleft().result()
+                rejects.extend(
+                    (lines + line, *reject) for line, *reject in batch.rejects
+                )
+                lines += batch.lines
+                if profile is not None:
+                    profile.update(batch.profile)
+                total += len(batch)
+                wait_seconds += clock() - start
+
+                yield from batch
+        finally:
+            for future in pending:
+                future.cancel()
+            if profile is not None:
+                profile.add("parse_wait", wait_seconds, total)
+
+
+@contextmanager
+def extracted_csv(path, profile=None):
+    """Genera la ruta del CSV de catastro en `path`, descomprimido si es un zip o un gzip.
+
+    El CSV se descomprime en un archivo temporal que se elimina al salir.
+    Con `profile` mide la descompresión en la etapa "unzip".
+    """
+    if not (is_zipfile(path) or is_gzip_file(path)):
+        yield path
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".csv") as extracted_file:
+        with (
+            open_catastro_csv(path) as (_, csv_file),
+            profile.stage("unzip") if profile is not None else nullcontext(),
+        ):
+            shutil.copyfileobj(
+                csv_file.buffer, extracted_file, DOWNLOAD_CHUNK_SIZE
+            )
+            extracted_file.flush()
+        if profile is not None:
+            profile["unzip"].bytes += extracted_file.tell()
+        yield extracted_file.name
+
+
+@contextmanager
+def read_catastro_rows(
+    path,
+    alcaldia_id: int,
+    uso_construccion_map: dict,
+    rejects,
+    profile=None,
+    jobs: int = 1,
+    rules=None,
+):
+    """Genera las filas válidas del archivo de catastro `path` (un zip o un CSV).
+
+    Los precios y la calidad de las filas se evalúan con `rules`, ver
+    `parse_catastro_rows`.
+
+    Con `jobs` > 1 y un CSV de más de `PARSE_CHUNK_SIZE` bytes las filas se
+    convierten en paralelo con `parse_catastro_parallel`; si no, en el
+    proceso actual con `parse_catastro_rows`.
+
+    Genera el par (filas, etapas): las etapas de `profile` que se ejecutan en
+    este proceso mientras se consumen las filas, para descontarlas del tiempo
+    del consumidor con `IngestionProfile.exclude`.
+    """
+    if jobs > 1 and _csv_size(path) > PARSE_CHUNK_SIZE:
+        with extracted_csv(path, profile) as csv_path:
+            yield (
+                parse_catastro_parallel(
+                    csv_path,
+                    alcaldia_id,
+                    uso_construccion_map,
+                    rejects,
+                    profile,
+                    jobs,
+                    rules=rules,
+                ),
+                ("parse_wait",),
+            )
+        return
+
+    with open_catastro_csv(path, profile) as (_, csv_file):
+        yield (
+            parse_catastro_rows(
+                csv_file,
+                alcaldia_id,
+                uso_construccion_map,
+                rejects,
+                profile,
+                rules=rules,
+            ),
+            ("unzip", "read", "csv_parse", "convert"),
+        )
+    if profile is not None:
+        # El parseo consume la lectura del archivo a medida que avanza.
+        profile.exclude("csv_parse", "unzip", "read")
+
+
+def _csv_size(path) -> int:
+    if is_zipfile(path):
+        with ZipFile(path) as zip_catalog:
+            return sum(info.file_size for info in zip_catalog.infolist())
+    # Con gzip, el tamaño comprimido (el tamaño del CSV es mayor).
+    return os.path.getsize(path)
+
+
+class BulkCreateWriter:
+    """Registra las filas con `CatastroInfo.objects.bulk_create` por batches.
+
+    Funciona con cualquier backend; es el usado con SQLite en development.
+    """
+
+    name = "bulk_create"
+    # Indica si `write` puede registrar en una tabla distinta a la del modelo.
+    supports_table = False
+
+    def __init__(self, connection, batch_size: int):
+        self.connection = connection
+        self.batch_size = batch_size
+
+    def write(self, rows, on_batch=None, table=None) -> int:
+        """Registra las filas de `rows` y retorna la cantidad registrada.
+
+        `on_batch` recibe el total acumulado luego de cada batch.
+        `table` permite registrar en otra tabla con las mismas columnas que
+        `CatastroInfo` (sólo cuando `supports_table` es verdadero).
+        """
+        if table not in (None, CatastroInfo._meta.db_table):
+            raise IngestionError(
+                f"El writer '{self.name}' sólo registra en la tabla de CatastroInfo."
+            )
+
+        total = 0
+        for batch in batched(rows, self.batch_size):
+            CatastroInfo.objects.using(self.connection.alias).bulk_create(
+                CatastroInfo(**dict(zip(CATASTRO_FIELDS, row)))
+                for row in batch
+            )
+            total += len(batch)
+            if on_batch is not None:
+                on_batch(total)
+        return total
+
+
+class CopyWriter(BulkCreateWriter):
+    """Registra las filas con `COPY ... FROM STDIN` de PostgreSQL.
+
+    Evita construir instancias del ORM y los INSERT multi-fila: las filas se
+    serializan como CSV y psycopg2 las envía en un único COPY mediante
+    `cursor.copy_expert`.
+
+    En el formato csv de COPY un campo vacío sin comillas es NULL, que es
+    como `CsvRowsStream` serializa tanto None como "". Las columnas de texto
+    se cargan con FORCE_NOT_NULL, de modo que "" se registra como "" (igual
+    que con `BulkCreateWriter`) y None sólo queda como NULL en las columnas
+    numéricas.
+    """
+
+    name = "copy"
+    supports_table = True
+
+    def write(self, rows, on_batch=None, table=None) -> int:
+        stream = CsvRowsStream(rows, self.batch_size, on_batch)
+        with self.connection.cursor() as cursor:
+            cursor.copy_expert(
+                self.copy_sql(table), stream, size=COPY_CHUNK_SIZE
+            )
+        return stream.total
+
+    def copy_sql(self, table=None) -> str:
+        """Retorna el `COPY ... FROM STDIN` de las columnas de `CATASTRO_FIELDS`."""
+        quote_name = self.connection.ops.quote_name
+        fields = [
+            CatastroInfo._meta.get_field(name) for name in CATASTRO_FIELDS
+        ]
+        columns = ", ".join(quote_name(field.column) for field in fields)
+        text_columns = ", ".join(
+            quote_name(field.column)
+            for field in fields
+            if field.get_internal_type() in ("CharField", "TextField")
+        )
+        return (
+            f"COPY {quote_name(table or CatastroInfo._meta.db_table)}"
+            f" ({columns})"
+            f" FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({text_columns}))"
+        )
+
+
+def get_catastro_writer(connection, batch_size: int, name="auto"):
+    """Retorna el writer `name` ("auto", "bulk_create" o "copy") para `connection`.
+
+    Con "auto" se usa `CopyWriter` en PostgreSQL y `BulkCreateWriter` en
+    los demás backends.
+    """
+    if name == "auto":
+        name = (
+            CopyWriter.name
+            if connection.vendor == "postgresql"
+            else BulkCreateWriter.name
+        )
+
+    match name:
+        case BulkCreateWriter.name:
+            return BulkCreateWriter(connection, batch_size)
+        case CopyWriter.name:
+            if connection.vendor != "postgresql":
+                raise IngestionError(
+                    f"El writer 'copy' requiere PostgreSQL; el backend actual es '{connection.vendor}'."
+                )
+            return CopyWriter(connection, batch_size)
+        case _:
+            raise IngestionError(f"Writer '{name}' no soportado.")
+
+
+class CsvRowsStream:
+    """Archivo de sólo lectura con las filas serializadas como CSV.
+
+    Las filas se consumen por batches a medida que se lee el stream, de modo
+    que nunca se mantiene en memoria más de un batch serializado.
+    """
+
+    def __init__(self, rows, batch_size: int, on_batch=None):
+        self._batches = batched(rows, batch_size)
+        self._on_batch = on_batch
+        self._pending = ""
+        self._offset = 0
+        self.total = 0
+
+    def read(self, size=-1) -> str:
+        while size < 0 or len(self._pending) - self._offset < size:
+            batch = next(self._batches, None)
+            if batch is None:
+                break
+            self._pending = self._pending[self._offset :] + self._serialize(
+                batch
+            )
+            self._offset = 0
+            self.total += len(batch)
+            if self._on_batch is not None:
+                self._on_batch(self.total)
+
+        if size < 0:
+            size = len(self._pending) - self._offset
+
+        data = self._pending[self._offset : self._offset + size]
+        self._offset += len(data)
+        return data
+
+    @staticmethod
+    def _serialize(batch) -> str:
+        content = StringIO()
+        csv.writer(content, lineterminator="\n").writerows(batch)
+        return content.getvalue()
+
+
+class TransactionReplace:
+    """Reemplaza los `CatastroInfo` eliminando y registrando en una transacción.
+
+    Los lectores siguen viendo los datos anteriores hasta el commit. Es el
+    reemplazo usado con SQLite y con writers que no admiten otra tabla.
+    """
+
+    name = "transaction"
+
+    def __init__(self, connection):
+        self.connection = connection
+        # Códigos postales de las filas eliminadas por el último `replace`.
+        self.replaced_zip_codes = set()
+
+    def replace(self, load, on_replace=None, alcaldia_id=None):
+        """Ejecuta `load(table)` para registrar los nuevos datos y retorna su resultado.
+
+        Con `alcaldia_id` sólo se reemplazan los `CatastroInfo` de esa alcaldía.
+        `on_replace()` se ejecuta en la misma transacción que el reemplazo,
+        v.g., para reconstruir los resúmenes que dependen de los datos.
+        """
+        catastro_infos = CatastroInfo.objects.using(self.connection.alias)
+        if alcaldia_id is not None:
+            catastro_infos = catastro_infos.filter(alcaldia_id=alcaldia_id)
+
+        with transaction.atomic(using=self.connection.alias):
+            self.replaced_zip_codes = set(
+                catastro_infos.values_list("codigo_postal", flat=True)
+                .order_by()
+                .distinct()
+            )
+            catastro_infos.delete()
+            result = load(CatastroInfo._meta.db_table)
+            if on_replace is not None:
+                on_replace()
+        return result
+
+
+class TableSwapReplace(TransactionReplace):
+    """Reemplaza los `CatastroInfo` cargando una tabla staging e intercambiándola.
+
+    Sólo para PostgreSQL. La carga se hace en una copia vacía de la tabla,
+    sin índices ni constraints, que se construyen una vez cargados los datos.
+    Luego, en una transacción corta, se renombra la tabla staging como la
+    tabla de `CatastroInfo` y se elimina la anterior. Los lectores nunca
+    esperan la carga ni ven datos parciales; sólo los renames y el DROP
+    toman un lock exclusivo sobre la tabla.
+
+    A diferencia de `TransactionReplace`, `on_replace()` se ejecuta luego del
+    commit del intercambio, en su propia transacción, de modo que no retiene
+    el lock exclusivo (v.g., mientras se reconstruye el resumen). Hasta que
+    termina, la tabla tiene los nuevos datos y el resumen los anteriores; la
+    API lee el resumen, por lo que sigue respondiendo con los datos
+    anteriores. El nuevo resumen se usa desde su commit, antes de que se
+    publique la nueva versión de datos: hasta entonces, las respuestas ya
+    cacheadas (y sus ETags) siguen siendo las de la versión anterior.
+
+    Además de `replace`, los pasos pueden ejecutarse por separado para cargar
+    la tabla staging desde varios procesos: `prepare`, `keep_alcaldias`,
+    `finish` y, ante un error, `discard`.
+
+    Las cargas no pueden solaparse, ya que usan la misma tabla staging:
+    `prepare` toma un advisory lock de sesión y lanza `IngestionError` si otra
+    carga lo tiene; `finish` y `discard` lo liberan. La conexión debe seguir
+    abierta entre `prepare` y `finish` (y ser una conexión directa, no a
+    través de pgbouncer en modo transaction).
+
+    NOTA: los permisos (GRANT) particulares de la tabla no se copian.
+    """
+
+    name = "table_swap"
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self.table = CatastroInfo._meta.db_table
+        self.staging = f"{self.table}_staging"
+        # Si esta instancia tiene el advisory lock de la tabla staging.
+        self.locked = False
+
+    def replace(self, load, on_replace=None, alcaldia_id=None):
+        if alcaldia_id is not None:
+            raise IngestionError(
+                "El reemplazo 'table_swap' reemplaza todas las alcaldías."
+            )
+
+        self.prepare()
+        try:
+            result = load(self.staging)
+            self.finish(on_replace)
+        except BaseException:
+            self.discard()
+            raise
+        return result
+
+    def prepare(self) -> str:
+        """Crea la tabla staging vacía y retorna su nombre.
+
+        Lanza `IngestionError`, sin esperar, si otra carga está en curso.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_try_advisory_lock(hashtext(%s))", [self.staging]
+            )
+            (self.locked,) = cursor.fetchone()
+            if not self.locked:
+                raise IngestionError(
+                    "Hay otra carga de catastro en curso (la tabla"
+                    f" '{self.staging}' está en uso)."
+                )
+        try:
+            with self.connection.cursor() as cursor:
+                # Una tabla staging de una carga interrumpida.
+                cursor.execute(
+                    f"DROP TABLE IF EXISTS {self._quote(self.staging)}"
+                )
+                cursor.execute(
+                    f"CREATE TABLE {self._quote(self.staging)}"
+                    f" (LIKE {self._quote(self.table)}"
+                    " INCLUDING DEFAULTS INCLUDING IDENTITY"
+                    " INCLUDING CONSTRAINTS)"
+                )
+        except BaseException:
+            self._unlock()
+            raise
+        return self.staging
+
+    def keep_alcaldias(self, alcaldia_ids):
+        """Copia a la tabla staging los `CatastroInfo` actuales de `alcaldia_ids`.
+
+        Permite conservar los datos de las alcaldías que no se cargaron.
+        """
+        if not alcaldia_ids:
+            return
+
+        columns = ", ".join(
+            self._quote(CatastroInfo._meta.get_field(field).column)
+            for field in CATASTRO_FIELDS
+        )
+        alcaldia_column = self._quote(
+            CatastroInfo._meta.get_field("alcaldia").column
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self._quote(self.staging)} ({columns})"
+                f" SELECT {columns} FROM {self._quote(self.table)}"
+                f" WHERE {alcaldia_column} = ANY(%s)",
+                [list(alcaldia_ids)],
+            )
+
+    def finish(self, on_replace=None, profile=None):
+        """Construye los índices de la tabla staging y la intercambia con la tabla actual.
+
+        `on_replace()` se ejecuta luego del intercambio, sin el lock
+        exclusivo pero antes de liberar el advisory lock. Con `profile` mide
+        la construcción de los índices en la etapa "index_build".
+        """
+        with (
+            profile.stage("index_build") if profile else nullcontext(),
+            self.connection.cursor() as cursor,
+        ):
+            renames = self._clone_indexes(cursor, self.table, self.staging)
+            cursor.execute(f"ANALYZE {self._quote(self.staging)}")
+
+        with transaction.atomic(using=self.connection.alias):
+            with self.connection.cursor() as cursor:
+                self._swap(
+                    cursor,
+                    self.table,
+                    self.staging,
+                    f"{self.table}_old",
+                    renames,
+                )
+        try:
+            if on_replace is not None:
+                on_replace()
+        finally:
+            self._unlock()
+
+    def discard(self):
+        """Elimina la tabla staging, si esta instancia tiene el advisory lock.
+
+        Sin el lock (v.g., luego de `finish`) la tabla staging puede ser de
+        otra carga.
+        """
+        if not self.locked:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self._quote(self.staging)}")
+        self._unlock()
+
+    def _unlock(self):
+        if not self.locked:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_unlock(hashtext(%s))", [self.staging]
+            )
+        self.locked = False
+
+    def _quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def _clone_indexes(self, cursor, table, staging):
+        """Crea en `staging` los constraints e índices de `table` con nombres temporales.
+
+        Retorna las tuplas (tipo, nombre temporal, nombre original) para
+        restaurar los nombres una vez hecho el intercambio.
+        """
+        renames = []
+
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint"
+            " WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')",
+            [table],
+        )
+        for name, definition in cursor.fetchall():
+            temporary = self._temporary_name(name)
+            cursor.execute(
+                f"ALTER TABLE {self._quote(staging)}"
+                f" ADD CONSTRAINT {self._quote(temporary)} {definition}"
+            )
+            renames.append(("CONSTRAINT", temporary, name))
+
+        # Índices que no respaldan un constraint (v.g., db_index y Meta.indexes).
+        cursor.execute(
+            "SELECT index_class.relname, pg_index.indisunique,"
+            " pg_get_indexdef(pg_index.indexrelid)"
+            " FROM pg_index"
+            " JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid"
+            " WHERE pg_index.indrelid = %s::regclass AND NOT EXISTS ("
+            "   SELECT 1 FROM pg_constraint"
+            "   WHERE pg_constraint.conindid = pg_index.indexrelid"
+            " )",
+            [table],
+        )
+        for name, unique, definition in cursor.fetchall():
+            temporary = self._temporary_name(name)
+            # pg_get_indexdef: "CREATE [UNIQUE] INDEX name ON table USING ..."
+            _, method = definition.split(" USING ", 1)
+            cursor.execute(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX"
+                f" {self._quote(temporary)} ON {self._quote(staging)}"
+                f" USING {method}"
+            )
+            renames.append(("INDEX", temporary, name))
+
+        return renames
+
+    def _swap(self, cursor, table, staging, old, renames):
+        cursor.execute(
+            f"ALTER TABLE {self._quote(table)} RENAME TO {self._quote(old)}"
+        )
+        cursor.execute(
+            f"ALTER TABLE {self._quote(staging)} RENAME TO {self._quote(table)}"
+        )
+        cursor.execute(f"DROP TABLE {self._quote(old)}")
+
+        for kind, temporary, name in renames:
+            if kind == "CONSTRAINT":
+                cursor.execute(
+                    f"ALTER TABLE {self._quote(table)}"
+                    f" RENAME CONSTRAINT {self._quote(temporary)} TO {self._quote(name)}"
+                )
+            else:
+                cursor.execute(
+                    f"ALTER INDEX {self._quote(temporary)} RENAME TO {self._quote(name)}"
+                )
+
+        # La secuencia de identidad de la tabla staging conserva su nombre.
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'id')", [self._quote(table)]
+        )
+        (sequence,) = cursor.fetchone()
+        sequence_name = f"{table}_id_seq"
+        if sequence is not None and not sequence.endswith(sequence_name):
+            cursor.execute(
+                f"ALTER SEQUENCE {sequence}"
+                f" RENAME TO {self._quote(sequence_name)}"
+            )
+
+    @staticmethod
+    def _temporary_name(name):
+        # Los identificadores en PostgreSQL tienen a lo más 63 caracteres.
+        return f"{name[:58]}_swap"
+
+
+def get_catastro_replace(connection, writer):
+    """Retorna el reemplazo de `CatastroInfo` adecuado para `connection` y `writer`.
+
+    En PostgreSQL, cuando el writer admite registrar en otra tabla, se usa
+    `TableSwapReplace`; en otro caso, `TransactionReplace`.
+    """
+    if connection.vendor == "postgresql" and writer.supports_table:
+        return TableSwapReplace(connection)
+    return TransactionReplace(connection)
+
+
+class SyncSummary:
+    """Resultado de `CatastroSync.sync`."""
+
+    __slots__ = ("inserted", "deleted", "unchanged", "zip_codes")
+
+    def __init__(self):
+        self.inserted = 0
+        self.deleted = 0
+        self.unchanged = 0
+        # Códigos postales con filas agregadas o eliminadas.
+        self.zip_codes = set()
+
+
+class CatastroSync:
+    """Sincroniza los `CatastroInfo` de una alcaldía con las filas de un CSV.
+
+    Cada fila se identifica por el hash de su contenido (`row_hash`), por lo
+    que una fila modificada se aplica como la eliminación de la fila anterior
+    y el registro de la nueva. Las filas sin cambios no se escriben.
+
+    Para el diff se mantiene en memoria el mapa `row_hash` -> ids de las filas
+    registradas de la alcaldía; las filas del CSV se procesan en streaming.
+    """
+
+    # Cantidad de ids por cada DELETE (SQLite limita los parámetros por query).
+    DELETE_BATCH_SIZE = 500
+
+    def __init__(self, connection, writer):
+        self.connection = connection
+        self.writer = writer
+
+    def sync(
+        self, rows, alcaldia_id: int, on_batch=None, append: bool = False
+    ) -> SyncSummary:
+        """Aplica las diferencias entre `rows` y los `CatastroInfo` de `alcaldia_id`.
+
+        Con `append` sólo registra las filas nuevas: no elimina las filas
+        registradas que no están en `rows` (v.g., al cargar las filas
+        corregidas de `RejectLog`).
+
+        Debe ejecutarse dentro de una transacción para que los lectores no
+        vean la sincronización a medias.
+        """
+        summary = SyncSummary()
+        catastro_infos = CatastroInfo.objects.using(self.connection.alias)
+
+        stored_ids = {}
+        for id_, row_hash in (
+            catastro_infos.filter(alcaldia_id=alcaldia_id)
+            .values_list("id", "row_hash")
+            .iterator()
+        ):
+            stored_ids.setdefault(row_hash, []).append(id_)
+
+        codigo_postal_index = CATASTRO_FIELDS.index("codigo_postal")
+        row_hash_index = CATASTRO_FIELDS.index("row_hash")
+
+        def new_rows():
+            for row in rows:
+                ids = stored_ids.get(row[row_hash_index])
+                if ids:
+                    ids.pop()
+                    summary.unchanged += 1
+                    continue
+                summary.zip_codes.add(row[codigo_postal_index])
+                yield row
+
+        summary.inserted = self.writer.write(new_rows(), on_batch=on_batch)
+
+        if append:
+            return summary
+
+        deleted_ids = [id_ for ids in stored_ids.values() for id_ in ids]
+        for batch in batched(deleted_ids, self.DELETE_BATCH_SIZE):
+            deleted = catastro_infos.filter(id__in=batch)
+            summary.zip_codes.update(
+                deleted.values_list("codigo_postal", flat=True).distinct()
+            )
+            deleted.delete()
+            summary.deleted += len(batch)
+
+        return summary
+
+
+# Modos de carga de `pull_alcaldia`:
+# * LOAD_STAGING: registra en la tabla staging de `TableSwapReplace`.
+# * LOAD_REPLACE: reemplaza los datos de la alcaldía con `TransactionReplace`.
+# * LOAD_SYNC: sincroniza los datos de la alcaldía con `CatastroSync`.
+# * LOAD_APPEND: agrega a los datos de la alcaldía las filas no registradas,
+#   con `CatastroSync` (v.g., las filas corregidas de `RejectLog`).
+LOAD_STAGING = "staging"
+LOAD_REPLACE = "replace"
+LOAD_SYNC = "sync"
+LOAD_APPEND = "append"
+
+
+class AlcaldiaTask:
+    """Parámetros de la carga del catastro de una alcaldía con `pull_alcaldia`.
+
+    Debe poder serializarse con pickle para enviarse a otro proceso.
+    """
+
+    __slots__ = (
+        "alcaldia_id",
+        "alcaldia_name",
+        "source",
+        "uso_construccion_map",
+        "mode",
+        "table",
+        "batch_size",
+        "loader",
+        "force",
+        "cache_dir",
+        "download_timeout",
+        "parse_jobs",
+        "rejects_path",
+        "max_errors",
+        "quality_rules",
+    )
+
+    def __init__(
+        self,
+        alcaldia_id: int,
+        alcaldia_name: str,
+        source: str,
+        uso_construccion_map: dict,
+        mode: str,
+        table=None,
+        batch_size: int = 5000,
+        loader: str = "auto",
+        force: bool = False,
+        cache_dir=None,
+        download_timeout: float = DOWNLOAD_TIMEOUT,
+        parse_jobs: int = 1,
+        rejects_path=None,
+        max_errors=None,
+        quality_rules=None,
+    ):
+        self.alcaldia_id = alcaldia_id
+        self.alcaldia_name = alcaldia_name
+        # Url del zip a descargar en `cache_dir` o ruta a un zip o CSV local.
+        self.source = source
+        self.uso_construccion_map = uso_construccion_map
+        self.mode = mode
+        self.table = table
+        self.batch_size = batch_size
+        self.loader = loader
+        self.force = force
+        self.cache_dir = cache_dir
+        self.download_timeout = download_timeout
+        # Procesos que convierten el CSV, ver `read_catastro_rows`.
+        self.parse_jobs = parse_jobs
+        # Archivo de las filas con error y máximo de filas con error, ver
+        # `RejectLog`.
+        self.rejects_path = rejects_path
+        self.max_errors = max_errors
+        # Reglas de calidad de las filas, ver `price_m2.quality`.
+        self.quality_rules = quality_rules
+
+    @property
+    def is_url(self) -> bool:
+        return self.source.startswith(("http://", "https://"))
+
+
+class AlcaldiaResult:
+    """Resultado de `pull_alcaldia` para una alcaldía."""
+
+    LOADED = "loaded"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+
+    def __init__(self, task: AlcaldiaTask):
+        self.alcaldia_id = task.alcaldia_id
+        self.alcaldia_name = task.alcaldia_name
+        self.status = None
+        self.error = ""
+        self.checksum = ""
+        # Si el archivo se descargó o estaba vigente en caché (None si es local).
+        self.downloaded = None
+        self.inserted = 0
+        self.deleted = 0
+        self.unchanged = 0
+        # Filas con error, por tipo de error y archivo donde se escribieron
+        # ("" si no hubo filas con error), ver `RejectLog`.
+        self.rejected_rows = 0
+        self.error_types = {}
+        self.rejects_path = ""
+        # Códigos postales modificados (no se calcula con LOAD_STAGING).
+        self.zip_codes = set()
+        self.elapsed = 0.0
+        self.profile = IngestionProfile()
+
+    @property
+    def rows(self) -> int:
+        """Filas válidas del CSV."""
+        return self.inserted + self.unchanged
+
+    @property
+    def rows_per_second(self) -> float:
+        processed = self.rows + self.rejected_rows
+        return processed / self.elapsed if self.elapsed else 0.0
+
+
+def latest_alcaldia_checksum(alcaldia_id: int) -> str:
+    """Retorna el checksum del archivo de la última carga de la alcaldía ("" si no hay cargas)."""
+    return (
+        CatastroImport.objects.filter(alcaldia_id=alcaldia_id)
+        .order_by("-id")
+        .values_list("checksum", flat=True)
+        .first()
+    ) or ""
+
+
+def pull_alcaldia(task: AlcaldiaTask, on_batch=None) -> AlcaldiaResult:
+    """Descarga (o lee), convierte y registra el catastro de una alcaldía.
+
+    Está pensada para ejecutarse en un pool de procesos: usa su propia
+    conexión a la db y nunca lanza excepciones; los errores se retornan en
+    `AlcaldiaResult.error` para que una alcaldía con error no detenga las
+    demás. Con LOAD_REPLACE, LOAD_SYNC y LOAD_APPEND la carga se hace en una
+    transacción, por lo que ante un error la alcaldía conserva sus datos
+    anteriores.
+
+    Omite la carga (`AlcaldiaResult.SKIPPED`) cuando el archivo tiene el mismo
+    checksum que la última carga de la alcaldía, salvo que `task.force`.
+
+    Las filas con error se escriben en `task.rejects_path` y se cuentan por
+    tipo de error en `AlcaldiaResult.error_types`; con `task.max_errors` la
+    carga falla al superar esa cantidad de filas con error (ver `RejectLog`).
+
+    Las métricas de cada etapa se registran en `AlcaldiaResult.profile`.
+    """
+    result = AlcaldiaResult(task)
+    profile = result.profile
+    rejects = RejectLog()
+    start = time.perf_counter()
+
+    try:
+        if task.is_url:
+            with profile.stage("download") as stats:
+                source = download_source(
+                    task.source, task.cache_dir, task.download_timeout
+                )
+                stats.bytes += source.path.stat().st_size
+            result.downloaded = source.downloaded
+            if not is_zipfile(source.path):
+                raise IngestionError(
+                    f"El archivo devuelto por '{task.source}' no es un zip file."
+                )
+        else:
+            with profile.stage("checksum") as stats:
+                source = local_source(task.source)
+                stats.bytes += source.path.stat().st_size
+        result.checksum = source.checksum
+
+        if not task.force and source.checksum == latest_alcaldia_checksum(
+            task.alcaldia_id
+        ):
+            result.status = AlcaldiaResult.SKIPPED
+            return result
+
+        writer = get_catastro_writer(connection, task.batch_size, task.loader)
+        rejects = RejectLog(task.rejects_path, task.max_errors)
+        codigo_postal_index = CATASTRO_FIELDS.index("codigo_postal")
+
+        with (
+            read_catastro_rows(
+                source.path,
+                task.alcaldia_id,
+                task.uso_construccion_map,
+                rejects,
+                profile,
+                task.parse_jobs,
+                task.quality_rules,
+            ) as (rows, nested_stages),
+            profile.stage("db_write") as write_stats,
+        ):
+
+            match task.mode:
+                case "staging":
+                    # Si la carga falla (v.g., al superar `task.max_errors`
+                    # a mitad del COPY) la conexión sigue usable para
+                    # `TableSwapReplace.discard`, aun dentro de otra
+                    # transacción.
+                    with transaction.atomic():
+                        result.inserted = writer.write(
+                            rows, on_batch=on_batch, table=task.table
+                        )
+                case "replace":
+
+                    def tracked_rows():
+                        for row in rows:
+                            result.zip_codes.add(row[codigo_postal_index])
+                            yield row
+
+                    replace = TransactionReplace(connection)
+                    result.inserted = replace.replace(
+                        lambda table: writer.write(
+                            tracked_rows(), on_batch=on_batch, table=table
+                        ),
+                        alcaldia_id=task.alcaldia_id,
+                    )
+                    result.zip_codes.update(replace.replaced_zip_codes)
+                case "sync" | "append":
+                    with transaction.atomic():
+                        summary = CatastroSync(connection, writer).sync(
+                            rows,
+                            task.alcaldia_id,
+                            on_batch=on_batch,
+                            append=task.mode == LOAD_APPEND,
+                        )
+                    result.inserted = summary.inserted
+                    result.deleted = summary.deleted
+                    result.unchanged = summary.unchanged
+                    result.zip_codes = summary.zip_codes
+                case _:
+                    raise IngestionError(f"Modo '{task.mode}' no soportado.")
+
+        # El registro consume las filas a medida que se leen y convierten.
+        write_stats.rows = result.inserted
+        profile.exclude("db_write", *nested_stages)
+        result.status = AlcaldiaResult.LOADED
+    except Exception as error:
+        logging.exception(
+            "Error cargando el catastro de la alcaldía %s", task.alcaldia_name
+        )
+        result.status = AlcaldiaResult.FAILED
+        result.error = f"{type(error).__name__}: {error}"
+    finally:
+        rejects.close()
+        result.rejected_rows = rejects.total
+        result.error_types = rejects.counts
+        if rejects.total and rejects.path is not None:
+            result.rejects_path = str(rejects.path)
+        result.elapsed = time.perf_counter() - start
+
+    return result
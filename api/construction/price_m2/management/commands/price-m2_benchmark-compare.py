@@ -0,0 +1,108 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+
+# Métricas comparadas y si un valor mayor es una mejora.
+METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "elapsed_ms": False,
+    "elapsed_s": False,
+    "throughput_per_s": True,
+    "rows_per_s": True,
+    "bytes_per_s": True,
+}
+
+
+class Command(BaseCommand):
+    """
+    Comando para comparar dos resultados JSON de los comandos
+    `price-m2_benchmark-*` (v.g., de dos commits).
+
+    Muestra la variación de cada métrica y marca como regresión las que
+    empeoran más de `--threshold` por ciento. Con `--fail-on-regression`
+    termina con error si hay alguna, para usarlo en CI.
+
+    Ejemplo de uso: manage.py price-m2_benchmark-compare base.json new.json
+    """
+
+    DEFAULT_THRESHOLD = 10.0
+
+    def add_arguments(self, parser):
+        parser.add_argument("base", help="Resultados de referencia.")
+        parser.add_argument("new", help="Resultados a comparar.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=self.DEFAULT_THRESHOLD,
+            help=f"Porcentaje de regresión tolerado (default: {self.DEFAULT_THRESHOLD:g}).",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Termina con error si alguna métrica tiene una regresión.",
+        )
+
+    def handle(
+        self,
+        *_,
+        base,
+        new,
+        threshold=DEFAULT_THRESHOLD,
+        fail_on_regression=False,
+        **__,
+    ):
+        base_document = self._load(base)
+        new_document = self._load(new)
+        if base_document["benchmark"] != new_document["benchmark"]:
+            raise CommandError(
+                f"Los resultados son de benchmarks distintos:"
+                f" {base_document['benchmark']} y {new_document['benchmark']}."
+            )
+
+        self.stdout.write(
+            f"{base_document['benchmark']}:"
+            f" {_short_commit(base_document)} -> {_short_commit(new_document)}"
+        )
+        regressions = 0
+        for name, base_summary in base_document["results"].items():
+            new_summary = new_document["results"].get(name)
+            if new_summary is None:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                if not base_summary.get(metric) or metric not in new_summary:
+                    continue
+                change = (
+                    (new_summary[metric] - base_summary[metric])
+                    / base_summary[metric]
+                    * 100
+                )
+                line = (
+                    f"{name:<22} {metric:<16} {base_summary[metric]:>12.3f}"
+                    f" {new_summary[metric]:>12.3f} {change:>+8.1f}%"
+                )
+                worse = -change if higher_is_better else change
+                if worse > threshold:
+                    regressions += 1
+                    self.stdout.write(self.style.ERROR(f"{line} REGRESIÓN"))
+                else:
+                    self.stdout.write(line)
+
+        if regressions and fail_on_regression:
+            raise CommandError(
+                f"{regressions} métricas con regresión mayor a {threshold:g}%."
+            )
+
+    def _load(self, path):
+        try:
+            with open(path, encoding="utf-8") as results_file:
+                return json.load(results_file)
+        except (OSError, ValueError) as error:
+            raise CommandError(
+                f"No se pudo leer el resultado {path}: {error}"
+            ) from error
+
+
+def _short_commit(document):
+    return (document.get("commit") or "sin commit")[:10]
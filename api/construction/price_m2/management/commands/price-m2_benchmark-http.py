@@ -0,0 +1,223 @@
+import http.client
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.core.management import BaseCommand, CommandError
+from price_m2.benchmarks import format_summary, latency_summary, save_results
+from price_m2.models import CatastroResumen
+
+# Endpoints evaluados y su método HTTP.
+ENDPOINTS = {
+    "aggregate": "GET",
+    "aggregate_all": "GET",
+    "batch": "POST",
+    "completion": "GET",
+}
+
+
+class Command(BaseCommand):
+    """
+    Generador de carga HTTP para una instancia local de la API (v.g., levantada
+    con `runserver` o con gunicorn) que usa la misma db que este comando.
+
+    `--concurrency` threads hacen requests durante `--duration` segundos, cada
+    uno con una conexión persistente y eligiendo al azar el endpoint (entre los
+    `--endpoint`) y la llave (código postal, tipo de construcción), tomada de
+    `CatastroResumen`. Reporta, por endpoint, el throughput y los percentiles
+    p50/p95/p99 de la latencia.
+
+    Con `--output` registra los resultados como JSON para compararlos con
+    `price-m2_benchmark-compare`.
+
+    Ejemplo de uso: manage.py price-m2_benchmark-http --url http://localhost:8000 --concurrency 16
+    """
+
+    DEFAULT_DURATION = 30
+    DEFAULT_CONCURRENCY = 8
+    BATCH_SIZE = 50
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://localhost:8000",
+            help="URL base de la API (default: http://localhost:8000).",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=self.DEFAULT_DURATION,
+            help=f"Segundos de la medición (default: {self.DEFAULT_DURATION}).",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=self.DEFAULT_CONCURRENCY,
+            help=f"Requests concurrentes (default: {self.DEFAULT_CONCURRENCY}).",
+        )
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            choices=ENDPOINTS,
+            help="Endpoint a evaluar. Se puede repetir. Por defecto, todos.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Archivo JSON donde registrar los resultados.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Semilla para elegir las llaves (default: 0).",
+        )
+
+    def handle(
+        self,
+        *_,
+        url="http://localhost:8000",
+        duration=DEFAULT_DURATION,
+        concurrency=DEFAULT_CONCURRENCY,
+        endpoint=None,
+        output=None,
+        seed=0,
+        **__,
+    ):
+        self.keys = list(
+            CatastroResumen.objects.values_list(
+                "codigo_postal", "uso_construccion_id"
+            )
+        )
+        if not self.keys:
+            raise CommandError(
+                "No hay datos cargados. (Verificar price-m2_pull-prices-to-db)"
+            )
+
+        self.base_url = urlsplit(url)
+        self.endpoints = endpoint or list(ENDPOINTS)
+        self.deadline = time.perf_counter() + duration
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+        self.stdout.write(
+            f"{concurrency} clientes durante {duration:g}s contra {url}..."
+        )
+        start = time.perf_counter()
+        workers = [
+            threading.Thread(
+                target=self._run_client, args=(random.Random(seed + index),)
+            )
+            for index in range(concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        results = {}
+        for name in self.endpoints:
+            results[name] = latency_summary(self.latencies[name], elapsed)
+            results[name]["errors"] = self.errors[name]
+            self.stdout.write(
+                f"{name:<14} {format_summary(results[name])}"
+                f" errores={self.errors[name]}"
+            )
+
+        if output:
+            save_results(
+                output,
+                "http",
+                {
+                    "url": url,
+                    "duration": duration,
+                    "concurrency": concurrency,
+                    "endpoints": self.endpoints,
+                    "seed": seed,
+                },
+                results,
+            )
+            self.stdout.write(self.style.SUCCESS(f"Resultados en {output}"))
+
+    def _run_client(self, generator):
+        connection = self._connect()
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+
+        while time.perf_counter() < self.deadline:
+            name = generator.choice(self.endpoints)
+            path, body = self._request(name, generator)
+            headers = {"Content-Type": "application/json"} if body else {}
+
+            start = time.perf_counter()
+            try:
+                connection.request(
+                    ENDPOINTS[name], path, body=body, headers=headers
+                )
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                errors[name] += 1
+                connection.close()
+                connection = self._connect()
+                continue
+            latencies[name].append(time.perf_counter() - start)
+            # Sólo las respuestas 5xx cuentan como error: un 4xx también es
+            # una respuesta de la API y su latencia se mide igual.
+            if response.status >= 500:
+                errors[name] += 1
+
+        connection.close()
+        with self.lock:
+            for name, values in latencies.items():
+                self.latencies[name].extend(values)
+            for name, count in errors.items():
+                self.errors[name] += count
+
+    def _connect(self):
+        connection_class = (
+            http.client.HTTPSConnection
+            if self.base_url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        return connection_class(self.base_url.netloc, timeout=30)
+
+    def _request(self, name, generator):
+        """Retorna el path y el body de un request al endpoint `name`."""
+        prefix = f"{self.base_url.path.rstrip('/')}/price-m2"
+        zip_code, construction_type = generator.choice(self.keys)
+        match name:
+            case "aggregate":
+                aggregate = generator.choice(("avg", "max", "min", "median"))
+                path = f"/zip-codes/{zip_code}/aggregate/{aggregate}"
+                return (
+                    f"{prefix}{path}?construction_type={construction_type}",
+                    None,
+                )
+            case "aggregate_all":
+                path = f"/zip-codes/{zip_code}/aggregate/all"
+                return (
+                    f"{prefix}{path}?construction_type={construction_type}",
+                    None,
+                )
+            case "batch":
+                queries = [
+                    {
+                        "zip_code": zip_code,
+                        "construction_type": construction_type,
+                        "aggregate": "avg",
+                    }
+                    for zip_code, construction_type in generator.choices(
+                        self.keys, k=self.BATCH_SIZE
+                    )
+                ]
+                return (
+                    f"{prefix}/zip-codes/aggregate",
+                    json.dumps({"queries": queries}),
+                )
+            case "completion":
+                return f"{prefix}/completion/uso_construccion/", None
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import BaseCommand, call_command
+from price_m2.benchmarks import (
+    save_results,
+    synthetic_catastro_rows,
+    write_catastro_csv,
+)
+from price_m2.models import CatastroInfo
+
+
+class Command(BaseCommand):
+    """
+    Comando para medir el tiempo de `price-m2_pull-prices-to-db` con un CSV
+    local: el de `--source` o uno sintético de `--rows` filas.
+
+    ¡Reemplaza los datos cargados en la db! Usar con una db de pruebas.
+    Requiere el fixture `price-m2_base`.
+
+    Con `--output` registra los resultados como JSON para compararlos con
+    `price-m2_benchmark-compare`.
+
+    Ejemplo de uso: manage.py price-m2_benchmark-ingestion --rows 1000000 --output ingestion.json
+    """
+
+    DEFAULT_ROWS = 100_000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=self.DEFAULT_ROWS,
+            help=f"Filas del CSV sintético (default: {self.DEFAULT_ROWS}).",
+        )
+        parser.add_argument(
+            "--source",
+            help="CSV de catastro a cargar, en lugar de uno sintético.",
+        )
+        parser.add_argument(
+            "--loader",
+            choices=("auto", "bulk_create", "copy"),
+            default="auto",
+            help="Writer de la carga (default: auto).",
+        )
+        parser.add_argument(
+            "--parse-jobs",
+            type=int,
+            help=(
+                "Procesos que convierten el CSV (default: el de"
+                " price-m2_pull-prices-to-db)."
+            ),
+        )
+        parser.add_argument(
+            "--output",
+            help="Archivo JSON donde registrar los resultados.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Semilla para generar las filas (default: 0).",
+        )
+
+    def handle(
+        self,
+        *_,
+        rows=DEFAULT_ROWS,
+        source=None,
+        loader="auto",
+        parse_jobs=None,
+        output=None,
+        seed=0,
+        **__,
+    ):
+        parameters = {
+            "source": source,
+            "loader": loader,
+            "parse_jobs": parse_jobs,
+        }
+        if source is None:
+            parameters.update({"rows": rows, "seed": seed})
+
+        with tempfile.TemporaryDirectory() as workdir:
+            if source is None:
+                source = os.path.join(workdir, "catastro.csv")
+                self.stdout.write(
+                    f"Generando {rows} filas sintéticas...", ending=""
+                )
+                write_catastro_csv(
+                    source, synthetic_catastro_rows(rows, seed=seed)
+                )
+                self.stdout.write(self.style.SUCCESS(" OK"))
+            source = os.path.abspath(source)
+            size = os.path.getsize(source)
+
+            # El comando deja los archivos de filas con error en el directorio
+            # de ejecución.
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                start = time.perf_counter()
+                call_command(
+                    "price-m2_pull-prices-to-db",
+                    "--source",
+                    source,
+                    "--loader",
+                    loader,
+                    "--force",
+                    parse_jobs=parse_jobs,
+                    stdout=StringIO(),
+                )
+                elapsed = time.perf_counter() - start
+            finally:
+                os.chdir(cwd)
+
+        total = CatastroInfo.objects.count()
+        results = {
+            "ingestion": {
+                "rows": total,
+                "bytes": size,
+                "elapsed_s": elapsed,
+                "rows_per_s": total / elapsed,
+                "bytes_per_s": size / elapsed,
+            }
+        }
+        self.stdout.write(
+            f"{total} filas ({size / 2**20:,.1f} MiB) en {elapsed:.2f}s"
+            f" ({total / elapsed:,.0f} filas/s, {size / 2**20 / elapsed:,.1f} MiB/s)"
+        )
+
+        if output:
+            save_results(
+                output,
+                "ingestion",
+                parameters,
+                results,
+            )
+            self.stdout.write(self.style.SUCCESS(f"Resultados en {output}"))
@@ -0,0 +1,119 @@
+import random
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from price_m2.ingestion import (
+    BulkCreateWriter,
+    CopyWriter,
+    IngestionError,
+    catastro_row,
+    get_catastro_writer,
+)
+from price_m2.models import Alcaldia, UsoConstruccion
+from price_m2.quality import QualityRules
+
+
+class Command(BaseCommand):
+    """
+    Comando para comparar el tiempo de registro de `CatastroInfo` con cada writer
+    de `price_m2.ingestion` ("bulk_create" y, en PostgreSQL, "copy").
+
+    Genera filas sintéticas y las registra con cada writer dentro de una transacción
+    que luego se revierte, por lo que la db no queda modificada.
+    Requiere el fixture `price-m2_base`.
+
+    Ejemplo de uso: manage.py price-m2_benchmark-load --rows 500000.
+    """
+
+    DEFAULT_ROWS = 100_000
+    DEFAULT_BATCH_SIZE = 5000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=self.DEFAULT_ROWS,
+            help=f"Cantidad de filas sintéticas (default: {self.DEFAULT_ROWS}).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=self.DEFAULT_BATCH_SIZE,
+            help=f"Tamaño de batch de los writers (default: {self.DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--loader",
+            action="append",
+            choices=(BulkCreateWriter.name, CopyWriter.name),
+            help="Writer a evaluar. Se puede repetir. Por defecto, todos los disponibles.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Semilla para generar las filas (default: 0).",
+        )
+
+    def handle(
+        self,
+        *_,
+        rows=DEFAULT_ROWS,
+        batch_size=DEFAULT_BATCH_SIZE,
+        loader=None,
+        seed=0,
+        **__,
+    ):
+        alcaldia_id = Alcaldia.objects.values_list("id", flat=True).first()
+        uso_construccion_ids = list(
+            UsoConstruccion.objects.values_list("id", flat=True)
+        )
+        if alcaldia_id is None or not uso_construccion_ids:
+            raise CommandError(
+                "No hay alcaldías o usos de construcción. (Verificar loaddata price-m2_base)"
+            )
+
+        if loader is None:
+            loader = [BulkCreateWriter.name]
+            if connection.vendor == "postgresql":
+                loader.append(CopyWriter.name)
+
+        self.stdout.write(f"Generando {rows} filas sintéticas...", ending="")
+        synthetic_rows = self._generate_rows(
+            rows, alcaldia_id, uso_construccion_ids, seed
+        )
+        self.stdout.write(self.style.SUCCESS(" OK"))
+
+        for name in loader:
+            try:
+                writer = get_catastro_writer(connection, batch_size, name)
+            except IngestionError as error:
+                raise CommandError(str(error)) from error
+
+            with transaction.atomic():
+                start = time.perf_counter()
+                total = writer.write(synthetic_rows)
+                elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{name:<12} {total} filas en {elapsed:.3f}s"
+                f" ({total / elapsed:,.0f} filas/s)"
+            )
+
+    def _generate_rows(self, rows, alcaldia_id, uso_construccion_ids, seed):
+        generator = random.Random(seed)
+        rules = QualityRules.from_settings()
+        synthetic_rows = []
+        for _ in range(rows):
+            values = (
+                alcaldia_id,
+                generator.choice(uso_construccion_ids),
+                f"{generator.randint(1000, 1999):05d}",
+                generator.uniform(50, 2000),
+                generator.uniform(30, 1500),
+                generator.uniform(1, 500),
+                generator.uniform(0, 50),
+            )
+            synthetic_rows.append(catastro_row(values, rules))
+        return synthetic_rows
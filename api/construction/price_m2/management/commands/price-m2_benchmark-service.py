@@ -0,0 +1,135 @@
+import random
+import time
+
+from django.core.management import BaseCommand, CommandError
+from price_m2.benchmarks import format_summary, save_results, time_calls
+from price_m2.cache import CachedPriceM2Service, price_m2_cache
+from price_m2.columnar import ColumnarPriceM2Service, columnar_dataset
+from price_m2.constants import AGGREGATE_TYPES
+from price_m2.models import CatastroResumen
+from price_m2.services import PriceM2Service
+
+
+class Command(BaseCommand):
+    """
+    Comando para medir la latencia de los servicios de `price_m2` sobre los
+    datos cargados en la db (v.g., los de `price-m2_generate-catastro`).
+
+    Evalúa, con llaves (código postal, tipo de construcción) tomadas al azar
+    de `CatastroResumen`:
+        * `PriceM2Service.calculate`,
+        * `PriceM2Service.calculate_aggregates` con todas las agregaciones,
+        * `PriceM2Service.calculate_many` en batches de `--batch-size`,
+        * `CachedPriceM2Service.calculate` con el caché lleno, y
+        * `ColumnarPriceM2Service.calculate`, además del tiempo de carga.
+
+    Con `--output` registra los resultados como JSON para compararlos con
+    `price-m2_benchmark-compare`.
+
+    Ejemplo de uso: manage.py price-m2_benchmark-service --iterations 5000 --output service.json
+    """
+
+    DEFAULT_ITERATIONS = 1000
+    DEFAULT_BATCH_SIZE = 100
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=self.DEFAULT_ITERATIONS,
+            help=f"Llamadas por servicio (default: {self.DEFAULT_ITERATIONS}).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=self.DEFAULT_BATCH_SIZE,
+            help=f"Consultas por llamada a calculate_many (default: {self.DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--output",
+            help="Archivo JSON donde registrar los resultados.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Semilla para elegir las llaves (default: 0).",
+        )
+
+    def handle(
+        self,
+        *_,
+        iterations=DEFAULT_ITERATIONS,
+        batch_size=DEFAULT_BATCH_SIZE,
+        output=None,
+        seed=0,
+        **__,
+    ):
+        keys = list(
+            CatastroResumen.objects.values_list(
+                "codigo_postal", "uso_construccion_id"
+            )
+        )
+        if not keys:
+            raise CommandError(
+                "No hay datos cargados. (Verificar price-m2_pull-prices-to-db)"
+            )
+
+        generator = random.Random(seed)
+        queries = [
+            (zip_code, generator.choice(AGGREGATE_TYPES), construction_type)
+            for zip_code, construction_type in generator.choices(
+                keys, k=iterations
+            )
+        ]
+
+        results = {}
+        price_m2_service = PriceM2Service()
+        results["calculate"] = time_calls(price_m2_service.calculate, queries)
+        results["calculate_aggregates"] = time_calls(
+            price_m2_service.calculate_aggregates,
+            [
+                (zip_code, AGGREGATE_TYPES, construction_type)
+                for zip_code, _, construction_type in queries
+            ],
+        )
+        results["calculate_many"] = time_calls(
+            price_m2_service.calculate_many,
+            [
+                (queries[index : index + batch_size],)
+                for index in range(0, len(queries), batch_size)
+            ],
+        )
+
+        cached_service = CachedPriceM2Service()
+        price_m2_cache().clear()
+        for query in queries:
+            cached_service.calculate(*query)
+        results["cached_calculate"] = time_calls(
+            cached_service.calculate, queries
+        )
+
+        start = time.perf_counter()
+        columnar_dataset()
+        results["columnar_load"] = {
+            "elapsed_ms": (time.perf_counter() - start) * 1000
+        }
+        results["columnar_calculate"] = time_calls(
+            ColumnarPriceM2Service().calculate, queries
+        )
+
+        for name, summary in results.items():
+            self.stdout.write(f"{name:<22} {format_summary(summary)}")
+
+        if output:
+            save_results(
+                output,
+                "service",
+                {
+                    "iterations": iterations,
+                    "batch_size": batch_size,
+                    "seed": seed,
+                },
+                results,
+            )
+            self.stdout.write(self.style.SUCCESS(f"Resultados en {output}"))
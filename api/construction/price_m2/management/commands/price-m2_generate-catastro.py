@@ -0,0 +1,75 @@
+import time
+
+from django.core.management import BaseCommand
+from price_m2.benchmarks import synthetic_catastro_rows, write_catastro_csv
+
+
+class Command(BaseCommand):
+    """
+    Comando para generar un CSV de catastro sintético, con el formato del
+    publicado por CDMX, para los benchmarks de la carga y de la API.
+
+    Ver `price_m2.benchmarks.synthetic_catastro_rows` para las distribuciones
+    de cada columna. El CSV se carga con `price-m2_pull-prices-to-db --source`.
+
+    Ejemplo de uso: manage.py price-m2_generate-catastro --rows 2000000 --output catastro.csv
+    """
+
+    DEFAULT_ROWS = 100_000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=self.DEFAULT_ROWS,
+            help=f"Cantidad de filas (default: {self.DEFAULT_ROWS}).",
+        )
+        parser.add_argument(
+            "--output",
+            default="catastro.csv",
+            help="Ruta del CSV generado (default: catastro.csv).",
+        )
+        parser.add_argument(
+            "--zip-codes",
+            type=int,
+            default=150,
+            help="Cantidad de códigos postales (default: 150).",
+        )
+        parser.add_argument(
+            "--invalid-ratio",
+            type=float,
+            default=0.0,
+            help="Fracción de filas con un valor inválido (default: 0).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Semilla para generar las filas (default: 0).",
+        )
+
+    def handle(
+        self,
+        *_,
+        rows=DEFAULT_ROWS,
+        output="catastro.csv",
+        zip_codes=150,
+        invalid_ratio=0.0,
+        seed=0,
+        **__,
+    ):
+        self.stdout.write(f"Generando {rows} filas en {output}...", ending="")
+        start = time.perf_counter()
+        total = write_catastro_csv(
+            output,
+            synthetic_catastro_rows(
+                rows,
+                seed=seed,
+                zip_codes=zip_codes,
+                invalid_ratio=invalid_ratio,
+            ),
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f" OK, {total} filas en {elapsed:.1f}s")
+        )
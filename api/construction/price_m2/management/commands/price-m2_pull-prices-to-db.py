@@ -1,112 +1,714 @@
-import csv
-import urllib.request
-from io import BytesIO, TextIOWrapper
-from zipfile import BadZipFile, ZipFile
+import cProfile
+import hashlib
+import io
+import multiprocessing
+import os
+import pstats
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
+import django
+from django.conf import settings
 from django.core.management import BaseCommand, CommandError
-from price_m2.models import Alcaldia, CatastroInfo, UsoConstruccion
+from django.db import connection
+from django.utils.text import slugify
+from price_m2.columnar import write_snapshot
+from price_m2.constants import CATASTRO_SOURCES
+from price_m2.dataset_version import new_dataset_stamp, publish_dataset_version
+from price_m2.ingestion import (
+    LOAD_APPEND,
+    LOAD_REPLACE,
+    LOAD_STAGING,
+    LOAD_SYNC,
+    AlcaldiaResult,
+    AlcaldiaTask,
+    IngestionError,
+    TableSwapReplace,
+    get_catastro_replace,
+    get_catastro_writer,
+    is_reject_file,
+    pull_alcaldia,
+)
+from price_m2.models import Alcaldia, CatastroImport, UsoConstruccion
+from price_m2.profiling import IngestionProfile
+from price_m2.quality import QualityRules
+from price_m2.services import CatastroResumenService
 
 
 class Command(BaseCommand):
     """
-    Comando para descargar y registrar en DB el CSV de catastro de la alcaldía Álvaro Obregón.
+    Comando para descargar y registrar en DB los CSV de catastro de las alcaldías.
     Ver el modelo `price_m2.models.CatastroInfo` para una lista de los campos registrados.
+    Al finalizar, reconstruye `price_m2.models.CatastroResumen` usado por la API
+    y publica una nueva `price_m2.models.DatasetVersion` que invalida los cachés.
 
-    Cuando algunos registros del CSV no puede ser procesado, se genera un archivo
-    `failed_rows.txt` en la ruta relativa a la ejecución del comando. Por cada línea,
-    el archivo contiene una tupla con el mensaje de la excepción lanzada y el contenido
-    del registro que causó la excepción.
+    Por defecto se cargan las alcaldías con url conocida en
+    `price_m2.constants.CATASTRO_SOURCES`. Con `--alcaldia` se eligen las alcaldías
+    a cargar y con `--source` se usa un zip o CSV del disco (o otra url).
+    Cada alcaldía se descarga, convierte y registra en un proceso del pool (`--jobs`).
+    Una alcaldía con error no detiene a las demás y conserva sus datos anteriores.
 
-    Ejemplo de uso: manage.py price-m2_pull-prices-to-db.
+    Los zips se descargan en el directorio `settings.PRICE_M2_DOWNLOAD_CACHE_DIR`
+    (por defecto `~/.cache/price-m2`). Las siguientes ejecuciones sólo los descargan
+    de nuevo si cambiaron en la web (validando ETag y Last-Modified). La descarga de
+    una alcaldía falla si el servidor no responde en
+    `settings.PRICE_M2_DOWNLOAD_TIMEOUT` segundos.
+    Si el checksum del archivo de una alcaldía es el mismo de su última carga
+    (`price_m2.models.CatastroImport`), se omite esa alcaldía, salvo que se use `--force`.
+
+    El CSV se procesa en streaming:
+    las filas se registran en batches de `--batch-size` elementos, de modo que
+    la memoria usada no depende del tamaño del archivo.
+    Los CSV grandes se dividen en rangos de bytes que se convierten y validan en
+    `--parse-jobs` procesos; un único writer registra las filas en la db, en el
+    orden del CSV (ver `price_m2.ingestion.parse_catastro_parallel`).
+    En PostgreSQL las filas se registran con `COPY ... FROM STDIN`; en los demás
+    backends (v.g., SQLite en development) con `bulk_create`. Ver `--loader`.
+
+    Cuando algunos registros del CSV no pueden ser procesados, se escriben a medida que
+    ocurren en el archivo `rejects-<alcaldía>.csv.gz` del directorio `--rejects-dir`
+    (por defecto, el directorio de ejecución del comando). Es un CSV comprimido con
+    gzip con el número de línea, el tipo de error ("<columna>:<excepción>") y el mensaje
+    de la excepción, seguidos de las columnas originales del registro: una vez
+    corregidos, los registros se pueden agregar al CSV de la alcaldía o cargarse con
+    `--append --source` (sin `--append` el archivo se rechaza, ya que reemplazaría los
+    datos de la alcaldía por sus filas). Al finalizar se reporta la cantidad de
+    registros por tipo de error. Con `--max-errors N` la carga de una alcaldía falla
+    (y conserva sus datos anteriores) al superar N registros con error.
+
+    Los registros que no cumplen las reglas de calidad de
+    `settings.PRICE_M2_QUALITY_RULES` (v.g., `valor_suelo` menor al mínimo) no son
+    registros con error: se registran como inválidos y no se incluyen en el resumen.
+    Al reconstruir el resumen se marcan además los precios atípicos de cada código
+    postal y uso de construcción, si el recorte está configurado. Ver `price_m2.quality`.
+
+    Ejemplo de uso: manage.py price-m2_pull-prices-to-db --batch-size 10000.
+    Ejemplo de uso: manage.py price-m2_pull-prices-to-db --source ~/catastro.zip.
+    Ejemplo de uso: manage.py price-m2_pull-prices-to-db --append \\
+        --source "Coyoacán=rejects-coyoacan.csv.gz".
+    Ejemplo de uso: manage.py price-m2_pull-prices-to-db --jobs 4 \\
+        --source "Coyoacán=~/coyoacan.zip" --source "Tlalpan=~/tlalpan.zip".
 
     Observaciones:
-    * El comando lee y agrega los elementos del CSV. «NO SINCRONIZA».
-      Si la tabla "CatastroInfo" ya tiene elementos, la ejecución los eliminará antes
-      de registrar los nuevos elementos.
-      TODO: Evaluar si la sinconización puede ir acá o es mejor tener un task a futuro.
-    * Adicionalmente, se puede trabajar para que este comando deje un archivo en algún directorio
-      destinado a caché; por ejemplo: ~/.cache, /tmp, /var/cache, etc.
-      Como mejora, se puede validar el MD5 del archivo para confirmar si es el mismo archivo que
-      el almacenado en la web `https://sig.cdmx.gob.mx/datos/#d_datos_cat` de manera que
-      no sea necesario la descarga.
-    * Opcionalmente al punto anterior, se puede agregar un parámetro `--csv_path`
-      para usar el CSV del disco en lugar de desacargarlo.
+    * Por defecto, el comando lee y agrega los elementos del CSV. «NO SINCRONIZA».
+      Si la tabla "CatastroInfo" ya tiene elementos, la ejecución los reemplaza por los
+      nuevos elementos de manera atómica: en PostgreSQL se carga una tabla staging que
+      luego se intercambia con un rename; en otros backends se eliminan y registran los
+      datos de cada alcaldía dentro de una transacción. Mientras tanto, la API sigue
+      respondiendo con los datos anteriores.
+    * Con `--sync` la carga es incremental: cada fila se identifica por el hash de su
+      contenido (`CatastroInfo.row_hash`) y sólo se registran las filas nuevas y se
+      eliminan las que ya no están en el CSV. El resumen y los cachés se invalidan sólo
+      para los códigos postales modificados.
+      NOTA: las filas registradas antes de `row_hash` no tienen hash, por lo que la
+      primera sincronización las reemplaza todas. El hash incluye la calidad de la
+      fila: al cambiar las reglas de calidad se reemplazan las filas cuya calidad cambió.
+    * Con `--append` sólo se registran las filas cuyo hash no está registrado, sin
+      eliminar ninguna (v.g., las filas corregidas de un archivo de filas con error).
+      La carga no se registra en `CatastroImport`, por lo que no cambia el checksum con
+      el que se omiten las cargas: las filas agregadas se conservan hasta que cambie el
+      archivo de la alcaldía.
+    * SQLite no admite escrituras concurrentes: con SQLite las alcaldías se cargan
+      una a la vez.
+    * Con `settings.PRICE_M2_SNAPSHOT_DIR`, antes de publicar la nueva versión se
+      escribe su snapshot para el motor "columnar" de la API (ver `price_m2.columnar`).
+    * Al finalizar se reporta, por etapa (descarga, descompresión, parseo, conversión,
+      registro en db, índices, resumen), el tiempo, las filas/s, los MiB/s y la memoria
+      máxima. Ver `price_m2.profiling`. Con `--profile RUTA` se escribe además el
+      reporte de cProfile y tracemalloc en RUTA (y las estadísticas de cProfile en
+      RUTA.prof, v.g., para snakeviz); la carga se hace en un solo proceso.
     """
 
-    ZIP_URL = "https://catalogo.sig.cdmx.gob.mx/documents/75/download"
     # A la fecha sólo se maneja esta cantidad de tipos de construcción
     LIMIT_USO_CONSTRUCCION = 7
+    DEFAULT_BATCH_SIZE = 5000
+    # Líneas de los reportes de `--profile`.
+    PROFILE_TOP_FUNCTIONS = 40
+    PROFILE_TOP_ALLOCATIONS = 25
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=self.DEFAULT_BATCH_SIZE,
+            help=(
+                "Cantidad de elementos registrados por cada insert"
+                f" (default: {self.DEFAULT_BATCH_SIZE})."
+            ),
+        )
+
+        parser.add_argument(
+            "--loader",
+            choices=("auto", "bulk_create", "copy"),
+            default="auto",
+            help=(
+                "Método de registro en db. 'auto' usa 'copy' en PostgreSQL"
+                " y 'bulk_create' en otros backends (default: auto)."
+            ),
+        )
+
+        parser.add_argument(
+            "--alcaldia",
+            action="append",
+            help=(
+                "Nombre de una alcaldía a cargar. Se puede repetir. Por defecto,"
+                " las alcaldías de --source o las alcaldías con url conocida."
+            ),
+        )
+
+        parser.add_argument(
+            "--source",
+            action="append",
+            metavar="[ALCALDIA=]RUTA",
+            help=(
+                "Ruta a un zip o CSV de catastro en disco (o url de un zip) para"
+                " usar en lugar del archivo publicado. Se puede repetir con el"
+                " formato 'ALCALDIA=RUTA'; sin nombre, aplica a la única"
+                " alcaldía cargada."
+            ),
+        )
+
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            help=(
+                "Cantidad de alcaldías cargadas en paralelo. Por defecto, una"
+                " por alcaldía hasta la cantidad de CPUs (1 en SQLite)."
+            ),
+        )
+
+        parser.add_argument(
+            "--parse-jobs",
+            type=int,
+            help=(
+                "Procesos que convierten el CSV de cada alcaldía. Por defecto,"
+                " las CPUs repartidas entre los procesos de --jobs."
+            ),
+        )
+
+        parser.add_argument(
+            "--rejects-dir",
+            default=".",
+            metavar="DIRECTORIO",
+            help=(
+                "Directorio donde escribir los archivos de filas con error"
+                " (default: el directorio actual)."
+            ),
+        )
 
-    def handle(self, *_, **__):
-        failed_pairs = []
-        catastro_infos = []
+        parser.add_argument(
+            "--max-errors",
+            type=int,
+            help=(
+                "Cantidad máxima de filas con error por alcaldía. Al superarla"
+                " la carga de la alcaldía se cancela y conserva sus datos"
+                " anteriores. Por defecto, sin límite."
+            ),
+        )
+
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help=(
+                "Sincroniza de manera incremental: sólo registra y elimina las"
+                " filas que cambiaron en lugar de reemplazar todos los datos."
+            ),
+        )
+
+        parser.add_argument(
+            "--append",
+            action="store_true",
+            help=(
+                "Agrega las filas no registradas sin eliminar datos, v.g.,"
+                " para cargar un archivo de filas con error corregido."
+            ),
+        )
+
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Carga los datos aunque el archivo no haya cambiado.",
+        )
+
+        parser.add_argument(
+            "--profile",
+            metavar="RUTA",
+            help=(
+                "Escribe en RUTA el reporte de cProfile y tracemalloc de la"
+                " carga (y en RUTA.prof las estadísticas de cProfile). Carga"
+                " las alcaldías en un solo proceso."
+            ),
+        )
 
-        # TODO: De momento, manejamos sólo esta alcaldía por requerimiento.
-        # Convertir a parámetro cuando se soporte más alcaldías.
+    def handle(self, *_, profile=None, **options):
+        if profile is None:
+            return self._load(**options)
+
+        if any(
+            (options.get(name) or 1) > 1 for name in ("jobs", "parse_jobs")
+        ):
+            self.stderr.write(
+                self.style.WARNING(
+                    "Con --profile se usa --jobs 1 y --parse-jobs 1."
+                )
+            )
+        options["jobs"] = options["parse_jobs"] = 1
+
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
         try:
-            alcaldia = Alcaldia.objects.get(name="Álvaro Obregón")
-        except Alcaldia.DoesNotExist:
+            self._load(**options)
+        finally:
+            profiler.disable()
+            self._write_profile(profile, profiler)
+            tracemalloc.stop()
+
+    def _load(
+        self,
+        batch_size=DEFAULT_BATCH_SIZE,
+        loader="auto",
+        alcaldia=None,
+        source=None,
+        jobs=None,
+        parse_jobs=None,
+        rejects_dir=".",
+        max_errors=None,
+        sync=False,
+        append=False,
+        force=False,
+        **__,
+    ):
+        if batch_size < 1:
+            raise CommandError("El parámetro --batch-size debe ser positivo.")
+
+        if jobs is not None and jobs < 1:
+            raise CommandError("El parámetro --jobs debe ser positivo.")
+
+        if parse_jobs is not None and parse_jobs < 1:
+            raise CommandError("El parámetro --parse-jobs debe ser positivo.")
+
+        if max_errors is not None and max_errors < 0:
+            raise CommandError(
+                "El parámetro --max-errors no puede ser negativo."
+            )
+
+        if sync and append:
+            raise CommandError("No se puede usar --sync con --append.")
+
+        try:
+            writer = get_catastro_writer(connection, batch_size, loader)
+        except IngestionError as error:
+            raise CommandError(str(error)) from error
+
+        alcaldia_sources = self._resolve_sources(alcaldia, source)
+        if not append:
+            self._check_reject_files(alcaldia_sources)
+        alcaldias = Alcaldia.objects.filter(
+            name__in=alcaldia_sources
+        ).order_by("name")
+        missing = set(alcaldia_sources) - {item.name for item in alcaldias}
+        if missing:
             self.stderr.write(
                 self.style.ERROR(
-                    "No existe la tabla `Alcaldia` en la db. (Verificar migrate)"
+                    f"No existen las alcaldías {sorted(missing)} en la db."
+                    " (Verificar migrate y loaddata price-m2_base)"
                 )
             )
             return
+
+        uso_construccion_map = self._create_uso_construccion_map()
+
+        if sync or append:
+            replace = None
+            mode = LOAD_SYNC if sync else LOAD_APPEND
+        else:
+            replace = get_catastro_replace(connection, writer)
+            mode = (
+                LOAD_STAGING
+                if isinstance(replace, TableSwapReplace)
+                else LOAD_REPLACE
+            )
+
+        quality_rules = QualityRules.from_settings()
+        tasks = [
+            AlcaldiaTask(
+                alcaldia_id=item.id,
+                alcaldia_name=item.name,
+                source=alcaldia_sources[item.name],
+                uso_construccion_map=uso_construccion_map,
+                mode=mode,
+                table=replace.staging if mode == LOAD_STAGING else None,
+                batch_size=batch_size,
+                loader=writer.name,
+                force=force,
+                cache_dir=settings.PRICE_M2_DOWNLOAD_CACHE_DIR,
+                download_timeout=settings.PRICE_M2_DOWNLOAD_TIMEOUT,
+                rejects_path=os.path.join(
+                    rejects_dir, f"rejects-{slugify(item.name)}.csv.gz"
+                ),
+                max_errors=max_errors,
+                quality_rules=quality_rules,
+            )
+            for item in alcaldias
+        ]
+        jobs = self._jobs(jobs, len(tasks))
+        if parse_jobs is None:
+            parse_jobs = max(1, (os.cpu_count() or 1) // jobs)
+        for task in tasks:
+            task.parse_jobs = parse_jobs
+        self.profile = IngestionProfile()
+
         self.stdout.write(
             self.style.WARNING(
-                ">>> Agregar registros de catastro de la alcaldía Álvaro Obregón. <<<"
+                f">>> Agregar registros de catastro de {len(tasks)} alcaldías"
+                f" ({jobs} procesos, {parse_jobs} procesos de conversión por"
+                f" alcaldía, modo '{mode}', registrando con"
+                f" '{writer.name}'). <<<"
             )
         )
 
-        self.stdout.write("Eliminando registros de CatastroInfo...", ending="")
-        CatastroInfo.objects.all().delete()
-        self.stdout.write(self.style.SUCCESS(" OK"))
-
-        csv_content = self._download_catastro_alvaro_obregon()
+        if mode == LOAD_STAGING:
+            try:
+                replace.prepare()
+            except IngestionError as error:
+                raise CommandError(str(error)) from error
 
-        uso_construccion_map = self._create_uso_construccion_map()
+        try:
+            results = self._pull(tasks, jobs)
+            loaded = [r for r in results if r.status == AlcaldiaResult.LOADED]
 
-        reader = csv.DictReader(TextIOWrapper(csv_content))
-        for row in reader:
-            try:
-                catastro_infos.append(
-                    CatastroInfo(
-                        alcaldia=alcaldia,
-                        uso_construccion=uso_construccion_map[
-                            row["uso_construccion"]
-                        ],
-                        codigo_postal=row["codigo_postal"],
-                        superficie_terreno=float(row["superficie_terreno"]),
-                        superficie_construccion=float(
-                            row["superficie_construccion"]
-                        ),
-                        valor_suelo=float(row["valor_suelo"]),
-                        subsidio=float(row["subsidio"]),
+            changed_zip_codes = None
+            if loaded and mode == LOAD_STAGING:
+                # Las alcaldías no cargadas conservan sus datos anteriores.
+                replace.keep_alcaldias(
+                    list(
+                        Alcaldia.objects.exclude(
+                            id__in=[r.alcaldia_id for r in loaded]
+                        ).values_list("id", flat=True)
                     )
                 )
-            except Exception as error:
-                failed_pairs.append((str(error), str(row)))
+                self.stdout.write("Intercambiando la tabla staging...")
+                replace.finish(self._rebuild_resumen, profile=self.profile)
+            elif loaded:
+                changed_zip_codes = set().union(*(r.zip_codes for r in loaded))
+                self._rebuild_resumen(changed_zip_codes)
+        finally:
+            if mode == LOAD_STAGING:
+                replace.discard()
 
-        total_items = len(failed_pairs) + len(catastro_infos)
+        total_rejected = sum(r.rejected_rows for r in results)
+        total_success = sum(r.rows for r in results)
+        total_items = total_rejected + total_success
         self.stdout.write(f"Total de elementos procesados: {total_items}")
+        self.stdout.write(f"Total de elementos exitosos: {total_success}")
+
+        if total_rejected:
+            self._report_rejects(results, total_rejected)
+
+        if loaded:
+            stamp = new_dataset_stamp()
+            if settings.PRICE_M2_SNAPSHOT_DIR:
+                with self.profile.stage("snapshot"):
+                    self._write_snapshot(stamp)
+            dataset_version = publish_dataset_version(
+                self._combined_checksum(loaded),
+                zip_codes=changed_zip_codes,
+                stamp=stamp,
+            )
+            # Una carga con --append no reemplaza el archivo de la alcaldía.
+            if mode != LOAD_APPEND:
+                CatastroImport.objects.bulk_create(
+                    CatastroImport(
+                        alcaldia_id=r.alcaldia_id,
+                        dataset_version=dataset_version,
+                        checksum=r.checksum,
+                        rows=r.rows,
+                        failed_rows=r.rejected_rows,
+                        elapsed_seconds=r.elapsed,
+                    )
+                    for r in loaded
+                )
+            self.stdout.write(
+                f"Nueva versión de datos: {dataset_version.stamp}"
+            )
+
+        for result in results:
+            self.profile.update(result.profile)
+        self._report_profile()
+
+        failed = [r for r in results if r.status == AlcaldiaResult.FAILED]
+        if failed:
+            raise CommandError(
+                "No se pudo cargar el catastro de las alcaldías: "
+                + ", ".join(r.alcaldia_name for r in failed)
+            )
+
+    def _resolve_sources(self, alcaldia_names, sources):
+        """Retorna un diccionario con la url o ruta a cargar indexada por nombre de alcaldía."""
+        named_sources = {}
+        unnamed_sources = []
+        for value in sources or []:
+            name, separator, path = value.partition("=")
+            # Las rutas y urls pueden contener "=", los nombres no contienen "/" ni ":".
+            if separator and "/" not in name and ":" not in name:
+                named_sources[name] = os.path.expanduser(path)
+            else:
+                unnamed_sources.append(os.path.expanduser(value))
+
+        # Un --source sin nombre aplica a la única alcaldía cargada: la de
+        # --alcaldia o, sin --alcaldia, la única con url conocida.
+        names = alcaldia_names or list(named_sources) or list(CATASTRO_SOURCES)
+
+        if unnamed_sources and (
+            len(unnamed_sources) > 1 or len(names) > 1 or named_sources
+        ):
+            raise CommandError(
+                "Con varias alcaldías, cada --source debe tener el formato"
+                " 'ALCALDIA=RUTA'."
+            )
+
+        alcaldia_sources = {}
+        for name in names:
+            alcaldia_source = (
+                named_sources.get(name)
+                or next(iter(unnamed_sources), None)
+                or CATASTRO_SOURCES.get(name)
+            )
+            if alcaldia_source is None:
+                raise CommandError(
+                    f"No hay un archivo conocido para la alcaldía '{name}'."
+                    f" Usar --source '{name}=RUTA'."
+                )
+            alcaldia_sources[name] = alcaldia_source
+
+        return alcaldia_sources
+
+    @staticmethod
+    def _check_reject_files(alcaldia_sources):
+        """Rechaza los archivos de filas con error, que sólo se cargan con --append.
+
+        Cargarlos reemplazaría (o, con --sync, sincronizaría) los datos de la
+        alcaldía por las filas del archivo.
+        """
+        for name, alcaldia_source in alcaldia_sources.items():
+            if os.path.isfile(alcaldia_source) and is_reject_file(
+                alcaldia_source
+            ):
+                raise CommandError(
+                    f"'{alcaldia_source}' es un archivo de filas con error:"
+                    " reemplazaría los datos de la alcaldía"
+                    f" '{name}'. Usar --append para agregar sus filas."
+                )
+
+    def _jobs(self, jobs, total_tasks):
+        """Retorna la cantidad de procesos del pool."""
+        if connection.vendor == "sqlite":
+            if jobs is not None and jobs > 1:
+                self.stderr.write(
+                    self.style.WARNING(
+                        "SQLite no admite escrituras concurrentes. Se usa --jobs 1."
+                    )
+                )
+            return 1
+
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        return max(1, min(jobs, total_tasks))
+
+    def _pull(self, tasks, jobs):
+        """Ejecuta `pull_alcaldia` por cada tarea y reporta el resultado de cada alcaldía."""
+        results = []
+
+        if jobs == 1:
+            for task in tasks:
+                result = pull_alcaldia(task, on_batch=self._progress(task))
+                self._report(result)
+                results.append(result)
+            return results
+
+        # Los procesos del pool abren sus propias conexiones a la db; la de
+        # este proceso sigue abierta, ya que retiene el advisory lock de
+        # `TableSwapReplace`.
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as executor:
+            futures = {
+                executor.submit(pull_alcaldia, task): task for task in tasks
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except BrokenProcessPool as error:
+                    result = AlcaldiaResult(futures[future])
+                    result.status = AlcaldiaResult.FAILED
+                    result.error = (
+                        f"El proceso terminó inesperadamente: {error}"
+                    )
+                self._report(result)
+                results.append(result)
+
+        return results
+
+    def _progress(self, task):
+        def on_batch(total):
+            self.stdout.write(
+                f"  {task.alcaldia_name}: registrados {total} elementos"
+            )
+
+        return on_batch
+
+    def _report(self, result):
+        """Reporta el estado y el throughput de la carga de una alcaldía."""
+        name = result.alcaldia_name
+        if result.downloaded is False:
+            self.stdout.write(f"{name}: archivo vigente en caché")
+
+        match result.status:
+            case AlcaldiaResult.LOADED:
+                message = (
+                    f"{name}: OK, {result.rows} elementos"
+                    f" ({result.rejected_rows} con error)"
+                    f" en {result.elapsed:.2f}s"
+                    f" ({result.rows_per_second:,.0f} filas/s)"
+                )
+                if result.deleted or result.unchanged:
+                    message += (
+                        f". Sincronización: {result.inserted} registrados,"
+                        f" {result.deleted} eliminados,"
+                        f" {result.unchanged} sin cambios,"
+                        f" {len(result.zip_codes)} códigos postales modificados"
+                    )
+                self.stdout.write(self.style.SUCCESS(message))
+            case AlcaldiaResult.SKIPPED:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{name}: el archivo no cambió desde la última carga"
+                        f" (sha256 {result.checksum}). Se omite la carga."
+                        " Usar --force para cargarlo de nuevo."
+                    )
+                )
+            case _:
+                self.stderr.write(
+                    self.style.ERROR(
+                        f"{name}: error en {result.elapsed:.2f}s, se conservan"
+                        f" los datos anteriores. {result.error}"
+                    )
+                )
+
+    def _report_rejects(self, results, total_rejected):
+        """Reporta las filas con error por tipo de error y los archivos donde se escribieron."""
+        error_types = {}
+        for result in results:
+            for error_type, count in result.error_types.items():
+                error_types[error_type] = (
+                    error_types.get(error_type, 0) + count
+                )
+
         self.stdout.write(
-            f"Total de elementos exitosos: {len(catastro_infos)}"
+            self.style.ERROR(f"Hay {total_rejected} filas con error:")
         )
+        for error_type, count in sorted(
+            error_types.items(), key=lambda item: (-item[1], item[0])
+        ):
+            self.stdout.write(f"  {error_type}: {count}")
+        for result in results:
+            if result.rejects_path:
+                self.stdout.write(
+                    f"  {result.alcaldia_name}: ver {result.rejects_path}"
+                )
+
+    def _write_snapshot(self, stamp):
+        """Escribe el snapshot de la versión `stamp` antes de publicarla.
+
+        Si falla, la versión se publica igual: la API carga los datos desde
+        la db cuando no encuentra el snapshot.
+        """
+        self.stdout.write("Escribiendo el snapshot...", ending="")
+        try:
+            path = write_snapshot(stamp)
+        except OSError as error:
+            self.stdout.write(self.style.ERROR(f" ERROR ({error})"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f" OK ({path})"))
 
-        if failed_pairs:
+    @staticmethod
+    def _combined_checksum(results):
+        """Checksum de la carga: sha256 de los checksums de los archivos de cada alcaldía."""
+        digest = hashlib.sha256()
+        for result in sorted(results, key=lambda r: r.alcaldia_id):
+            digest.update(f"{result.alcaldia_id}:{result.checksum}\n".encode())
+        return digest.hexdigest()
+
+    def _rebuild_resumen(self, zip_codes=None):
+        self.stdout.write("Reconstruyendo CatastroResumen...", ending="")
+        with self.profile.stage("resumen") as stats:
+            total_resumenes = CatastroResumenService().rebuild(zip_codes)
+            stats.rows += total_resumenes
+        self.stdout.write(self.style.SUCCESS(f" OK ({total_resumenes})"))
+
+    def _report_profile(self):
+        """Reporta el tiempo, el throughput y la memoria máxima de cada etapa.
+
+        Con varias alcaldías, los tiempos de las etapas de cada alcaldía se
+        suman aunque se hayan ejecutado en paralelo.
+        """
+        if not self.profile.stages:
+            return
+
+        self.stdout.write(
+            f"{'Etapa':<12} {'Tiempo':>9} {'Filas':>10} {'Filas/s':>10}"
+            f" {'MiB/s':>8} {'Memoria':>10}"
+        )
+        for name, stats in self.profile.items():
+            rows_per_second = (
+                f"{stats.rows_per_second:,.0f}" if stats.rows else "-"
+            )
+            mib_per_second = (
+                f"{stats.bytes_per_second / 2**20:,.1f}"
+                if stats.bytes
+                else "-"
+            )
             self.stdout.write(
-                self.style.ERROR(
-                    f"Hay {len(failed_pairs)} filas con error. Ver archivo failed-rows.txt"
-                )
+                f"{name:<12} {stats.seconds:>8.2f}s {stats.rows:>10}"
+                f" {rows_per_second:>10} {mib_per_second:>8}"
+                f" {stats.peak_memory / 2**20:>6.0f} MiB"
             )
-            with open("failed_rows.txt", "w") as failed_file:
-                failed_file.write("\n\n".join(str(p) for p in failed_pairs))
 
-        if catastro_infos:
-            CatastroInfo.objects.bulk_create(catastro_infos)
+    def _write_profile(self, path, profiler):
+        """Escribe el reporte de cProfile y tracemalloc de la carga en `path`."""
+        profiler.dump_stats(f"{path}.prof")
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+
+        report = io.StringIO()
+        report.write("# cProfile: funciones por tiempo acumulado\n\n")
+        pstats.Stats(profiler, stream=report).sort_stats(
+            pstats.SortKey.CUMULATIVE
+        ).print_stats(self.PROFILE_TOP_FUNCTIONS)
+        report.write(
+            f"\n# tracemalloc: {current / 2**20:.1f} MiB al finalizar,"
+            f" máximo {peak / 2**20:.1f} MiB\n\n"
+        )
+        for statistic in snapshot.statistics("lineno")[
+            : self.PROFILE_TOP_ALLOCATIONS
+        ]:
+            report.write(f"{statistic}\n")
+
+        with open(path, "w") as profile_file:
+            profile_file.write(report.getvalue())
+        self.stdout.write(
+            self.style.SUCCESS(f"Perfil de la carga en {path} y {path}.prof")
+        )
 
     def _create_uso_construccion_map(self):
-        """Obtiene desde db los valores válidos para el campo `uso_construccion`
+        """Obtiene desde db los ids válidos para el campo `uso_construccion` indexados por nombre.
 
         NOTA: Nosotros usamos `Sin Zonificación` para etiquetar algunos `uso_construccion`.
         Pero en el CSV, se usa la cadena vacía "" para representar los `uso_construccion` sin zonificación.
@@ -121,59 +723,9 @@ class Command(BaseCommand):
         uso_construccion = UsoConstruccion.objects.all()[
             : self.LIMIT_USO_CONSTRUCCION
         ]
-        uso_construccion_map = {item.name: item for item in uso_construccion}
+        uso_construccion_map = {
+            item.name: item.id for item in uso_construccion
+        }
         uso_construccion_map[""] = uso_construccion_map["Sin Zonificación"]
 
         return uso_construccion_map
-
-    def _download_catastro_alvaro_obregon(self) -> BytesIO:
-        """
-        Este método descarga el CSV de catastro de la alcaldía Álvaro Obregón.
-
-        NOTA: Considerar que el CSV contiene 1.8 millones de registros.
-        Durante las pruebas la carga funcionó bien. Pero en caso de necesitar mejorar
-        este proceso, se puede manejar el registro por batches o se puede aumentar
-        la infraestructura para considerar un task-queue como Huey o Celery para sincronizar
-        la db con el CSV cada cierto periodo de tiempo.
-
-        Info adicional:
-        - Content-Length: 29612694
-        - Tamaño: 30MB aprox
-        - Formato de archivo: zip
-        """
-        # El comando podría usar un parámetro `path` para no descargar el csv en cada ejecución
-        with urllib.request.urlopen(self.ZIP_URL) as response:
-
-            self.stdout.write("Descargando el archivo...", ending="")
-            zip_data = BytesIO(response.read())
-            self.stdout.write(self.style.SUCCESS(" OK"))
-
-            try:
-                csv_content = self._read_zip_bytes(zip_data)
-            except BadZipFile as error:
-                raise CommandError(
-                    f"El archivo devuelto por '{self.ZIP_URL}' no es un zip file."
-                ) from error
-
-            return csv_content
-
-    def _read_zip_bytes(self, zip_data: BytesIO) -> BytesIO:
-        """Retorna el contenido del CSV dentro del Zip.
-
-        Hay una validación adicional: hasta la fecha, el zip sólo debe contener un único archivo CSV.
-        Otro formato lanzará una excepción.
-        """
-        with ZipFile(zip_data, "r") as zip_catalog:
-            filenames = zip_catalog.namelist()
-
-            self.stdout.write("Archivos encontrados")
-            for name in filenames:
-                self.stdout.write(f"  - {name}")
-
-            if len(filenames) != 1:  # el zip tiene otro formato
-                raise CommandError(
-                    "Hay más de un archivo. El nuevo formato necesita una actualización a este comando."
-                )
-
-            with zip_catalog.open(filenames[0]) as csv_file:
-                return BytesIO(csv_file.read())
@@ -0,0 +1,387 @@
+"""Instrumentación del camino de consulta de la API, en formato Prometheus.
+
+* `stage(name)` mide una etapa del request (v.g., `find_resumen` o `render`).
+  Las etapas pueden anidarse: `service` incluye a `find_resumen`.
+* `query_metrics` se instala como `execute_wrapper` de cada conexión y mide
+  cada consulta a la db, atribuida a la etapa en curso.
+* `record_cache` cuenta los aciertos y fallos del caché de resultados.
+* `MetricsMiddleware` mide cada request y, con `settings.PRICE_M2_SERVER_TIMING`,
+  agrega el header `Server-Timing` con las etapas y la db de ese request.
+* `metrics_view` expone las métricas en `/metrics`, sólo para las IPs de
+  `settings.PRICE_M2_METRICS_ALLOWED_IPS`.
+
+Las métricas son del proceso: con varios workers (v.g., de gunicorn), cada
+scrape de `/metrics` las lee del worker que atiende el request.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+
+from .postgresql_pool.pool import pool_stats
+
+# Límites (en segundos) de los buckets de los histogramas de duración.
+DURATION_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+)
+
+# Límites de los buckets de la cantidad de consultas a la db por request.
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# Etapa de las consultas hechas fuera de `stage`.
+NO_STAGE = "other"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """Contador de Prometheus, con un valor por combinación de labels."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Histograma de Prometheus, con buckets acumulados, suma y conteo."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames=(),
+        buckets=DURATION_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Por combinación de labels: [conteo por bucket..., +Inf, suma].
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = [
+                (key, list(counts)) for key, counts in self.values.items()
+            ]
+        for key, counts in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    {**labels, "le": _format_bound(bound)},
+                    cumulative,
+                )
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+def _format_bound(bound):
+    return bound if isinstance(bound, str) else f"{float(bound):g}"
+
+
+REQUEST_DURATION = Histogram(
+    "price_m2_request_duration_seconds",
+    "Duración de los requests, por vista y código de estado.",
+    ("view", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "price_m2_request_db_queries",
+    "Consultas a la db por request, por vista.",
+    ("view",),
+    buckets=QUERIES_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "price_m2_stage_duration_seconds",
+    "Duración de cada etapa de los requests.",
+    ("stage",),
+)
+QUERY_DURATION = Histogram(
+    "price_m2_db_query_duration_seconds",
+    "Duración de las consultas a la db, por alias y etapa.",
+    ("alias", "stage"),
+)
+CACHE_REQUESTS = Counter(
+    "price_m2_cache_requests_total",
+    "Lecturas del caché de resultados, por resultado (hit o miss).",
+    ("result",),
+)
+
+METRICS = (
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    STAGE_DURATION,
+    QUERY_DURATION,
+    CACHE_REQUESTS,
+)
+
+# Métricas de `postgresql_pool.pool.pool_stats()`: campo, nombre y tipo.
+POOL_METRICS = (
+    ("size", "price_m2_db_pool_connections", "gauge"),
+    ("idle", "price_m2_db_pool_idle_connections", "gauge"),
+    ("max_size", "price_m2_db_pool_max_connections", "gauge"),
+    ("waits", "price_m2_db_pool_waits_total", "counter"),
+    ("wait_seconds", "price_m2_db_pool_wait_seconds_total", "counter"),
+    ("timeouts", "price_m2_db_pool_timeouts_total", "counter"),
+)
+
+
+class RequestMetrics:
+    """Tiempos de las etapas y de la db de un request, para `Server-Timing`."""
+
+    def __init__(self):
+        self.stages = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def server_timing(self, total: float) -> str:
+        entries = [
+            f"{name};dur={seconds * 1000:.3f}"
+            for name, seconds in self.stages.items()
+        ]
+        entries.append(
+            f'db;dur={self.query_seconds * 1000:.3f};desc="{self.queries} queries"'
+        )
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+_request_metrics = contextvars.ContextVar("request_metrics", default=None)
+_current_stage = contextvars.ContextVar("current_stage", default=NO_STAGE)
+
+
+@contextmanager
+def stage(name: str):
+    """Mide la duración del bloque como la etapa `name` del request en curso."""
+    token = _current_stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        _record_stage(
+            name, time.perf_counter() - start, _request_metrics.get()
+        )
+
+
+def _record_stage(name: str, elapsed: float, request_metrics):
+    STAGE_DURATION.observe(elapsed, stage=name)
+    if request_metrics is not None:
+        request_metrics.stages[name] = (
+            request_metrics.stages.get(name, 0) + elapsed
+        )
+
+
+def query_metrics(execute, sql, params, many, context):
+    """`execute_wrapper` que mide cada consulta a la db, ver `install_query_metrics`."""
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        QUERY_DURATION.observe(
+            elapsed,
+            alias=context["connection"].alias,
+            stage=_current_stage.get(),
+        )
+        request_metrics = _request_metrics.get()
+        if request_metrics is not None:
+            request_metrics.queries += 1
+            request_metrics.query_seconds += elapsed
+
+
+def install_query_metrics(sender, connection, **kwargs):
+    """Receiver de `connection_created`: instala `query_metrics` en la conexión.
+
+    Se instala en cada conexión (y no sólo durante los requests) para medir
+    también las consultas de los threads de `sync_to_async`. La lista de
+    wrappers sobrevive a las reconexiones: se instala una sola vez.
+    """
+    if query_metrics not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_metrics)
+
+
+def record_cache(hits: int, misses: int):
+    """Cuenta `hits` aciertos y `misses` fallos del caché de resultados."""
+    if hits:
+        CACHE_REQUESTS.inc(hits, result="hit")
+    if misses:
+        CACHE_REQUESTS.inc(misses, result="miss")
+
+
+class MetricsMiddleware:
+    """Mide la duración y las consultas a la db de cada request.
+
+    La etapa `render` mide la serialización de las respuestas de DRF, que
+    se renderizan luego de la vista.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        request_metrics = RequestMetrics()
+        token = _request_metrics.set(request_metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+        return self._finish(request, response, request_metrics, start)
+
+    async def __acall__(self, request):
+        request_metrics = RequestMetrics()
+        token = _request_metrics.set(request_metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+        return self._finish(request, response, request_metrics, start)
+
+    def process_template_response(self, request, response):
+        request_metrics = _request_metrics.get()
+        start = time.perf_counter()
+
+        def end_render(response):
+            _record_stage(
+                "render", time.perf_counter() - start, request_metrics
+            )
+
+        response.add_post_render_callback(end_render)
+        return response
+
+    def _finish(self, request, response, request_metrics, start):
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        REQUEST_DURATION.observe(
+            elapsed, view=view, status=str(response.status_code)
+        )
+        REQUEST_QUERIES.observe(request_metrics.queries, view=view)
+        if settings.PRICE_M2_SERVER_TIMING:
+            response.headers["Server-Timing"] = request_metrics.server_timing(
+                elapsed
+            )
+        return response
+
+
+def render_metrics() -> str:
+    """Retorna las métricas del proceso en el formato de texto de Prometheus."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(
+            _sample_line(name, labels, value)
+            for name, labels, value in metric.samples()
+        )
+
+    stats = pool_stats()
+    for field, name, metric_type in POOL_METRICS:
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(
+            _sample_line(name, {"alias": alias}, alias_stats[field])
+            for alias, alias_stats in stats.items()
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _sample_line(name, labels, value):
+    if not labels:
+        return f"{name} {value}"
+    label_values = ",".join(
+        f'{label}="{_escape_label(label_value)}"'
+        for label, label_value in labels.items()
+    )
+    return f"{name}{{{label_values}}} {value}"
+
+
+def _escape_label(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def client_ip(request) -> str:
+    """IP del cliente del request, detrás de los proxies de confianza.
+
+    Cuando el request llega de una IP de `PRICE_M2_METRICS_TRUSTED_PROXIES`
+    (v.g., el reverse proxy), la IP del cliente es la última de
+    `X-Forwarded-For` que no es de un proxy de confianza: las anteriores las
+    envía el cliente y no son confiables.
+    """
+    trusted_proxies = settings.PRICE_M2_METRICS_TRUSTED_PROXIES
+    ip = request.META.get("REMOTE_ADDR", "")
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+    while ip in trusted_proxies and forwarded:
+        ip = forwarded.pop().strip()
+    return ip
+
+
+@require_GET
+def metrics_view(request):
+    if client_ip(request) not in settings.PRICE_M2_METRICS_ALLOWED_IPS:
+        raise Http404()
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,94 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import NullIf
+
+
+def build_catastro_resumen(apps, schema_editor):
+    """Registra el resumen de los `CatastroInfo` ya cargados.
+
+    La API sólo lee `CatastroResumen`: sin esto, las agregaciones responden
+    que no existe el código postal hasta la siguiente carga de precios. Usa
+    las fórmulas de precio al crear la migración.
+    """
+    CatastroInfo = apps.get_model("price_m2", "CatastroInfo")
+    CatastroResumen = apps.get_model("price_m2", "CatastroResumen")
+
+    valor_suelo = NullIf(F("valor_suelo"), 0.0)
+    price_unit = F("superficie_terreno") / valor_suelo - F("subsidio")
+    price_unit_construction = F("superficie_construccion") / valor_suelo - F(
+        "subsidio"
+    )
+    grouped = (
+        CatastroInfo.objects.values("codigo_postal", "uso_construccion")
+        .annotate(
+            elements=Count("*"),
+            price_unit_sum=Sum(price_unit),
+            price_unit_min=Min(price_unit),
+            price_unit_max=Max(price_unit),
+            price_unit_construction_sum=Sum(price_unit_construction),
+            price_unit_construction_min=Min(price_unit_construction),
+            price_unit_construction_max=Max(price_unit_construction),
+        )
+        .order_by()
+    )
+    CatastroResumen.objects.bulk_create(
+        (
+            CatastroResumen(
+                uso_construccion_id=row.pop("uso_construccion"), **row
+            )
+            for row in grouped.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_m2", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatastroResumen",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("codigo_postal", models.CharField(max_length=32)),
+                ("elements", models.PositiveIntegerField()),
+                ("price_unit_sum", models.FloatField(null=True)),
+                ("price_unit_min", models.FloatField(null=True)),
+                ("price_unit_max", models.FloatField(null=True)),
+                ("price_unit_construction_sum", models.FloatField(null=True)),
+                ("price_unit_construction_min", models.FloatField(null=True)),
+                ("price_unit_construction_max", models.FloatField(null=True)),
+                (
+                    "uso_construccion",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="price_m2.usoconstruccion",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="catastroresumen",
+            constraint=models.UniqueConstraint(
+                fields=("codigo_postal", "uso_construccion"),
+                name="price_m2_resumen_cp_uso_uniq",
+            ),
+        ),
+        migrations.RunPython(
+            build_catastro_resumen, migrations.RunPython.noop
+        ),
+    ]
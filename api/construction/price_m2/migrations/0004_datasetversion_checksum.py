@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_m2", "0003_datasetversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="datasetversion",
+            name="checksum",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_m2", "0004_datasetversion_checksum"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="catastroinfo",
+            name="row_hash",
+            field=models.CharField(blank=True, default="", max_length=32),
+        ),
+        migrations.AddField(
+            model_name="datasetversion",
+            name="zip_codes",
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_m2", "0005_catastro_sync"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatastroImport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("checksum", models.CharField(max_length=64)),
+                ("rows", models.PositiveIntegerField()),
+                ("failed_rows", models.PositiveIntegerField()),
+                ("elapsed_seconds", models.FloatField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "alcaldia",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="price_m2.alcaldia",
+                    ),
+                ),
+                (
+                    "dataset_version",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="price_m2.datasetversion",
+                    ),
+                ),
+            ],
+        ),
+    ]
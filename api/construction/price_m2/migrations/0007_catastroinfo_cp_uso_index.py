@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_m2", "0006_catastroimport"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="catastroinfo",
+            index=models.Index(
+                fields=["codigo_postal", "uso_construccion"],
+                include=(
+                    "superficie_terreno",
+                    "superficie_construccion",
+                    "valor_suelo",
+                    "subsidio",
+                ),
+                name="price_m2_catastro_cp_uso_idx",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="catastroinfo",
+            name="codigo_postal",
+            field=models.CharField(max_length=32),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_m2", "0007_catastroinfo_cp_uso_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_construction_histogram",
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_construction_median",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_construction_p25",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_construction_p75",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_construction_p90",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_construction_stddev",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_histogram",
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_median",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_p25",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_p75",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_p90",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroresumen",
+            name="price_unit_stddev",
+            field=models.FloatField(null=True),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:00
+
+import math
+
+from django.db import migrations, models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import NullIf
+
+# Reglas por fila de `price_m2.quality` al crear la migración (los valores por
+# defecto de `PRICE_M2_QUALITY_RULES`): la migración no depende del código ni
+# de los settings actuales. Con otras reglas, las filas se evalúan de nuevo al
+# cargar la alcaldía.
+MIN_VALOR_SUELO = 1.0
+NON_FINITE = (math.nan, math.inf, -math.inf)
+
+
+def evaluate_catastro_quality(apps, schema_editor):
+    """Precalcula los precios y la calidad de los `CatastroInfo` ya registrados.
+
+    Aplica sólo las reglas por fila; el recorte de atípicos se aplica al
+    reconstruir el resumen. Como `QualityRules.evaluate`, las filas con
+    precios "nan" o "inf" son inválidas.
+    """
+    CatastroInfo = apps.get_model("price_m2", "CatastroInfo")
+    invalid = (
+        Q(valor_suelo__lte=0)
+        | Q(valor_suelo__lt=MIN_VALOR_SUELO)
+        # En PostgreSQL "NaN" es mayor que cualquier número.
+        | Q(valor_suelo=math.nan)
+        | Q(superficie_terreno__lt=0)
+        | Q(superficie_construccion__lt=0)
+    )
+    for field in ("superficie_terreno", "superficie_construccion", "subsidio"):
+        invalid |= Q(**{f"{field}__in": NON_FINITE})
+
+    valor_suelo = NullIf(F("valor_suelo"), 0.0)
+    CatastroInfo.objects.update(
+        price_unit=F("superficie_terreno") / valor_suelo - F("subsidio"),
+        price_unit_construction=(
+            F("superficie_construccion") / valor_suelo - F("subsidio")
+        ),
+        # 2: INVALID, 1: VALID.
+        quality=Case(When(invalid, then=Value(2)), default=Value(1)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("price_m2", "0008_catastroresumen_distribution"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="catastroinfo",
+            name="price_m2_catastro_cp_uso_idx",
+        ),
+        migrations.AddField(
+            model_name="catastroinfo",
+            name="price_unit",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroinfo",
+            name="price_unit_construction",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="catastroinfo",
+            name="quality",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (0, "Sin evaluar"),
+                    (1, "Válida"),
+                    (2, "Inválida"),
+                    (3, "Atípica"),
+                ],
+                default=0,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="catastroinfo",
+            index=models.Index(
+                fields=["codigo_postal", "uso_construccion", "quality"],
+                include=("price_unit", "price_unit_construction"),
+                name="price_m2_catastro_cp_uso_idx",
+            ),
+        ),
+        migrations.RunPython(
+            evaluate_catastro_quality, migrations.RunPython.noop
+        ),
+    ]
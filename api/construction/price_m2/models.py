@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 
@@ -16,12 +18,149 @@ class UsoConstruccion(models.Model):
 
 
 class CatastroInfo(models.Model):
+
+    class Quality(models.IntegerChoices):
+        """Calidad de la fila según las reglas de `price_m2.quality`."""
+
+        # Registrada fuera de la carga; se evalúa al reconstruir el resumen.
+        PENDING = 0, "Sin evaluar"
+        VALID = 1, "Válida"
+        # No cumple las reglas por fila (v.g., `valor_suelo` cerca a cero).
+        INVALID = 2, "Inválida"
+        # Precio atípico para su código postal y uso de construcción.
+        OUTLIER = 3, "Atípica"
+
     alcaldia = models.ForeignKey(Alcaldia, on_delete=models.PROTECT)
     uso_construccion = models.ForeignKey(
         UsoConstruccion, on_delete=models.PROTECT
     )
-    codigo_postal = models.CharField(max_length=32, db_index=True)
+    codigo_postal = models.CharField(max_length=32)
     superficie_terreno = models.FloatField()
     superficie_construccion = models.FloatField()
     valor_suelo = models.FloatField()
     subsidio = models.FloatField()
+    # Hash del contenido de la fila del CSV; permite sincronizar sólo las
+    # filas que cambiaron. Ver `price_m2.ingestion.catastro_row_hash`.
+    row_hash = models.CharField(max_length=32, blank=True, default="")
+    # Precios precalculados al cargar la fila (None si `valor_suelo` es cero)
+    # y calidad de la fila. Ver `price_m2.quality`.
+    price_unit = models.FloatField(null=True)
+    price_unit_construction = models.FloatField(null=True)
+    quality = models.PositiveSmallIntegerField(
+        choices=Quality, default=Quality.PENDING
+    )
+
+    class Meta:
+        indexes = [
+            # Índice de las agregaciones de las filas válidas por
+            # (`codigo_postal`, `uso_construccion`). En PostgreSQL incluye los
+            # precios precalculados, de modo que las agregaciones se resuelven
+            # con un index-only scan, sin leer la tabla. Los demás backends
+            # crean el índice sin INCLUDE.
+            # También sirve a las consultas sólo por `codigo_postal`.
+            models.Index(
+                fields=["codigo_postal", "uso_construccion", "quality"],
+                include=["price_unit", "price_unit_construction"],
+                name="price_m2_catastro_cp_uso_idx",
+            )
+        ]
+
+
+class CatastroResumen(models.Model):
+    """Resumen materializado de `CatastroInfo` por código postal y uso de construcción.
+
+    Se reconstruye desde el comando `price-m2_pull-prices-to-db` para que
+    `PriceM2Service.calculate` resuelva las agregaciones con una única lectura
+    por la llave (`codigo_postal`, `uso_construccion`) en lugar de recorrer
+    todos los `CatastroInfo` en cada consulta.
+    """
+
+    uso_construccion = models.ForeignKey(
+        UsoConstruccion, on_delete=models.PROTECT
+    )
+    codigo_postal = models.CharField(max_length=32)
+    elements = models.PositiveIntegerField()
+    price_unit_sum = models.FloatField(null=True)
+    price_unit_min = models.FloatField(null=True)
+    price_unit_max = models.FloatField(null=True)
+    price_unit_construction_sum = models.FloatField(null=True)
+    price_unit_construction_min = models.FloatField(null=True)
+    price_unit_construction_max = models.FloatField(null=True)
+    # Distribución de los precios. Ver `constants.PERCENTILES` y
+    # `constants.HISTOGRAM_BINS`. El histograma guarda la cantidad de
+    # elementos de cada intervalo entre el mínimo y el máximo.
+    price_unit_p25 = models.FloatField(null=True)
+    price_unit_median = models.FloatField(null=True)
+    price_unit_p75 = models.FloatField(null=True)
+    price_unit_p90 = models.FloatField(null=True)
+    price_unit_stddev = models.FloatField(null=True)
+    price_unit_histogram = models.JSONField(null=True)
+    price_unit_construction_p25 = models.FloatField(null=True)
+    price_unit_construction_median = models.FloatField(null=True)
+    price_unit_construction_p75 = models.FloatField(null=True)
+    price_unit_construction_p90 = models.FloatField(null=True)
+    price_unit_construction_stddev = models.FloatField(null=True)
+    price_unit_construction_histogram = models.JSONField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["codigo_postal", "uso_construccion"],
+                name="price_m2_resumen_cp_uso_uniq",
+            )
+        ]
+
+    def __str__(self):
+        return f"<{self.codigo_postal}: {self.uso_construccion_id}>"
+
+
+def _new_dataset_stamp():
+    return uuid.uuid4().hex
+
+
+class DatasetVersion(models.Model):
+    """Marca de versión de los datos de catastro.
+
+    El comando `price-m2_pull-prices-to-db` registra una nueva versión por
+    cada carga, junto con el checksum de los archivos cargados; la versión
+    vigente es la última registrada. Los cachés usan el `stamp` para invalidar los
+    resultados calculados con datos anteriores.
+
+    Las sincronizaciones incrementales registran además los códigos postales
+    modificados, de modo que sólo se invaliden los resultados de esos códigos.
+    """
+
+    stamp = models.CharField(
+        max_length=32, unique=True, default=_new_dataset_stamp
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    # SHA-256 de los checksums de los archivos de las alcaldías cargadas.
+    # Ver `CatastroImport` para el checksum del archivo de cada alcaldía.
+    checksum = models.CharField(max_length=64, blank=True, default="")
+    # Códigos postales modificados por una sincronización incremental.
+    # `None` indica una carga completa, que modifica todos los códigos postales.
+    zip_codes = models.JSONField(null=True, blank=True, default=None)
+
+    def __str__(self):
+        return f"<{self.id}: {self.stamp}>"
+
+
+class CatastroImport(models.Model):
+    """Registro de la carga del catastro de una alcaldía.
+
+    Guarda el checksum del archivo cargado, lo que permite omitir la carga de
+    las alcaldías cuyo archivo no cambió, y las métricas de la carga.
+    """
+
+    alcaldia = models.ForeignKey(Alcaldia, on_delete=models.PROTECT)
+    dataset_version = models.ForeignKey(
+        DatasetVersion, on_delete=models.PROTECT
+    )
+    checksum = models.CharField(max_length=64)
+    rows = models.PositiveIntegerField()
+    failed_rows = models.PositiveIntegerField()
+    elapsed_seconds = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"<{self.id}: {self.alcaldia_id} {self.checksum}>"
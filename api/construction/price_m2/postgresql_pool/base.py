@@ -0,0 +1,96 @@
+"""Backend de PostgreSQL (psycopg2) con un pool de conexiones por proceso.
+
+Django 5.0 no incluye un pool de conexiones (llega en Django 5.1, con
+psycopg 3). Con este backend la conexión de Django se toma del pool al
+conectarse y se devuelve al pool al cerrarse, v.g., al final de cada request
+con `CONN_MAX_AGE = 0`. A diferencia de las conexiones persistentes, también
+reutiliza las conexiones con ASGI, donde cada request usa su propio thread.
+
+Se configura con `OPTIONS["pool"]`:
+
+    DATABASES["default"] = {
+        "ENGINE": "price_m2.postgresql_pool",
+        ...
+        "CONN_MAX_AGE": 0,
+        "OPTIONS": {"pool": {"max_size": 10, "timeout": 30}},
+    }
+
+Con `CONN_HEALTH_CHECKS` las conexiones se validan antes de reutilizarlas.
+"""
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from .pool import PoolTimeout, connection_pool
+
+# Valores por defecto de `OPTIONS["pool"]`.
+POOL_MAX_SIZE = 10
+POOL_TIMEOUT = 30
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        options = self.settings_dict["OPTIONS"].get("pool", {})
+        return connection_pool(
+            self.alias,
+            self.settings_dict["NAME"],
+            max_size=options.get("max_size", POOL_MAX_SIZE),
+            timeout=options.get("timeout", POOL_TIMEOUT),
+        )
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        # `super().get_new_connection` fija `self.isolation_level`; para las
+        # conexiones reutilizadas se fija igual, desde OPTIONS.
+        self.isolation_level = IsolationLevel(
+            self.settings_dict["OPTIONS"].get(
+                "isolation_level", IsolationLevel.READ_COMMITTED
+            )
+        )
+        try:
+            return self.pool.getconn(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params
+                ),
+                check=(
+                    self._check_pooled_connection
+                    if self.settings_dict["CONN_HEALTH_CHECKS"]
+                    else None
+                ),
+            )
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        # La conexión vuelve al pool sin una transacción abierta; si no es
+        # posible (v.g., la conexión se cortó), se descarta. Si se cierra
+        # dentro de un `atomic`, Django mantiene la referencia hasta salir del
+        # bloque, de modo que tampoco se puede compartir.
+        discard = bool(self.connection.closed) or self.in_atomic_block
+        if not discard:
+            try:
+                if (
+                    self.connection.info.transaction_status
+                    != TRANSACTION_STATUS_IDLE
+                ):
+                    self.connection.rollback()
+            except self.Database.Error:
+                discard = True
+
+        with self.wrap_database_errors:
+            self.pool.putconn(self.connection, discard=discard)
+
+    @staticmethod
+    def _check_pooled_connection(connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
@@ -0,0 +1,155 @@
+"""Pool de conexiones a la db por proceso, usado por `postgresql_pool.base`.
+
+Las conexiones se reutilizan entre requests (y entre threads) sin pagar el
+handshake TCP y la autenticación de cada conexión nueva. El pool crece hasta
+`max_size` conexiones; cuando están todas en uso, `getconn` espera hasta
+`timeout` segundos a que se libere una.
+
+Cada pool registra las esperas en `stats()`: si `waits` crece, el pool es
+chico para la concurrencia del proceso.
+"""
+
+import logging
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """No se liberó ninguna conexión del pool dentro del timeout."""
+
+
+class ConnectionPool:
+
+    def __init__(self, max_size: int, timeout: float):
+        self.max_size = max_size
+        self.timeout = timeout
+
+        self.idle = []
+        self.size = 0
+        self.condition = threading.Condition()
+
+        # Métricas de las esperas por una conexión.
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def getconn(self, connect, check=None):
+        """Retorna una conexión del pool, o una nueva de `connect()` si hay lugar.
+
+        `check(connection)` valida una conexión reutilizada antes de
+        retornarla; si lanza una excepción, la conexión se descarta.
+        """
+        while True:
+            connection = self._take()
+            if connection is None:
+                break
+            if check is None:
+                return connection
+            try:
+                check(connection)
+            except Exception:
+                logging.info("Se descarta una conexión del pool inválida.")
+                self._discard(connection)
+            else:
+                return connection
+
+        try:
+            return connect()
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def putconn(self, connection, discard: bool = False):
+        """Devuelve `connection` al pool, o la cierra si `discard`."""
+        if discard:
+            self._discard(connection)
+            return
+
+        with self.condition:
+            self.idle.append(connection)
+            self.condition.notify()
+
+    def close_idle(self):
+        """Cierra las conexiones que no están en uso."""
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "size": self.size,
+                "idle": len(self.idle),
+                "max_size": self.max_size,
+                "waits": self.waits,
+                "wait_seconds": self.wait_seconds,
+                "timeouts": self.timeouts,
+            }
+
+    def _take(self):
+        """Retorna una conexión libre, o `None` luego de reservar lugar para una nueva."""
+        with self.condition:
+            if not self.idle and self.size >= self.max_size:
+                start = time.monotonic()
+                self.waits += 1
+                available = self.condition.wait_for(
+                    lambda: self.idle or self.size < self.max_size,
+                    self.timeout,
+                )
+                self.wait_seconds += time.monotonic() - start
+                if not available:
+                    self.timeouts += 1
+                    logging.warning(
+                        "Pool de conexiones agotado: max_size=%s, timeout=%s",
+                        self.max_size,
+                        self.timeout,
+                    )
+                    raise PoolTimeout(
+                        f"No se obtuvo una conexión del pool en {self.timeout}s"
+                        f" (max_size={self.max_size})."
+                    )
+
+            if self.idle:
+                # LIFO: las conexiones menos usadas quedan al fondo y las
+                # cierra el servidor (o pgbouncer) por inactividad.
+                return self.idle.pop()
+
+            self.size += 1
+            return None
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._release_slot()
+
+    def _release_slot(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+
+_pools_lock = threading.Lock()
+_pools = {}
+
+
+def connection_pool(alias: str, name: str, max_size: int, timeout: float):
+    """Retorna el `ConnectionPool` de la db `name` del alias, creándolo la primera vez.
+
+    El pool depende de `name` para no reutilizar conexiones a otra db cuando
+    cambia (v.g., la db de los tests).
+    """
+    with _pools_lock:
+        pool = _pools.get((alias, name))
+        if pool is None:
+            pool = _pools[alias, name] = ConnectionPool(max_size, timeout)
+        return pool
+
+
+def pool_stats() -> dict:
+    """Retorna las métricas de los pools del proceso, por alias de db."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {alias: pool.stats() for (alias, _), pool in pools}
@@ -0,0 +1,158 @@
+"""Métricas por etapa de la carga del catastro (`price-m2_pull-prices-to-db`).
+
+Las etapas de la carga de cada alcaldía se ejecutan en streaming, intercaladas
+fila a fila: la lectura del zip (`unzip`), el parseo del CSV (`csv_parse`), la
+conversión y validación de los valores (`convert`) y el registro en la db
+(`db_write`). Cada etapa acumula sólo su propio tiempo, sin el de las etapas
+que consume (v.g., `db_write` no incluye el parseo de las filas que registra).
+
+Cuando el CSV se convierte en varios procesos (ver
+`ingestion.parse_catastro_parallel`), "read", "csv_parse" y "convert" suman el
+tiempo de todos los procesos y "parse_wait" mide la espera del writer por las
+filas convertidas; `db_write` no la incluye.
+
+La memoria de cada etapa es el RSS máximo del proceso al terminarla: las
+etapas intercaladas comparten el mismo valor.
+"""
+
+import io
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Orden de las etapas en el reporte; las demás se agregan al final.
+INGESTION_STAGES = (
+    "download",
+    "checksum",
+    "unzip",
+    "read",
+    "csv_parse",
+    "convert",
+    "parse_wait",
+    "db_write",
+    "index_build",
+    "resumen",
+    "snapshot",
+)
+
+
+def peak_memory() -> int:
+    """Retorna el RSS máximo del proceso, en bytes (0 si no se puede obtener)."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KiB; macOS, bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageStats:
+    """Tiempo, filas, bytes y memoria máxima acumulados por una etapa."""
+
+    __slots__ = ("seconds", "rows", "bytes", "peak_memory")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.peak_memory = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+class IngestionProfile:
+    """Métricas de las etapas de una carga, en el orden de `INGESTION_STAGES`.
+
+    Debe poder serializarse con pickle: los procesos del pool de carga
+    retornan el perfil de cada alcaldía en su `AlcaldiaResult`.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def __getitem__(self, name: str) -> StageStats:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mide el bloque como la etapa `name`. Genera sus `StageStats`."""
+        stats = self[name]
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += time.perf_counter() - start
+            stats.peak_memory = max(stats.peak_memory, peak_memory())
+
+    def add(self, name: str, seconds: float, rows: int = 0):
+        """Suma `seconds` y `rows` a la etapa `name`."""
+        stats = self[name]
+        stats.seconds += seconds
+        stats.rows += rows
+        stats.peak_memory = max(stats.peak_memory, peak_memory())
+
+    def exclude(self, name: str, *nested):
+        """Descuenta del tiempo de `name` el de las etapas `nested` que ejecutó.
+
+        Las etapas `nested` comparten la memoria máxima de `name`.
+        """
+        stats = self[name]
+        for stage in nested:
+            nested_stats = self.stages.get(stage)
+            if nested_stats is not None:
+                stats.seconds -= nested_stats.seconds
+                nested_stats.peak_memory = max(
+                    nested_stats.peak_memory, stats.peak_memory
+                )
+
+    def update(self, other: "IngestionProfile"):
+        """Acumula las métricas de `other` (v.g., de otra alcaldía)."""
+        for name, other_stats in other.stages.items():
+            stats = self[name]
+            stats.seconds += other_stats.seconds
+            stats.rows += other_stats.rows
+            stats.bytes += other_stats.bytes
+            stats.peak_memory = max(stats.peak_memory, other_stats.peak_memory)
+
+    def items(self):
+        """Retorna los pares (etapa, `StageStats`) en el orden del reporte."""
+        order = {name: index for index, name in enumerate(INGESTION_STAGES)}
+        return sorted(
+            self.stages.items(),
+            key=lambda item: order.get(item[0], len(order)),
+        )
+
+
+class TimedReader(io.RawIOBase):
+    """Archivo binario que acumula en `stats` el tiempo y los bytes de sus lecturas.
+
+    Permite medir la descompresión del zip (o la lectura del CSV) por
+    separado del parseo, que la consume en streaming.
+    """
+
+    def __init__(self, raw, stats: StageStats):
+        self.raw = raw
+        self.stats = stats
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        size = self.raw.readinto(buffer)
+        self.stats.seconds += time.perf_counter() - start
+        self.stats.bytes += size or 0
+        return size
@@ -0,0 +1,159 @@
+"""Reglas de calidad de los datos de catastro, aplicadas una vez al cargarlos.
+
+Cada `CatastroInfo` guarda sus precios precalculados (`price_unit` y
+`price_unit_construction`) y su calidad (`CatastroInfo.Quality`). Las
+agregaciones (`CatastroResumen` y el motor "columnar") sólo usan las filas
+válidas y leen los precios precalculados, sin dividir por `valor_suelo` en
+cada consulta.
+
+* Reglas por fila, evaluadas al convertir el CSV (`QualityRules.evaluate`):
+  `valor_suelo` positivo y de al menos `min_valor_suelo`, y superficies no
+  negativas (`non_negative_surfaces`). Las filas que no las cumplen se
+  registran como `INVALID`.
+* Recorte de valores atípicos por código postal y uso de construcción,
+  aplicado al reconstruir el resumen (ver `CatastroResumenService.rebuild`):
+  con `trim = "iqr"` se descartan los precios fuera de
+  [Q1 - k * IQR, Q3 + k * IQR] (`iqr_factor` es k); con
+  `trim = "percentile"`, los precios fuera de los percentiles
+  `trim_percentiles`. Las filas descartadas se registran como `OUTLIER`. Sólo
+  se recortan las llaves con al menos `trim_min_elements` filas válidas.
+
+Las reglas se configuran en `settings.PRICE_M2_QUALITY_RULES`. Las filas
+registradas fuera de la carga (v.g., desde el admin) quedan como `PENDING` y
+se evalúan en db al reconstruir el resumen.
+"""
+
+import math
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import CatastroInfo
+
+# Métodos de recorte de valores atípicos de `QualityRules.trim`.
+TRIM_IQR = "iqr"
+TRIM_PERCENTILE = "percentile"
+
+# Valores que `invalid_filter` descarta como `math.isfinite` en `evaluate`.
+NON_FINITE = (math.nan, math.inf, -math.inf)
+
+
+class QualityRules:
+    """Reglas de calidad de los `CatastroInfo`, ver el docstring del módulo.
+
+    Debe poder serializarse con pickle: viaja en las `AlcaldiaTask` a los
+    procesos de la carga.
+    """
+
+    __slots__ = (
+        "min_valor_suelo",
+        "non_negative_surfaces",
+        "trim",
+        "iqr_factor",
+        "trim_percentiles",
+        "trim_min_elements",
+    )
+
+    def __init__(
+        self,
+        min_valor_suelo: float = 0.0,
+        non_negative_surfaces: bool = True,
+        trim=None,
+        iqr_factor: float = 1.5,
+        trim_percentiles=(0.01, 0.99),
+        trim_min_elements: int = 10,
+    ):
+        if trim not in (None, TRIM_IQR, TRIM_PERCENTILE):
+            raise ValueError(
+                f"Recorte '{trim}' no soportado. Valores válidos:"
+                f" None, '{TRIM_IQR}', '{TRIM_PERCENTILE}'."
+            )
+        self.min_valor_suelo = min_valor_suelo
+        self.non_negative_surfaces = non_negative_surfaces
+        self.trim = trim
+        self.iqr_factor = iqr_factor
+        self.trim_percentiles = tuple(trim_percentiles)
+        self.trim_min_elements = trim_min_elements
+
+    @classmethod
+    def from_settings(cls) -> "QualityRules":
+        """Reglas de `settings.PRICE_M2_QUALITY_RULES`."""
+        return cls(**settings.PRICE_M2_QUALITY_RULES)
+
+    def evaluate(
+        self,
+        superficie_terreno: float,
+        superficie_construccion: float,
+        valor_suelo: float,
+        subsidio: float,
+    ):
+        """Retorna (`price_unit`, `price_unit_construction`, calidad) de una fila.
+
+        Los precios son None cuando `valor_suelo` es cero. Es la misma
+        evaluación que `invalid_filter` y `services.price_unit_expression`
+        hacen en db.
+        """
+        if valor_suelo:
+            price_unit = superficie_terreno / valor_suelo - subsidio
+            price_unit_construction = (
+                superficie_construccion / valor_suelo - subsidio
+            )
+        else:
+            price_unit = price_unit_construction = None
+
+        valid = (
+            valor_suelo > 0
+            and valor_suelo >= self.min_valor_suelo
+            and not (
+                self.non_negative_surfaces
+                and (superficie_terreno < 0 or superficie_construccion < 0)
+            )
+            # Descarta los "nan" e "inf" del CSV.
+            and math.isfinite(price_unit)
+            and math.isfinite(price_unit_construction)
+        )
+        quality = (
+            CatastroInfo.Quality.VALID
+            if valid
+            else CatastroInfo.Quality.INVALID
+        )
+        return price_unit, price_unit_construction, quality
+
+    def invalid_filter(self) -> Q:
+        """Filtro de los `CatastroInfo` que no cumplen las reglas por fila."""
+        invalid = (
+            Q(valor_suelo__lte=0)
+            | Q(valor_suelo__lt=self.min_valor_suelo)
+            # En PostgreSQL "NaN" es mayor que cualquier número.
+            | Q(valor_suelo=math.nan)
+        )
+        # Los precios son "nan" o "inf" (ver `evaluate`).
+        for field in (
+            "superficie_terreno",
+            "superficie_construccion",
+            "subsidio",
+        ):
+            invalid |= Q(**{f"{field}__in": NON_FINITE})
+        if self.non_negative_surfaces:
+            invalid |= Q(superficie_terreno__lt=0) | Q(
+                superficie_construccion__lt=0
+            )
+        return invalid
+
+    def trim_fractions(self) -> dict:
+        """Percentiles que definen los límites del recorte, por nombre."""
+        match self.trim:
+            case "iqr":
+                return {"q1": 0.25, "q3": 0.75}
+            case "percentile":
+                low, high = self.trim_percentiles
+                return {"low": low, "high": high}
+            case _:
+                return {}
+
+    def trim_bounds(self, percentiles: dict):
+        """Límites (inclusive) de los precios no atípicos, a partir de `trim_fractions`."""
+        if self.trim == TRIM_IQR:
+            spread = self.iqr_factor * (percentiles["q3"] - percentiles["q1"])
+            return percentiles["q1"] - spread, percentiles["q3"] + spread
+        return percentiles["low"], percentiles["high"]
@@ -0,0 +1,133 @@
+"""Lecturas de la API desde réplicas de la db (`settings.PRICE_M2_DB_REPLICAS`).
+
+`ReplicaRouter` envía a una réplica las lecturas hechas dentro de
+`replica_reads()`, v.g., en las vistas decoradas con `read_from_replica`. El
+resto de las lecturas (v.g., las del comando de carga), las escrituras y las
+migraciones usan la db `default`.
+
+Una réplica sólo se usa cuando ya replicó la versión vigente de los datos
+(`current_dataset_version`, que siempre se lee de `default`). Mientras una
+carga se replica, las lecturas vuelven a `default`: así los cachés y el motor
+"columnar" de la nueva versión nunca guardan datos de la versión anterior.
+El estado de cada réplica se memoriza durante
+`settings.PRICE_M2_DATASET_VERSION_TTL` segundos.
+"""
+
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError
+
+from .dataset_version import INITIAL_DATASET_STAMP, current_dataset_version
+from .models import DatasetVersion
+
+_replica_reads = contextvars.ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Permite que las lecturas del bloque usen una réplica."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_from_replica(view):
+    """Decorador de vistas (sync o async) que leen de una réplica."""
+    if iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def async_view(*args, **kwargs):
+            with replica_reads():
+                return await view(*args, **kwargs)
+
+        return async_view
+
+    @functools.wraps(view)
+    def sync_view(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+
+    return sync_view
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        # `DatasetVersion` define qué réplicas están al día: se lee de `default`.
+        if model is DatasetVersion or not _replica_reads.get():
+            return None
+        return replica_for_read()
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.PRICE_M2_DB_REPLICAS:
+            return False
+        return None
+
+
+def replica_for_read():
+    """Retorna el alias de una réplica al día con los datos, o `None` si no hay."""
+    replicas = [
+        alias
+        for alias in settings.PRICE_M2_DB_REPLICAS
+        if _replica_in_sync(alias)
+    ]
+    return random.choice(replicas) if replicas else None
+
+
+_memo_lock = threading.Lock()
+_memo = {}
+
+
+def _replica_in_sync(alias: str) -> bool:
+    now = time.monotonic()
+    version = current_dataset_version()
+
+    with _memo_lock:
+        memo = _memo.get(alias)
+        if memo is not None and memo["version"] == version:
+            if memo["in_sync"] or now < memo["expires_at"]:
+                return memo["in_sync"]
+
+    try:
+        in_sync = replica_dataset_version(alias) == version
+    except DatabaseError:
+        logging.warning(
+            "No se pudo consultar la réplica '%s'", alias, exc_info=True
+        )
+        in_sync = False
+
+    if not in_sync:
+        logging.info(
+            "La réplica '%s' no replicó la versión %s; se lee de 'default'.",
+            alias,
+            version,
+        )
+
+    with _memo_lock:
+        _memo[alias] = {
+            "version": version,
+            "in_sync": in_sync,
+            "expires_at": now + settings.PRICE_M2_DATASET_VERSION_TTL,
+        }
+    return in_sync
+
+
+def replica_dataset_version(alias: str) -> str:
+    """Retorna la última versión de los datos replicada en la db `alias`."""
+    stamp = (
+        DatasetVersion.objects.using(alias)
+        .order_by("-id")
+        .values_list("stamp", flat=True)
+        .first()
+    )
+    return INITIAL_DATASET_STAMP if stamp is None else stamp
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from .constants import AGGREGATE_TYPES, BATCH_AGGREGATE_LIMIT
 from .models import Alcaldia, UsoConstruccion
 
 
@@ -13,3 +14,16 @@ class UsoConstruccionCompletionSerializer(serializers.ModelSerializer):
     class Meta:
         model = UsoConstruccion
         fields = "id", "name"
+
+
+class AggregateQuerySerializer(serializers.Serializer):
+    # El max_length de `zip_code` sigue al de la url de `aggregated_price_by_m2`.
+    zip_code = serializers.CharField(max_length=10)
+    construction_type = serializers.IntegerField()
+    aggregate = serializers.ChoiceField(choices=AGGREGATE_TYPES)
+
+
+class BatchAggregateSerializer(serializers.Serializer):
+    queries = AggregateQuerySerializer(
+        many=True, allow_empty=False, max_length=BATCH_AGGREGATE_LIMIT
+    )
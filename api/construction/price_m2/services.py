@@ -1,17 +1,39 @@
+import itertools
 import logging
+import math
+from operator import itemgetter
 
+from django.db import connection, transaction
 from django.db.models import (
-    Avg,
+    Aggregate,
+    Case,
     Count,
+    Exists,
     ExpressionWrapper,
     F,
+    FilteredRelation,
     FloatField,
     Max,
     Min,
+    Q,
+    StdDev,
+    Sum,
+    Value,
+    When,
 )
+from django.db.models.functions import Coalesce, Floor, Least, NullIf
 
-from .constants import NO_CONSTRUCTION_FOUND_MESSAGE, NO_ZIP_CODE_FOUND_MESSAGE
-from .models import CatastroInfo, UsoConstruccion
+from .constants import (
+    AGGREGATE_TYPES,
+    HISTOGRAM_BINS,
+    NO_CONSTRUCTION_FOUND_MESSAGE,
+    NO_ZIP_CODE_FOUND_MESSAGE,
+    PERCENTILES,
+)
+from .metrics import stage
+from .models import CatastroInfo, CatastroResumen, UsoConstruccion
+from .quality import QualityRules
+from .utils import batched
 
 
 class ServiceError(Exception):
@@ -30,8 +52,129 @@ class ServiceError(Exception):
         return self.message
 
 
+def price_unit_expression():
+    """price_unit = superficie_terreno / valor_suelo - subsidio (NULL si valor_suelo es cero)"""
+    return ExpressionWrapper(
+        (F("superficie_terreno") / NullIf(F("valor_suelo"), 0.0))
+        - F("subsidio"),
+        output_field=FloatField(),
+    )
+
+
+def price_unit_construction_expression():
+    """price_unit_construction = superficie_construccion / valor_suelo - subsidio (NULL si valor_suelo es cero)"""
+    return ExpressionWrapper(
+        (F("superficie_construccion") / NullIf(F("valor_suelo"), 0.0))
+        - F("subsidio"),
+        output_field=FloatField(),
+    )
+
+
+# Precios agregados, con la expresión que los calcula en db. Los
+# `CatastroInfo` guardan los precios precalculados en columnas con el mismo
+# nombre; las expresiones sólo se evalúan para las filas `PENDING`, ver
+# `CatastroQualityService`.
+PRICE_EXPRESSIONS = {
+    "price_unit": price_unit_expression,
+    "price_unit_construction": price_unit_construction_expression,
+}
+
+# Campos de `CatastroResumen` usados para evaluar las agregaciones.
+RESUMEN_FIELDS = ("elements",) + tuple(
+    f"{column}_{field}"
+    for column in PRICE_EXPRESSIONS
+    for field in ("sum", "min", "max", *PERCENTILES, "stddev", "histogram")
+)
+
+
+class PercentileCont(Aggregate):
+    """PERCENTILE_CONT de PostgreSQL: el percentil `fraction` con interpolación lineal."""
+
+    function = "PERCENTILE_CONT"
+    name = "PercentileCont"
+    template = (
+        "%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+    )
+    output_field = FloatField()
+
+
+def percentile_cont(values, fraction: float):
+    """Percentil de `values` (ordenados) con interpolación lineal, como PERCENTILE_CONT."""
+    if not len(values):
+        return None
+    rank = fraction * (len(values) - 1)
+    lower = math.floor(rank)
+    return _interpolate(values[lower], values[math.ceil(rank)], rank - lower)
+
+
+def _interpolate(lower_value, upper_value, weight):
+    return lower_value + weight * (upper_value - lower_value)
+
+
+class PercentileStream:
+    """Calcula los percentiles `fractions` de `total` valores recibidos en orden ascendente.
+
+    Sólo guarda los valores de los rangos que interpolan cada percentil, de
+    modo que la memoria usada no depende de `total`.
+    """
+
+    def __init__(self, total: int, fractions=PERCENTILES):
+        self.ranks = {
+            name: fraction * (total - 1)
+            for name, fraction in fractions.items()
+        }
+        self.positions = {
+            position
+            for rank in self.ranks.values()
+            for position in (math.floor(rank), math.ceil(rank))
+        }
+        self.values = {}
+        self.index = 0
+
+    def add(self, value: float):
+        if self.index in self.positions:
+            self.values[self.index] = value
+        self.index += 1
+
+    def percentiles(self) -> dict:
+        return {
+            name: _interpolate(
+                self.values[math.floor(rank)],
+                self.values[math.ceil(rank)],
+                rank - math.floor(rank),
+            )
+            for name, rank in self.ranks.items()
+        }
+
+
+def population_stddev(values):
+    """Desviación estándar poblacional de `values`, como STDDEV_POP."""
+    if not len(values):
+        return None
+    mean = math.fsum(values) / len(values)
+    return math.sqrt(
+        math.fsum((value - mean) ** 2 for value in values) / len(values)
+    )
+
+
+def histogram_bin(value: float, low: float, high: float) -> int:
+    """Intervalo del histograma de `value`, entre `low` y `high` (inclusive).
+
+    Es la misma fórmula que `CatastroResumenService._add_histograms` evalúa en db.
+    """
+    if high == low:
+        return 0
+    return min(
+        math.floor((value - low) * HISTOGRAM_BINS / (high - low)),
+        HISTOGRAM_BINS - 1,
+    )
+
+
 class PriceM2Service:
 
+    # Cantidad de códigos postales por consulta en `calculate_many`.
+    ZIP_CODES_BATCH_SIZE = 500
+
     def calculate(self, zip_code: str, aggregate: str, construction_type: int):
         """Evalúa la agregación (avg, max, min) filtrando los `CatastroInfo`s por `zip_code`
         y `construction_type`.
@@ -40,6 +183,10 @@ class PriceM2Service:
             price_unit = superficie_terreno / valor_suelo - subsidio
             price_unit_construction = superficie_construccion / valor_suelo - subsidio
 
+        Las agregaciones se leen del resumen precalculado `CatastroResumen`,
+        ver `CatastroResumenService.rebuild`. Sólo consideran los `CatastroInfo`
+        válidos según las reglas de calidad de `price_m2.quality`.
+
         Lanza la excepción `ServiceError` en los siguientes casos:
             * cuando el zip_code no se encuentra en la db, y
             * cuando el construction_type no se encuentra en la db.
@@ -68,74 +215,689 @@ class PriceM2Service:
         ... }
         """
 
-        if not UsoConstruccion.objects.filter(id=construction_type).exists():
-            logging.warning(
-                "Error buscando construction_type=%s. Info: zip_code=%s, aggregate=%s",
-                construction_type,
-                zip_code,
-                aggregate,
+        with stage("find_resumen"):
+            resumen = self._find_resumen(
+                zip_code, aggregate, construction_type
+            )
+        with stage("aggregate"):
+            return aggregate_resumen(aggregate, resumen)
+
+    def calculate_aggregates(
+        self, zip_code: str, aggregates, construction_type: int
+    ):
+        """Evalúa varias agregaciones de una misma llave, como `calculate`.
+
+        El resumen de la llave se lee una sola vez, en una consulta, y todas
+        las agregaciones se evalúan sobre él.
+
+        Retorna una lista con el resultado de `calculate` de cada elemento de
+        `aggregates`, en el mismo orden. Lanza `ServiceError` en los mismos
+        casos que `calculate`.
+
+        Por ejemplo:
+        >>> price_m2_service = PriceM2Service()
+        >>> price_m2_service.calculate_aggregates("10101", ["max", "min"], 1)
+        ... [
+        ...    {"type": "max", "price_unit": 77, "price_unit_construction": 37, "elements": 2},
+        ...    {"type": "min", "price_unit": 57.23529411764706, ...},
+        ... ]
+        """
+        aggregates = list(aggregates)
+        with stage("find_resumen"):
+            resumen = self._find_resumen(
+                zip_code, ",".join(aggregates), construction_type
+            )
+        with stage("aggregate"):
+            return [
+                aggregate_resumen(aggregate, resumen)
+                for aggregate in aggregates
+            ]
+
+    async def acalculate(
+        self, zip_code: str, aggregate: str, construction_type: int
+    ):
+        """Versión async de `calculate`."""
+        with stage("find_resumen"):
+            resumen = await self._afind_resumen(
+                zip_code, aggregate, construction_type
+            )
+        with stage("aggregate"):
+            return aggregate_resumen(aggregate, resumen)
+
+    async def acalculate_aggregates(
+        self, zip_code: str, aggregates, construction_type: int
+    ):
+        """Versión async de `calculate_aggregates`."""
+        aggregates = list(aggregates)
+        with stage("find_resumen"):
+            resumen = await self._afind_resumen(
+                zip_code, ",".join(aggregates), construction_type
+            )
+        with stage("aggregate"):
+            return [
+                aggregate_resumen(aggregate, resumen)
+                for aggregate in aggregates
+            ]
+
+    def _find_resumen(
+        self, zip_code: str, aggregate: str, construction_type: int
+    ):
+        """Retorna el `CatastroResumen` de la llave, o `None` si no tiene elementos.
+
+        Lanza `ServiceError` si el `zip_code` o el `construction_type` no
+        existen. `aggregate` sólo se usa para registrar el error.
+        """
+        row = self._resumen_query(zip_code, construction_type).first()
+        return self._resumen_from_row(
+            row, zip_code, aggregate, construction_type
+        )
+
+    async def _afind_resumen(
+        self, zip_code: str, aggregate: str, construction_type: int
+    ):
+        """Versión async de `_find_resumen`."""
+        row = await self._resumen_query(zip_code, construction_type).afirst()
+        return self._resumen_from_row(
+            row, zip_code, aggregate, construction_type
+        )
+
+    def _resumen_query(self, zip_code: str, construction_type: int):
+        # Una sola consulta resuelve el resumen y las validaciones: se parte del
+        # `UsoConstruccion` (no hay filas si el `construction_type` no existe),
+        # con un LEFT JOIN al resumen por la llave (`codigo_postal`,
+        # `uso_construccion`) y un EXISTS que indica si el `zip_code` existe.
+        return (
+            UsoConstruccion.objects.filter(id=construction_type)
+            .annotate(
+                resumen=FilteredRelation(
+                    "catastroresumen",
+                    condition=Q(catastroresumen__codigo_postal=zip_code),
+                ),
+                zip_code_exists=Exists(
+                    CatastroResumen.objects.filter(codigo_postal=zip_code)
+                ),
+            )
+            .values(
+                "zip_code_exists",
+                *(f"resumen__{field}" for field in RESUMEN_FIELDS),
+            )
+        )
+
+    def _resumen_from_row(
+        self, row, zip_code: str, aggregate: str, construction_type: int
+    ):
+        if row is None:
+            raise construction_type_not_found(
+                zip_code, aggregate, construction_type
+            )
+
+        if row["resumen__elements"] is not None:
+            resumen = CatastroResumen(
+                codigo_postal=zip_code,
+                uso_construccion_id=construction_type,
+                **{
+                    field: row[f"resumen__{field}"] for field in RESUMEN_FIELDS
+                },
+            )
+        elif row["zip_code_exists"]:
+            resumen = None
+        else:
+            raise zip_code_not_found(zip_code, aggregate, construction_type)
+
+        return resumen
+
+    def calculate_many(self, queries):
+        """Evalúa varias agregaciones como `calculate`, con una consulta agrupada.
+
+        `queries` es un iterable de tuplas (zip_code, aggregate, construction_type).
+        Los resúmenes de todos los códigos postales se leen juntos (en batches de
+        `ZIP_CODES_BATCH_SIZE` códigos postales) y los tipos de construcción sólo
+        se validan, también juntos, cuando falta algún resumen.
+
+        Retorna una lista con un elemento por cada tupla, en el mismo orden:
+        el diccionario que retornaría `calculate` o, en lugar de lanzarla, la
+        `ServiceError` de esa tupla. Un error no afecta a las demás tuplas.
+
+        Por ejemplo:
+        >>> price_m2_service = PriceM2Service()
+        >>> price_m2_service.calculate_many(
+        ...   [("10101", "max", 1), ("99999", "avg", 1)]
+        ... )
+        ... [
+        ...    {"type": "max", "price_unit": 77, "price_unit_construction": 37, "elements": 2},
+        ...    ServiceError("No se halló el código zip solicitado"),
+        ... ]
+        """
+        queries = list(queries)
+
+        resumenes = {}
+        zip_codes = sorted({zip_code for zip_code, _, _ in queries})
+        for batch in batched(zip_codes, self.ZIP_CODES_BATCH_SIZE):
+            for resumen in CatastroResumen.objects.filter(
+                codigo_postal__in=batch
+            ):
+                key = resumen.codigo_postal, resumen.uso_construccion_id
+                resumenes[key] = resumen
+        found_zip_codes = {zip_code for zip_code, _ in resumenes}
+
+        missing_construction_types = {
+            construction_type
+            for zip_code, _, construction_type in queries
+            if (zip_code, construction_type) not in resumenes
+        }
+        found_construction_types = (
+            set(
+                UsoConstruccion.objects.filter(
+                    id__in=missing_construction_types
+                ).values_list("id", flat=True)
             )
-            raise ServiceError(NO_CONSTRUCTION_FOUND_MESSAGE)
+            if missing_construction_types
+            else set()
+        )
+
+        results = []
+        for zip_code, aggregate, construction_type in queries:
+            resumen = resumenes.get((zip_code, construction_type))
+            try:
+                if resumen is None:
+                    if construction_type not in found_construction_types:
+                        raise construction_type_not_found(
+                            zip_code, aggregate, construction_type
+                        )
+                    if zip_code not in found_zip_codes:
+                        raise zip_code_not_found(
+                            zip_code, aggregate, construction_type
+                        )
+                results.append(aggregate_resumen(aggregate, resumen))
+            except ServiceError as error:
+                results.append(error)
+
+        return results
+
+
+def construction_type_not_found(zip_code, aggregate, construction_type):
+    """Registra el warning y retorna el `ServiceError` de un `construction_type` inexistente."""
+    logging.warning(
+        "Error buscando construction_type=%s. Info: zip_code=%s, aggregate=%s",
+        construction_type,
+        zip_code,
+        aggregate,
+    )
+    return ServiceError(NO_CONSTRUCTION_FOUND_MESSAGE)
+
+
+def zip_code_not_found(zip_code, aggregate, construction_type):
+    """Registra el warning y retorna el `ServiceError` de un `zip_code` inexistente."""
+    logging.warning(
+        "Error buscando zip_code=%s. Info: aggregate=%s, construction_type=%s",
+        zip_code,
+        aggregate,
+        construction_type,
+    )
+    return ServiceError(NO_ZIP_CODE_FOUND_MESSAGE)
+
+
+def aggregate_resumen(aggregate: str, resumen):
+    """Retorna el resultado de `PriceM2Service.calculate` a partir del `resumen`.
+
+    Es compartida por los motores de agregación (v.g., `columnar`), que sólo
+    deben obtener el `CatastroResumen` de la llave consultada.
+
+    `resumen` es `None` cuando el código postal existe pero no tiene elementos
+    para el tipo de construcción.
+    """
 
-        if not CatastroInfo.objects.filter(codigo_postal=zip_code).exists():
-            logging.warning(
-                "Error buscando zip_code=%s. Info: aggregate=%s, construction_type=%s",
-                zip_code,
+    # TODO: confirmar intención de los cálculos para actualizar
+    # los tests con cálculos manuales.
+    # Los edge-cases de los datos (v.g., valor_suelo cerca a cero por un typo)
+    # se descartan al cargarlos con las reglas de `price_m2.quality`.
+
+    match aggregate:
+        case "avg":
+            aggregation_operator = _resumen_avg
+        case "max":
+            aggregation_operator = _resumen_max
+        case "min":
+            aggregation_operator = _resumen_min
+        case "median" | "p25" | "p75" | "p90":
+            aggregation_operator = _resumen_percentile(aggregate)
+        case "stddev":
+            aggregation_operator = _resumen_stddev
+        case "histogram":
+            aggregation_operator = _resumen_histogram
+        case _:
+            # Este código no debería ejecutarse nunca.
+            # Se retorna un `ServiceError` para mostrar un freindly-message
+            #   en caso este escenario llegue a producción.
+            logging.debug(
+                "Unreachable code: llegó el aggregate '%s' a PriceM2Service.calculate.",
                 aggregate,
-                construction_type,
             )
-            raise ServiceError(NO_ZIP_CODE_FOUND_MESSAGE)
+            raise ServiceError(
+                f"Aggregate '{aggregate}' no soportado. Valores válidos:"
+                f" {', '.join(AGGREGATE_TYPES)}."
+            )
+
+    if resumen is None:
+        # El código postal existe pero no tiene elementos para el tipo de
+        # construcción; equivale a agregar un conjunto vacío.
+        price_unit = price_unit_construction = None
+        elements = 0
+    else:
+        price_unit, price_unit_construction = aggregation_operator(resumen)
+        elements = resumen.elements
+
+    # TODO: ¿Es necesario un PriceM2Result como wrapper de los resultados en lugar de dict?
+    return {
+        "type": aggregate,
+        "price_unit": price_unit,
+        "price_unit_construction": price_unit_construction,
+        "elements": elements,
+    }
+
+
+def _resumen_avg(resumen: CatastroResumen):
+    return (
+        _safe_div(resumen.price_unit_sum, resumen.elements),
+        _safe_div(resumen.price_unit_construction_sum, resumen.elements),
+    )
 
-        # TODO: confirmar intención de los cálculos para actualizar
-        # los tests con cálculos manuales.
-        # Considerar posible edge-cases, v.g., valor_suelo cerca a cero (typo),
-        # o la limpieza de data.
 
-        price_unit_expression = ExpressionWrapper(
-            (F("superficie_terreno") / F("valor_suelo")) - F("subsidio"),
-            output_field=FloatField(),
+def _resumen_max(resumen: CatastroResumen):
+    return resumen.price_unit_max, resumen.price_unit_construction_max
+
+
+def _resumen_min(resumen: CatastroResumen):
+    return resumen.price_unit_min, resumen.price_unit_construction_min
+
+
+def _resumen_percentile(aggregate: str):
+    def resumen_percentile(resumen: CatastroResumen):
+        return (
+            getattr(resumen, f"price_unit_{aggregate}"),
+            getattr(resumen, f"price_unit_construction_{aggregate}"),
         )
 
-        price_unit_construction_expression = ExpressionWrapper(
-            (F("superficie_construccion") / F("valor_suelo")) - F("subsidio"),
-            output_field=FloatField(),
+    return resumen_percentile
+
+
+def _resumen_stddev(resumen: CatastroResumen):
+    return resumen.price_unit_stddev, resumen.price_unit_construction_stddev
+
+
+def _resumen_histogram(resumen: CatastroResumen):
+    return (
+        _histogram(
+            resumen.price_unit_histogram,
+            resumen.price_unit_min,
+            resumen.price_unit_max,
+        ),
+        _histogram(
+            resumen.price_unit_construction_histogram,
+            resumen.price_unit_construction_min,
+            resumen.price_unit_construction_max,
+        ),
+    )
+
+
+def _histogram(counts, low, high):
+    """Retorna los intervalos del histograma con sus límites y cantidad de elementos."""
+    if counts is None:
+        return None
+    width = (high - low) / len(counts)
+    return [
+        {
+            "from": low + index * width,
+            "to": (
+                high if index == len(counts) - 1 else low + (index + 1) * width
+            ),
+            "count": count,
+        }
+        for index, count in enumerate(counts)
+    ]
+
+
+def _safe_div(total, elements):
+    if total is None or not elements:
+        return None
+    return total / elements
+
+
+class CatastroResumenService:
+
+    # Cantidad de códigos postales por consulta en las reconstrucciones parciales.
+    ZIP_CODES_BATCH_SIZE = 500
+    # Filas leídas por round-trip al calcular los percentiles sin PERCENTILE_CONT.
+    STREAM_CHUNK_SIZE = 10000
+    # Resúmenes por UPDATE al registrar los histogramas.
+    UPDATE_BATCH_SIZE = 500
+
+    def rebuild(self, zip_codes=None, rules=None):
+        """Reconstruye `CatastroResumen` a partir de los `CatastroInfo` registrados.
+
+        Debe ejecutarse cada vez que cambian los `CatastroInfo`, v.g., al final
+        del comando `price-m2_pull-prices-to-db`. El reemplazo es atómico: los
+        lectores ven el resumen anterior o el nuevo, nunca uno parcial.
+
+        Antes de agregar, aplica las reglas de calidad `rules` (por defecto,
+        las de `settings.PRICE_M2_QUALITY_RULES`) con `CatastroQualityService`:
+        el resumen sólo incluye los `CatastroInfo` válidos y agrega sus precios
+        precalculados.
+
+        Con `zip_codes` sólo se reconstruyen los resúmenes de esos códigos
+        postales, v.g., luego de una sincronización incremental.
+
+        Retorna la cantidad de resúmenes registrados.
+        """
+        quality_service = CatastroQualityService(rules)
+        valid = Q(quality=CatastroInfo.Quality.VALID)
+
+        if zip_codes is None:
+            with transaction.atomic():
+                quality_service.apply(CatastroInfo.objects.all())
+                CatastroResumen.objects.all().delete()
+                return self._create(CatastroInfo.objects.filter(valid))
+
+        total = 0
+        with transaction.atomic():
+            for batch in batched(sorted(zip_codes), self.ZIP_CODES_BATCH_SIZE):
+                catastro_infos = CatastroInfo.objects.filter(
+                    codigo_postal__in=batch
+                )
+                quality_service.apply(catastro_infos)
+                CatastroResumen.objects.filter(
+                    codigo_postal__in=batch
+                ).delete()
+                total += self._create(catastro_infos.filter(valid))
+        return total
+
+    def _create(self, catastro_infos):
+        # En PostgreSQL los percentiles se calculan con PERCENTILE_CONT en la
+        # misma consulta; en otros backends se calculan con `_add_percentiles`.
+        postgresql = connection.vendor == "postgresql"
+
+        annotations = {"elements": Count("*")}
+        for column in PRICE_EXPRESSIONS:
+            annotations[f"{column}_sum"] = Sum(column)
+            annotations[f"{column}_min"] = Min(column)
+            annotations[f"{column}_max"] = Max(column)
+            annotations[f"{column}_stddev"] = StdDev(column)
+            if postgresql:
+                for name, fraction in PERCENTILES.items():
+                    annotations[f"{column}_{name}"] = PercentileCont(
+                        F(column), fraction=fraction
+                    )
+            else:
+                annotations[f"{column}_count"] = Count(column)
+
+        grouped = (
+            catastro_infos.values("codigo_postal", "uso_construccion")
+            .annotate(**annotations)
+            .order_by()
         )
 
-        match aggregate:
-            case "avg":
-                aggregation_operator = Avg
-            case "max":
-                aggregation_operator = Max
-            case "min":
-                aggregation_operator = Min
-            case _:
-                # Este código no debería ejecutarse nunca.
-                # Se retorna un `ServiceError` para mostrar un freindly-message
-                #   en caso este escenario llegue a producción.
-                logging.debug(
-                    "Unreachable code: llegó el aggregate '%s' a PriceM2Service.calculate.",
-                    aggregate,
+        resumenes = {}
+        counts = {column: {} for column in PRICE_EXPRESSIONS}
+        for row in grouped:
+            key = row["codigo_postal"], row.pop("uso_construccion")
+            for column in PRICE_EXPRESSIONS:
+                counts[column][key] = row.pop(f"{column}_count", None)
+            resumenes[key] = CatastroResumen(uso_construccion_id=key[1], **row)
+
+        if not postgresql:
+            for column in PRICE_EXPRESSIONS:
+                self._add_percentiles(
+                    catastro_infos, column, counts[column], resumenes
                 )
-                raise ServiceError(
-                    f"Aggregate '{aggregate}' no soportado. Valores válidos: avg, max, min."
+
+        CatastroResumen.objects.bulk_create(resumenes.values())
+
+        for column in PRICE_EXPRESSIONS:
+            self._add_histograms(catastro_infos, column, resumenes)
+        CatastroResumen.objects.bulk_update(
+            resumenes.values(),
+            [f"{column}_histogram" for column in PRICE_EXPRESSIONS],
+            batch_size=self.UPDATE_BATCH_SIZE,
+        )
+
+        return len(resumenes)
+
+    def _add_percentiles(self, catastro_infos, column, counts, resumenes):
+        """Calcula los `PERCENTILES` de `column` sin PERCENTILE_CONT.
+
+        Lee los valores ordenados por llave y por valor (sin guardarlos en
+        memoria) y con `PercentileStream` sólo retiene los que interpolan cada
+        percentil. El resultado es el mismo que el de PERCENTILE_CONT.
+        """
+        for key, percentiles in stream_percentiles(
+            catastro_infos, column, counts, PERCENTILES, self.STREAM_CHUNK_SIZE
+        ):
+            for name, value in percentiles.items():
+                setattr(resumenes[key], f"{column}_{name}", value)
+
+    def _add_histograms(self, catastro_infos, column, resumenes):
+        """Cuenta en db los elementos de cada intervalo del histograma de `column`.
+
+        Los límites del histograma son el mínimo y el máximo del resumen ya
+        registrado de cada llave, que se une por (`codigo_postal`,
+        `uso_construccion`) a los `CatastroInfo`. Ver `histogram_bin`.
+        """
+        rows = (
+            catastro_infos.annotate(
+                resumen=FilteredRelation(
+                    "uso_construccion__catastroresumen",
+                    condition=Q(
+                        uso_construccion__catastroresumen__codigo_postal=F(
+                            "codigo_postal"
+                        )
+                    ),
+                ),
+                value=F(column),
+                low=F(f"resumen__{column}_min"),
+                high=F(f"resumen__{column}_max"),
+            )
+            .filter(value__isnull=False)
+            .annotate(
+                bin=Least(
+                    Floor(
+                        Coalesce(
+                            (F("value") - F("low"))
+                            * HISTOGRAM_BINS
+                            / NullIf(F("high") - F("low"), 0.0),
+                            0.0,
+                        )
+                    ),
+                    Value(HISTOGRAM_BINS - 1.0),
                 )
+            )
+            .values_list("codigo_postal", "uso_construccion", "bin")
+            .annotate(count=Count("*"))
+            .order_by()
+        )
+
+        for resumen in resumenes.values():
+            if getattr(resumen, f"{column}_min") is not None:
+                setattr(resumen, f"{column}_histogram", [0] * HISTOGRAM_BINS)
+        for zip_code, construction_type, bin, count in rows:
+            histogram = getattr(
+                resumenes[zip_code, construction_type], f"{column}_histogram"
+            )
+            histogram[int(bin)] = count
+
+
+def stream_percentiles(catastro_infos, column, counts, fractions, chunk_size):
+    """Genera los pares (llave, percentiles `fractions`) de `column` sin PERCENTILE_CONT.
+
+    `counts` tiene la cantidad de valores no nulos de cada llave
+    (`codigo_postal`, `uso_construccion_id`); se omiten las llaves que no
+    están en `counts`. Los valores se leen ordenados por llave y por valor
+    (sin guardarlos en memoria) y con `PercentileStream` sólo se retienen los
+    que interpolan cada percentil.
+    """
+    rows = (
+        catastro_infos.filter(**{f"{column}__isnull": False})
+        .order_by("codigo_postal", "uso_construccion_id", column)
+        .values_list("codigo_postal", "uso_construccion_id", column)
+        .iterator(chunk_size=chunk_size)
+    )
 
-        catastro_info_result = CatastroInfo.objects.filter(
-            codigo_postal=zip_code, uso_construccion=construction_type
-        ).aggregate(
-            price_unit=aggregation_operator(price_unit_expression),
-            price_unit_construction=aggregation_operator(
-                price_unit_construction_expression
+    for key, group in itertools.groupby(rows, key=itemgetter(0, 1)):
+        if key not in counts:
+            continue
+        stream = PercentileStream(counts[key], fractions)
+        for _, _, value in group:
+            stream.add(value)
+        yield key, stream.percentiles()
+
+
+class CatastroQualityService:
+    """Aplica las reglas de calidad de `price_m2.quality` a los `CatastroInfo`.
+
+    La carga evalúa las reglas por fila al convertir el CSV; este servicio
+    evalúa en db las filas `PENDING` (registradas fuera de la carga) y marca
+    los precios atípicos de cada llave (`codigo_postal`, `uso_construccion`)
+    como `OUTLIER`.
+    """
+
+    # Filas leídas por round-trip al calcular los límites sin PERCENTILE_CONT.
+    STREAM_CHUNK_SIZE = 10000
+
+    def __init__(self, rules=None):
+        self.rules = rules or QualityRules.from_settings()
+
+    def apply(self, catastro_infos):
+        """Evalúa las filas pendientes y recorta los atípicos de `catastro_infos`.
+
+        Retorna la cantidad de filas marcadas como `OUTLIER`.
+        """
+        Quality = CatastroInfo.Quality
+        catastro_infos.filter(quality=Quality.PENDING).update(
+            **{
+                column: expression()
+                for column, expression in PRICE_EXPRESSIONS.items()
+            },
+            quality=Case(
+                When(self.rules.invalid_filter(), then=Value(Quality.INVALID)),
+                default=Value(Quality.VALID),
             ),
-            elements=Count("*"),
         )
 
-        # TODO: ¿Es necesario un PriceM2Result como wrapper de los resultados en lugar de dict?
-        return {
-            "type": aggregate,
-            "price_unit": catastro_info_result["price_unit"],
-            "price_unit_construction": catastro_info_result[
-                "price_unit_construction"
-            ],
-            "elements": catastro_info_result["elements"],
+        # Los límites se recalculan con las filas válidas actuales.
+        catastro_infos.filter(quality=Quality.OUTLIER).update(
+            quality=Quality.VALID
+        )
+        if not self.rules.trim:
+            return 0
+
+        valid = catastro_infos.filter(quality=Quality.VALID)
+        bounds = {}
+        for column in PRICE_EXPRESSIONS:
+            for key, percentiles in self._percentiles(valid, column):
+                bounds.setdefault(key, {})[column] = self.rules.trim_bounds(
+                    percentiles
+                )
+        return self._mark_outliers(valid, bounds)
+
+    def _mark_outliers(self, valid, bounds):
+        """Marca como `OUTLIER` las filas de `valid` fuera de los límites de su llave.
+
+        `bounds` tiene los límites (low, high) de cada columna por llave. Los
+        límites se envían como una tabla VALUES que el UPDATE une con las filas
+        por llave: en PostgreSQL es un único UPDATE, en lugar de uno por llave;
+        en los backends con límite de parámetros por query (v.g., SQLite), uno
+        por batch de llaves.
+        """
+        if not bounds:
+            return 0
+
+        quote_name = connection.ops.quote_name
+        table = quote_name(CatastroInfo._meta.db_table)
+
+        def column(name):
+            field = CatastroInfo._meta.get_field(name)
+            return f"{table}.{quote_name(field.column)}"
+
+        # Las columnas de VALUES se llaman column1, column2, etc., tanto en
+        # PostgreSQL como en SQLite: (codigo_postal, uso_construccion) y los
+        # límites (low, high) de cada precio.
+        join = (
+            f"bounds.column1 = {column('codigo_postal')}"
+            f" AND bounds.column2 = {column('uso_construccion')}"
+        )
+        outside = " OR ".join(
+            f"{column(name)} < bounds.column{3 + 2 * index}"
+            f" OR {column(name)} > bounds.column{4 + 2 * index}"
+            for index, name in enumerate(PRICE_EXPRESSIONS)
+        )
+        rows = [
+            (
+                *key,
+                *(
+                    value
+                    for name in PRICE_EXPRESSIONS
+                    # Sin límites para la columna, no se recorta.
+                    for value in key_bounds.get(name, (-math.inf, math.inf))
+                ),
+            )
+            for key, key_bounds in bounds.items()
+        ]
+        row_size = 2 + 2 * len(PRICE_EXPRESSIONS)
+        row_sql = f"({', '.join(['%s'] * row_size)})"
+        valid_sql, valid_params = valid.values("pk").query.sql_with_params()
+
+        batch_size = len(rows)
+        max_query_params = connection.features.max_query_params
+        if max_query_params:
+            batch_size = max(
+                1, (max_query_params - len(valid_params) - 1) // row_size
+            )
+
+        total = 0
+        with connection.cursor() as cursor:
+            for batch in batched(rows, batch_size):
+                cursor.execute(
+                    f"UPDATE {table} SET {quote_name('quality')} = %s"
+                    f" WHERE {column('id')} IN ({valid_sql})"
+                    " AND EXISTS (SELECT 1 FROM"
+                    f" (VALUES {', '.join([row_sql] * len(batch))}) AS bounds"
+                    f" WHERE {join} AND ({outside}))",
+                    [
+                        int(CatastroInfo.Quality.OUTLIER),
+                        *valid_params,
+                        *(value for row in batch for value in row),
+                    ],
+                )
+                total += cursor.rowcount
+        return total
+
+    def _percentiles(self, valid, column):
+        """Genera los pares (llave, percentiles de `QualityRules.trim_fractions`) de `column`.
+
+        Omite las llaves con menos de `QualityRules.trim_min_elements` valores.
+        """
+        fractions = self.rules.trim_fractions()
+        grouped = (
+            valid.values("codigo_postal", "uso_construccion_id")
+            .annotate(count=Count(column))
+            .filter(count__gte=self.rules.trim_min_elements)
+            .order_by()
+        )
+
+        if connection.vendor == "postgresql":
+            for row in grouped.annotate(
+                **{
+                    name: PercentileCont(F(column), fraction=fraction)
+                    for name, fraction in fractions.items()
+                }
+            ):
+                key = row["codigo_postal"], row["uso_construccion_id"]
+                yield key, {name: row[name] for name in fractions}
+            return
+
+        counts = {
+            (row["codigo_postal"], row["uso_construccion_id"]): row["count"]
+            for row in grouped
         }
+        yield from stream_percentiles(
+            valid, column, counts, fractions, self.STREAM_CHUNK_SIZE
+        )
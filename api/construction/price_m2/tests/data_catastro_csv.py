@@ -0,0 +1,37 @@
+import csv
+from io import BytesIO, StringIO
+from zipfile import ZipFile
+
+CSV_FIELDNAMES = (
+    "codigo_postal",
+    "uso_construccion",
+    "superficie_terreno",
+    "superficie_construccion",
+    "valor_suelo",
+    "subsidio",
+)
+
+# Tres filas válidas y una fila con `valor_suelo` inválido.
+CSV_ROWS = (
+    ("01219", "Habitacional", "1000", "600", "10", "23"),
+    ("01219", "Habitacional", "1500", "900", "17", "31"),
+    ("01430", "", "800", "400", "20", "0"),
+    ("01430", "Industrial", "300", "200", "NOT-A-NUMBER", "0"),
+)
+
+
+def generate_catastro_csv(rows=CSV_ROWS) -> str:
+    """Genera el contenido de un CSV de catastro con las columnas usadas por la carga."""
+    content = StringIO()
+    writer = csv.writer(content)
+    writer.writerow(CSV_FIELDNAMES)
+    writer.writerows(rows)
+    return content.getvalue()
+
+
+def generate_catastro_zip(rows=CSV_ROWS) -> bytes:
+    """Genera un zip con un único CSV de catastro, como el publicado por CDMX."""
+    content = BytesIO()
+    with ZipFile(content, "w") as zip_file:
+        zip_file.writestr("catastro.csv", generate_catastro_csv(rows))
+    return content.getvalue()
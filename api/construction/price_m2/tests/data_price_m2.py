@@ -1,10 +1,14 @@
 from django.test import TestCase
+from price_m2.dataset_version import publish_dataset_version
 from price_m2.models import Alcaldia, CatastroInfo, UsoConstruccion
+from price_m2.services import CatastroResumenService
 
 
 def generate_price_m2_data(test_case: TestCase):
     """Registra dos elementos `CatastroInfo` para testear price_m2.
-    Adicinalmente registra una `Alcaldia` y un `UsoConstruccion`.
+    Adicinalmente registra una `Alcaldia` y un `UsoConstruccion`,
+    y reconstruye el `CatastroResumen` y publica una `DatasetVersion`
+    como lo hace el comando de carga.
 
     Ejemplo de uso:
 
@@ -59,3 +63,5 @@ def generate_price_m2_data(test_case: TestCase):
     )
 
     CatastroInfo.objects.bulk_create(test_case.test_data)
+    CatastroResumenService().rebuild()
+    publish_dataset_version()
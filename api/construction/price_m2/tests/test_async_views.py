@@ -0,0 +1,186 @@
+import json
+import unittest.mock
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from price_m2 import async_views
+from price_m2.cache import CachedPriceM2Service
+from price_m2.services import PriceM2Service, ServiceError
+
+from .data_price_m2 import generate_price_m2_data
+
+
+class AsyncPriceM2Service_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+
+    async def test_acalculate_same_as_calculate(self):
+        price_m2_service = PriceM2Service()
+
+        for async_price_m2_service in (
+            PriceM2Service(),
+            CachedPriceM2Service(),
+        ):
+            with self.subTest(service=type(async_price_m2_service).__name__):
+                self.assertEqual(
+                    await async_price_m2_service.acalculate("10101", "avg", 1),
+                    await sync_to_async(price_m2_service.calculate)(
+                        "10101", "avg", 1
+                    ),
+                )
+                self.assertEqual(
+                    await async_price_m2_service.acalculate_aggregates(
+                        "10101", ["max", "min"], 1
+                    ),
+                    await sync_to_async(price_m2_service.calculate_aggregates)(
+                        "10101", ["max", "min"], 1
+                    ),
+                )
+
+    @unittest.mock.patch("logging.warning")
+    async def test_acalculate_errors(self, _):
+        with self.assertRaisesMessage(
+            ServiceError, "No se halló el código zip solicitado"
+        ):
+            await PriceM2Service().acalculate("NOT-VALID", "avg", 1)
+
+
+class AsyncViews_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+        self.factory = AsyncRequestFactory()
+
+    async def get(self, view, url, **kwargs):
+        response = await view(self.factory.get(url), **kwargs)
+        return response.status_code, json.loads(response.content)
+
+    async def test_aggregated_price_by_m2(self):
+        status, data = await self.get(
+            async_views.aggregated_price_by_m2,
+            "/?construction_type=1",
+            zip_code="10101",
+            aggregate="max",
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            data,
+            {
+                "status": True,
+                "payload": {
+                    "type": "max",
+                    "price_unit": 77,
+                    "price_unit_construction": 37,
+                    "elements": 2,
+                },
+            },
+        )
+
+    async def test_aggregated_price_by_m2_several(self):
+        _, data = await self.get(
+            async_views.aggregated_price_by_m2,
+            "/?construction_type=1",
+            zip_code="10101",
+            aggregate="max,min",
+        )
+
+        self.assertEqual(
+            [result["type"] for result in data["payload"]], ["max", "min"]
+        )
+
+    async def test_aggregated_price_by_m2_repeated(self):
+        _, data = await self.get(
+            async_views.aggregated_price_by_m2,
+            "/?construction_type=1",
+            zip_code="10101",
+            aggregate="max,max",
+        )
+
+        self.assertEqual(
+            [result["type"] for result in data["payload"]], ["max"]
+        )
+
+    @override_settings(PRICE_M2_ENGINE="columnar")
+    async def test_aggregated_price_by_m2_columnar(self):
+        _, data = await self.get(
+            async_views.aggregated_price_by_m2,
+            "/?construction_type=1",
+            zip_code="10101",
+            aggregate="min",
+        )
+
+        self.assertAlmostEqual(
+            data["payload"]["price_unit"], 57.23529411764706
+        )
+
+    @unittest.mock.patch("logging.warning")
+    async def test_aggregated_price_by_m2_errors(self, _):
+        for url, zip_code, expected_error in (
+            (
+                "/?construction_type=NOT_VALID",
+                "10101",
+                "Query-parameter `construction_type` inválido: Uso: '?construction_type={1-7}'",
+            ),
+            (
+                "/?construction_type=1",
+                "NOT-VALID",
+                "No se halló el código zip solicitado",
+            ),
+        ):
+            with self.subTest(url=url, zip_code=zip_code):
+                status, data = await self.get(
+                    async_views.aggregated_price_by_m2,
+                    url,
+                    zip_code=zip_code,
+                    aggregate="avg",
+                )
+
+                self.assertEqual(status, 400)
+                self.assertEqual(
+                    data, {"status": False, "errors": [expected_error]}
+                )
+
+    async def test_aggregated_price_by_m2_not_modified(self):
+        response = await async_views.aggregated_price_by_m2(
+            self.factory.get("/?construction_type=1"),
+            zip_code="10101",
+            aggregate="max",
+        )
+
+        with unittest.mock.patch(
+            "price_m2.async_views.get_price_m2_service"
+        ) as service_mock:
+            not_modified = await async_views.aggregated_price_by_m2(
+                self.factory.get(
+                    "/?construction_type=1",
+                    headers={"If-None-Match": response["ETag"]},
+                ),
+                zip_code="10101",
+                aggregate="max",
+            )
+
+        service_mock.assert_not_called()
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(response["Cache-Control"], "public, max-age=300")
+
+    async def test_completion(self):
+        _, data = await self.get(
+            async_views.uso_construccion_completion_list, "/"
+        )
+        self.assertEqual(data, [{"id": 1, "name": "Habitacional"}])
+
+        _, data = await self.get(
+            async_views.alcaldia_completion_detail,
+            "/",
+            pk=str(self.alcaldia.id),
+        )
+        self.assertEqual(
+            data, {"id": self.alcaldia.id, "name": "Álvaro Obregón"}
+        )
+
+        status, _ = await self.get(
+            async_views.alcaldia_completion_detail, "/", pk="NOT-VALID"
+        )
+        self.assertEqual(status, 404)
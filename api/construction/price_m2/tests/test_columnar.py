@@ -0,0 +1,237 @@
+import tempfile
+import unittest.mock
+from array import array
+from pathlib import Path
+
+from django.test import Client, TestCase, override_settings
+from price_m2.columnar import (
+    ColumnarDataset,
+    ColumnarPriceM2Service,
+    SnapshotError,
+    columnar_dataset,
+    histogram_counts,
+    snapshot_path,
+    write_snapshot,
+)
+from price_m2.constants import AGGREGATE_TYPES
+from price_m2.dataset_version import (
+    current_dataset_version,
+    publish_dataset_version,
+)
+from price_m2.models import CatastroInfo, UsoConstruccion
+from price_m2.services import (
+    CatastroResumenService,
+    PriceM2Service,
+    ServiceError,
+)
+
+from .data_price_m2 import generate_price_m2_data
+
+
+class ColumnarPriceM2Service_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+        self.price_m2_service = ColumnarPriceM2Service()
+
+    def test_calculate_same_as_db(self):
+        UsoConstruccion.objects.create(id=2, name="Industrial")
+
+        for aggregate in AGGREGATE_TYPES:
+            for construction_type in (1, 2):
+                with self.subTest(
+                    aggregate=aggregate, construction_type=construction_type
+                ):
+                    result = self.price_m2_service.calculate(
+                        "10101", aggregate, construction_type
+                    )
+                    expected = PriceM2Service().calculate(
+                        "10101", aggregate, construction_type
+                    )
+
+                    self.assertEqual(result.keys(), expected.keys())
+                    for field in ("price_unit", "price_unit_construction"):
+                        self.assertAlmostEqualResult(
+                            result[field], expected[field]
+                        )
+
+    def assertAlmostEqualResult(self, first, second):
+        """Compara resultados con tolerancia: STDDEV_POP y fsum difieren en el redondeo."""
+        if isinstance(first, list):
+            self.assertEqual(len(first), len(second))
+            for first_bin, second_bin in zip(first, second):
+                self.assertEqual(first_bin["count"], second_bin["count"])
+                self.assertAlmostEqual(first_bin["from"], second_bin["from"])
+                self.assertAlmostEqual(first_bin["to"], second_bin["to"])
+        elif first is None:
+            self.assertIsNone(second)
+        else:
+            self.assertAlmostEqual(first, second)
+
+    def test_resumen_only_requested_aggregates(self):
+        dataset = columnar_dataset()
+
+        resumen = dataset.resumen("10101", 1, ["max", "histogram"])
+
+        self.assertEqual(resumen.price_unit_max, 77)
+        self.assertEqual(
+            resumen.price_unit_histogram, [1, 0, 0, 0, 0, 0, 0, 0, 0, 1]
+        )
+        self.assertIsNone(resumen.price_unit_sum)
+        self.assertIsNone(resumen.price_unit_median)
+        # El histograma se calcula una sola vez por llave.
+        with unittest.mock.patch(
+            "price_m2.columnar.histogram_bin"
+        ) as histogram_bin:
+            dataset.resumen("10101", 1, ["histogram"])
+        histogram_bin.assert_not_called()
+
+    def test_histogram_counts(self):
+        values = memoryview(array("d", [0, 0.5, 1, 1, 2.5, 9.99, 10]))
+
+        self.assertEqual(
+            histogram_counts(values), [2, 2, 1, 0, 0, 0, 0, 0, 0, 2]
+        )
+        self.assertEqual(
+            histogram_counts(memoryview(array("d", [3, 3]))),
+            [2, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        )
+
+    def test_calculate_without_queries(self):
+        columnar_dataset()
+
+        with self.assertNumQueries(0):
+            result = self.price_m2_service.calculate(
+                zip_code="10101", aggregate="max", construction_type=1
+            )
+
+        self.assertEqual(result["price_unit"], 77)
+
+    @unittest.mock.patch("logging.warning")
+    def test_calculate_errors(self, _):
+        with self.assertRaisesMessage(
+            ServiceError, "No se halló el código zip solicitado"
+        ):
+            self.price_m2_service.calculate("NOT-VALID", "avg", 1)
+
+        with self.assertRaisesMessage(
+            ServiceError, "No se halló el tipo de construcción"
+        ):
+            self.price_m2_service.calculate("10101", "avg", 99)
+
+    def test_reload_on_dataset_version(self):
+        self.price_m2_service.calculate("10101", "avg", 1)
+        CatastroInfo.objects.create(
+            alcaldia=self.alcaldia,
+            uso_construccion=self.uso_construccion,
+            codigo_postal="10101",
+            superficie_terreno=300,
+            superficie_construccion=200,
+            valor_suelo=10,
+            subsidio=5,
+        )
+        # Inválida: no se carga.
+        CatastroInfo.objects.create(
+            alcaldia=self.alcaldia,
+            uso_construccion=self.uso_construccion,
+            codigo_postal="10101",
+            superficie_terreno=300,
+            superficie_construccion=200,
+            valor_suelo=0,
+            subsidio=5,
+        )
+
+        CatastroResumenService().rebuild()
+        publish_dataset_version()
+        result = self.price_m2_service.calculate("10101", "min", 1)
+
+        self.assertEqual(result["elements"], 3)
+        self.assertAlmostEqual(result["price_unit"], 25)
+
+
+class ColumnarSnapshot_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        self.snapshot_dir = Path(snapshot_dir.name)
+
+        snapshot_settings = override_settings(
+            PRICE_M2_SNAPSHOT_DIR=self.snapshot_dir
+        )
+        snapshot_settings.enable()
+        self.addCleanup(snapshot_settings.disable)
+
+    def test_open_snapshot(self):
+        dataset = ColumnarDataset.load("v1")
+        path = dataset.write_snapshot(self.snapshot_dir)
+
+        with self.assertNumQueries(0):
+            snapshot = ColumnarDataset.open_snapshot(path)
+            resumen = snapshot.resumen("10101", 1)
+
+        self.assertEqual(snapshot.version, "v1")
+        self.assertEqual(snapshot.construction_types, {1})
+        self.assertEqual(resumen.elements, 2)
+        self.assertEqual(resumen.price_unit_max, 77)
+        self.assertAlmostEqual(
+            resumen.price_unit_construction_min, 21.94117647
+        )
+        self.assertEqual(
+            [path.name for path in self.snapshot_dir.iterdir()],
+            ["catastro-v1.snapshot"],
+        )
+
+    def test_open_invalid_snapshot(self):
+        path = snapshot_path(self.snapshot_dir, "v1")
+        path.write_bytes(b"NOT-A-SNAPSHOT" * 10)
+
+        with self.assertRaises(SnapshotError):
+            ColumnarDataset.open_snapshot(path)
+
+    def test_columnar_dataset_uses_snapshot(self):
+        version = current_dataset_version()
+        write_snapshot(version)
+
+        with unittest.mock.patch.object(ColumnarDataset, "load") as load_mock:
+            dataset = columnar_dataset()
+
+        load_mock.assert_not_called()
+        self.assertEqual(dataset.version, version)
+        self.assertIsInstance(dataset.elements, memoryview)
+
+    def test_write_snapshot_removes_old_snapshots(self):
+        for stamp in ("v1", "v2", "v3"):
+            write_snapshot(stamp)
+
+        self.assertEqual(
+            sorted(path.name for path in self.snapshot_dir.iterdir()),
+            ["catastro-v2.snapshot", "catastro-v3.snapshot"],
+        )
+
+
+@override_settings(PRICE_M2_ENGINE="columnar")
+class ColumnarEngine_Integration_TestCase(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        generate_price_m2_data(self)
+
+    def test_price_m2_calculate_max(self):
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/max?construction_type=1"
+        )
+
+        self.assertEqual(
+            response.json(),
+            {
+                "status": True,
+                "payload": {
+                    "type": "max",
+                    "price_unit": 77,
+                    "price_unit_construction": 37,
+                    "elements": 2,
+                },
+            },
+        )
@@ -0,0 +1,511 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest.mock
+import urllib.error
+from io import BytesIO, StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from price_m2.benchmarks import latency_summary
+from price_m2.ingestion import TableSwapReplace
+from price_m2.models import (
+    CatastroImport,
+    CatastroInfo,
+    CatastroResumen,
+    DatasetVersion,
+)
+
+from .data_catastro_csv import generate_catastro_csv, generate_catastro_zip
+from .data_price_m2 import generate_price_m2_data
+
+
+class FakeZipResponse(BytesIO):
+    """Respuesta de `urllib.request.urlopen` con el zip de catastro."""
+
+    def __init__(self, etag='"v1"'):
+        super().__init__(generate_catastro_zip())
+        self.headers = {"ETag": etag}
+
+
+class PullPricesToDb_TestCase(TestCase):
+    fixtures = ["price-m2_base"]
+
+    def setUp(self):
+        # El comando deja las filas con error en el directorio de ejecución.
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.workdir.name)
+        self.addCleanup(os.chdir, cwd)
+
+        cache_settings = override_settings(
+            PRICE_M2_DOWNLOAD_CACHE_DIR=os.path.join(
+                self.workdir.name, "cache"
+            )
+        )
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+    def call_pull_command(self, *args, response=None):
+        stdout = StringIO()
+        with unittest.mock.patch(
+            "urllib.request.urlopen",
+            side_effect=[response or FakeZipResponse()],
+        ) as urlopen_mock:
+            call_command("price-m2_pull-prices-to-db", *args, stdout=stdout)
+        self.urlopen_mock = urlopen_mock
+        return stdout.getvalue()
+
+    def test_pull_prices_in_batches(self):
+        output = self.call_pull_command("--batch-size", "2")
+
+        self.assertEqual(CatastroInfo.objects.count(), 3)
+        self.assertEqual(
+            CatastroInfo.objects.filter(
+                uso_construccion__name="Sin Zonificación"
+            ).count(),
+            1,
+        )
+        self.assertIn("registrados 2 elementos", output)
+        self.assertIn("registrados 3 elementos", output)
+        self.assertIn("Total de elementos procesados: 4", output)
+
+    def test_pull_prices_rebuilds_resumen_and_version(self):
+        self.call_pull_command()
+
+        self.assertEqual(CatastroResumen.objects.count(), 2)
+        self.assertEqual(DatasetVersion.objects.count(), 1)
+
+    def test_pull_prices_writes_snapshot(self):
+        snapshot_dir = os.path.join(self.workdir.name, "snapshots")
+
+        with override_settings(PRICE_M2_SNAPSHOT_DIR=snapshot_dir):
+            self.call_pull_command()
+
+        stamp = DatasetVersion.objects.get().stamp
+        self.assertEqual(
+            os.listdir(snapshot_dir), [f"catastro-{stamp}.snapshot"]
+        )
+
+    def test_pull_prices_writes_rejects(self):
+        output = self.call_pull_command()
+
+        self.assertIn("Hay 1 filas con error:", output)
+        self.assertIn("  valor_suelo:ValueError: 1", output)
+        with gzip.open("rejects-alvaro-obregon.csv.gz", "rt") as rejects_file:
+            self.assertIn("NOT-A-NUMBER", rejects_file.read())
+        self.assertEqual(CatastroImport.objects.get().failed_rows, 1)
+
+    def test_pull_prices_reingests_fixed_rejects(self):
+        self.call_pull_command()
+        with gzip.open("rejects-alvaro-obregon.csv.gz", "rt") as rejects_file:
+            content = rejects_file.read()
+        with gzip.open("fixed.csv.gz", "wt") as fixed_file:
+            fixed_file.write(content.replace("NOT-A-NUMBER", "12"))
+
+        for _ in range(2):
+            output = StringIO()
+            call_command(
+                "price-m2_pull-prices-to-db",
+                "--append",
+                "--source",
+                "fixed.csv.gz",
+                "--rejects-dir",
+                "rejects",
+                stdout=output,
+            )
+
+        # Las filas se agregan una única vez, sin eliminar las anteriores.
+        self.assertEqual(CatastroInfo.objects.count(), 4)
+        self.assertTrue(CatastroInfo.objects.filter(valor_suelo=12).exists())
+        self.assertIn(
+            "0 registrados, 0 eliminados, 1 sin cambios", output.getvalue()
+        )
+        self.assertNotIn("filas con error", output.getvalue())
+        self.assertFalse(os.path.exists("rejects"))
+        self.assertEqual(CatastroImport.objects.count(), 1)
+        self.assertEqual(DatasetVersion.objects.count(), 3)
+
+    def test_pull_prices_refuses_rejects_without_append(self):
+        self.call_pull_command()
+
+        for args in ((), ("--sync",)):
+            with (
+                self.subTest(args=args),
+                self.assertRaisesMessage(CommandError, "Usar --append"),
+            ):
+                call_command(
+                    "price-m2_pull-prices-to-db",
+                    *args,
+                    "--source",
+                    "rejects-alvaro-obregon.csv.gz",
+                )
+
+        self.assertEqual(CatastroInfo.objects.count(), 3)
+
+    def test_pull_prices_sync_and_append(self):
+        with self.assertRaisesMessage(CommandError, "--sync con --append"):
+            call_command("price-m2_pull-prices-to-db", "--sync", "--append")
+
+    def test_pull_prices_max_errors(self):
+        with (
+            self.assertLogs(level="ERROR"),
+            self.assertRaisesMessage(CommandError, "Álvaro Obregón"),
+        ):
+            self.call_pull_command("--max-errors", "0")
+
+        self.assertEqual(CatastroInfo.objects.count(), 0)
+        self.assertFalse(CatastroImport.objects.exists())
+        self.assertTrue(os.path.exists("rejects-alvaro-obregon.csv.gz"))
+
+    def test_pull_prices_from_local_csv(self):
+        with open("catastro.csv", "w") as csv_file:
+            csv_file.write(generate_catastro_csv())
+
+        with unittest.mock.patch("urllib.request.urlopen") as urlopen_mock:
+            call_command(
+                "price-m2_pull-prices-to-db",
+                "--source",
+                "catastro.csv",
+                stdout=StringIO(),
+            )
+
+        urlopen_mock.assert_not_called()
+        self.assertEqual(CatastroInfo.objects.count(), 3)
+
+    def test_pull_prices_skips_unchanged_file(self):
+        self.call_pull_command()
+        CatastroInfo.objects.all().delete()
+
+        output = self.call_pull_command(response=FakeZipResponse(etag='"v2"'))
+
+        self.assertIn("Se omite la carga", output)
+        self.assertEqual(CatastroInfo.objects.count(), 0)
+        self.assertEqual(DatasetVersion.objects.count(), 1)
+
+    def test_pull_prices_uses_cached_download(self):
+        self.call_pull_command()
+        not_modified = urllib.error.HTTPError(
+            "url", 304, "Not Modified", {}, None
+        )
+
+        output = self.call_pull_command("--force", response=not_modified)
+
+        (request,), _ = self.urlopen_mock.call_args
+        self.assertEqual(request.get_header("If-none-match"), '"v1"')
+        self.assertIn("vigente en caché", output)
+        self.assertEqual(DatasetVersion.objects.count(), 2)
+
+    @override_settings(PRICE_M2_DOWNLOAD_TIMEOUT=5)
+    def test_pull_prices_download_timeout(self):
+        connect_timeout = urllib.error.URLError(TimeoutError("timed out"))
+        read_timeout = FakeZipResponse()
+        read_timeout.read = unittest.mock.Mock(side_effect=TimeoutError)
+
+        for response in (connect_timeout, read_timeout):
+            with (
+                self.subTest(response=response),
+                self.assertLogs(level="ERROR"),
+                self.assertRaisesMessage(CommandError, "Álvaro Obregón"),
+                unittest.mock.patch(
+                    "urllib.request.urlopen", side_effect=[response]
+                ) as urlopen_mock,
+            ):
+                call_command(
+                    "price-m2_pull-prices-to-db",
+                    stdout=StringIO(),
+                    stderr=StringIO(),
+                )
+
+            _, kwargs = urlopen_mock.call_args
+            self.assertEqual(kwargs["timeout"], 5)
+            self.assertFalse(CatastroInfo.objects.exists())
+            # No quedan descargas parciales en el caché.
+            self.assertEqual(os.listdir("cache"), [])
+
+    @unittest.skipUnless(
+        connection.vendor == "postgresql",
+        "TableSwapReplace requiere PostgreSQL",
+    )
+    def test_pull_prices_fails_during_other_load(self):
+        other_connection = connections.create_connection("default")
+        self.addCleanup(other_connection.close)
+        other = TableSwapReplace(other_connection)
+        other.prepare()
+        self.addCleanup(other.discard)
+
+        with self.assertRaisesMessage(CommandError, "otra carga"):
+            self.call_pull_command()
+
+        self.assertFalse(DatasetVersion.objects.exists())
+
+    def test_pull_prices_sync(self):
+        self.call_pull_command()
+        rows = (
+            ("01219", "Habitacional", "1000", "600", "10", "23"),
+            ("01500", "Habitacional", "700", "500", "10", "0"),
+        )
+        with open("catastro.csv", "w") as csv_file:
+            csv_file.write(generate_catastro_csv(rows))
+
+        output = StringIO()
+        call_command(
+            "price-m2_pull-prices-to-db",
+            "--sync",
+            "--source",
+            "catastro.csv",
+            stdout=output,
+        )
+
+        self.assertIn(
+            "1 registrados, 2 eliminados, 1 sin cambios", output.getvalue()
+        )
+        self.assertEqual(
+            DatasetVersion.objects.latest("id").zip_codes,
+            ["01219", "01430", "01500"],
+        )
+        self.assertEqual(
+            set(
+                CatastroResumen.objects.values_list("codigo_postal", flat=True)
+            ),
+            {"01219", "01500"},
+        )
+
+    def test_pull_prices_several_alcaldias(self):
+        with open("tlalpan.csv", "w") as csv_file:
+            csv_file.write(generate_catastro_csv())
+
+        output = self.call_pull_command(
+            "--alcaldia",
+            "Álvaro Obregón",
+            "--alcaldia",
+            "Tlalpan",
+            "--source",
+            "Tlalpan=tlalpan.csv",
+        )
+
+        self.assertEqual(CatastroInfo.objects.count(), 6)
+        self.assertEqual(
+            set(
+                CatastroImport.objects.values_list("alcaldia__name", flat=True)
+            ),
+            {"Álvaro Obregón", "Tlalpan"},
+        )
+        self.assertIn("Tlalpan: OK, 3 elementos", output)
+        self.assertIn("filas/s", output)
+
+    def test_pull_prices_failed_alcaldia_keeps_others(self):
+        self.call_pull_command()
+        with open("coyoacan.csv", "w") as csv_file:
+            csv_file.write(generate_catastro_csv())
+
+        with self.assertRaisesMessage(CommandError, "Álvaro Obregón"):
+            call_command(
+                "price-m2_pull-prices-to-db",
+                "--source",
+                "Álvaro Obregón=missing.zip",
+                "--source",
+                "Coyoacán=coyoacan.csv",
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+
+        self.assertEqual(
+            CatastroInfo.objects.filter(
+                alcaldia__name="Álvaro Obregón"
+            ).count(),
+            3,
+        )
+        self.assertEqual(
+            CatastroInfo.objects.filter(alcaldia__name="Coyoacán").count(), 3
+        )
+        self.assertEqual(DatasetVersion.objects.count(), 2)
+
+    def test_pull_prices_reports_stages(self):
+        output = self.call_pull_command()
+
+        for stage in ("download", "unzip", "csv_parse", "convert", "db_write"):
+            self.assertRegex(output, rf"\n{stage} +\d+\.\d+s")
+        self.assertRegex(output, r"\ncsv_parse +\d+\.\d+s +4 ")
+        self.assertRegex(output, r"\nresumen +\d+\.\d+s +2 ")
+
+    def test_pull_prices_profile(self):
+        output = self.call_pull_command("--profile", "load.txt")
+
+        with open("load.txt") as profile_file:
+            report = profile_file.read()
+        # La raíz del perfil; el resto del top depende de los tiempos.
+        self.assertIn("(_load)", report)
+        self.assertIn("# tracemalloc:", report)
+        self.assertTrue(os.path.exists("load.txt.prof"))
+        self.assertIn("Perfil de la carga en load.txt", output)
+        self.assertEqual(CatastroInfo.objects.count(), 3)
+
+    def test_pull_prices_requires_known_source(self):
+        with self.assertRaisesMessage(CommandError, "--source 'Tlalpan=RUTA'"):
+            call_command("price-m2_pull-prices-to-db", "--alcaldia", "Tlalpan")
+
+
+class BenchmarkLoad_TestCase(TestCase):
+    fixtures = ["price-m2_base"]
+
+    def test_benchmark_load_rolls_back(self):
+        stdout = StringIO()
+
+        call_command("price-m2_benchmark-load", "--rows", "20", stdout=stdout)
+
+        self.assertIn("bulk_create  20 filas", stdout.getvalue())
+        self.assertEqual(CatastroInfo.objects.count(), 0)
+
+
+class GenerateCatastro_TestCase(TestCase):
+    fixtures = ["price-m2_base"]
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.workdir.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def test_generated_csv_is_loaded(self):
+        call_command(
+            "price-m2_generate-catastro",
+            "--rows",
+            "300",
+            "--invalid-ratio",
+            "0.1",
+            "--output",
+            "catastro.csv",
+            stdout=StringIO(),
+        )
+
+        output = StringIO()
+        call_command(
+            "price-m2_pull-prices-to-db",
+            "--source",
+            "catastro.csv",
+            stdout=output,
+        )
+
+        self.assertIn("Total de elementos procesados: 300", output.getvalue())
+        loaded = CatastroInfo.objects.count()
+        self.assertGreater(loaded, 240)
+        self.assertLess(loaded, 300)
+
+    def test_benchmark_ingestion(self):
+        stdout = StringIO()
+
+        call_command(
+            "price-m2_benchmark-ingestion",
+            "--rows",
+            "50",
+            "--output",
+            "ingestion.json",
+            stdout=stdout,
+        )
+
+        with open("ingestion.json") as results_file:
+            results = json.load(results_file)["results"]
+        self.assertEqual(results["ingestion"]["rows"], 50)
+        self.assertEqual(CatastroInfo.objects.count(), 50)
+        self.assertIn("filas/s", stdout.getvalue())
+
+
+class BenchmarkService_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+
+    def test_benchmark_service_writes_results(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "service.json")
+
+            call_command(
+                "price-m2_benchmark-service",
+                "--iterations",
+                "20",
+                "--batch-size",
+                "5",
+                "--output",
+                path,
+                stdout=StringIO(),
+            )
+
+            with open(path) as results_file:
+                document = json.load(results_file)
+
+        self.assertEqual(document["benchmark"], "service")
+        self.assertEqual(document["parameters"]["iterations"], 20)
+        self.assertEqual(document["results"]["calculate"]["count"], 20)
+        self.assertEqual(document["results"]["calculate_many"]["count"], 4)
+        self.assertIn("p99_ms", document["results"]["columnar_calculate"])
+
+    def test_benchmark_service_requires_data(self):
+        CatastroResumen.objects.all().delete()
+
+        with self.assertRaisesMessage(CommandError, "No hay datos cargados"):
+            call_command("price-m2_benchmark-service", stdout=StringIO())
+
+
+class BenchmarkCompare_TestCase(TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def write_results(self, name, commit, results):
+        path = os.path.join(self.workdir.name, name)
+        with open(path, "w") as results_file:
+            json.dump(
+                {"benchmark": "http", "commit": commit, "results": results},
+                results_file,
+            )
+        return path
+
+    def test_compare_flags_regressions(self):
+        base = self.write_results(
+            "base.json",
+            "a" * 40,
+            {"aggregate": {"p95_ms": 10.0, "throughput_per_s": 1000.0}},
+        )
+        new = self.write_results(
+            "new.json",
+            "b" * 40,
+            {"aggregate": {"p95_ms": 10.5, "throughput_per_s": 800.0}},
+        )
+        stdout = StringIO()
+
+        with self.assertRaisesMessage(CommandError, "1 métricas"):
+            call_command(
+                "price-m2_benchmark-compare",
+                base,
+                new,
+                "--fail-on-regression",
+                stdout=stdout,
+            )
+
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(lines[0], "http: aaaaaaaaaa -> bbbbbbbbbb")
+        self.assertIn("+5.0%", lines[1])
+        self.assertNotIn("REGRESIÓN", lines[1])
+        self.assertIn("-20.0% REGRESIÓN", lines[2])
+
+
+class LatencySummary_TestCase(SimpleTestCase):
+
+    def test_latency_summary(self):
+        summary = latency_summary(
+            [index / 1000 for index in range(100, 0, -1)], 2
+        )
+
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["p50_ms"], 50)
+        self.assertAlmostEqual(summary["p95_ms"], 95)
+        self.assertAlmostEqual(summary["p99_ms"], 99)
+        self.assertAlmostEqual(summary["max_ms"], 100)
+        self.assertAlmostEqual(summary["throughput_per_s"], 50)
+        self.assertEqual(latency_summary([]), {"count": 0})
@@ -0,0 +1,611 @@
+import csv
+import math
+import os
+import pickle
+import tempfile
+import unittest
+from io import StringIO
+from unittest import mock
+
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from price_m2.ingestion import (
+    REJECT_FIELDS,
+    BulkCreateWriter,
+    CatastroBatch,
+    CatastroSync,
+    CopyWriter,
+    CsvRowsStream,
+    IngestionError,
+    RejectLog,
+    TableSwapReplace,
+    TransactionReplace,
+    catastro_row,
+    catastro_row_hash,
+    csv_chunks,
+    get_catastro_replace,
+    get_catastro_writer,
+    open_catastro_csv,
+    parse_catastro_rows,
+    read_catastro_rows,
+)
+from price_m2.models import CatastroInfo
+from price_m2.profiling import IngestionProfile
+from price_m2.quality import QualityRules
+
+from .data_catastro_csv import (
+    CSV_FIELDNAMES,
+    CSV_ROWS,
+    generate_catastro_csv,
+    generate_catastro_zip,
+)
+from .data_price_m2 import generate_price_m2_data
+
+
+class ParseCatastroRows_TestCase(SimpleTestCase):
+
+    def test_parse_rows(self):
+        failed_rows = []
+        uso_construccion_map = {"Habitacional": 4, "Industrial": 6, "": 7}
+
+        rows = list(
+            parse_catastro_rows(
+                StringIO(generate_catastro_csv()),
+                1,
+                uso_construccion_map,
+                failed_rows,
+            )
+        )
+
+        self.assertEqual(
+            rows[0][:-1],
+            (
+                1,
+                4,
+                "01219",
+                1000.0,
+                600.0,
+                10.0,
+                23.0,
+                77.0,
+                37.0,
+                CatastroInfo.Quality.VALID,
+            ),
+        )
+        self.assertEqual(rows[0][-1], catastro_row_hash(rows[0][:-1]))
+        self.assertNotEqual(rows[0][-1], rows[1][-1])
+        self.assertEqual(rows[2][1], 7)
+        self.assertEqual(len(rows), 3)
+        ((line, error_type, error, row),) = failed_rows
+        self.assertEqual(line, 5)
+        self.assertEqual(error_type, "valor_suelo:ValueError")
+        self.assertIn("NOT-A-NUMBER", error)
+        self.assertEqual(row["valor_suelo"], "NOT-A-NUMBER")
+
+    def test_parse_rows_profile(self):
+        profile = IngestionProfile()
+
+        with open_catastro_csv(self.write_csv(), profile) as (_, csv_file):
+            rows = list(
+                parse_catastro_rows(
+                    csv_file, 1, {"Habitacional": 4, "": 7}, [], profile
+                )
+            )
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(
+            [name for name, _ in profile.items()],
+            ["read", "csv_parse", "convert"],
+        )
+        self.assertEqual(profile["read"].bytes, len(generate_catastro_csv()))
+        self.assertEqual(profile["csv_parse"].rows, 4)
+        self.assertEqual(profile["convert"].rows, 4)
+
+    def write_csv(self):
+        csv_file = tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False
+        )
+        self.addCleanup(os.unlink, csv_file.name)
+        with csv_file:
+            csv_file.write(generate_catastro_csv())
+        return csv_file.name
+
+
+class RejectLog_TestCase(SimpleTestCase):
+
+    def test_write_rejects(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        path = os.path.join(workdir.name, "rejects.csv.gz")
+        rows = CSV_ROWS + (("01430", "Otro", "1", "1", "1", "1", "extra"),)
+        rejects = RejectLog(path)
+
+        list(
+            parse_catastro_rows(
+                StringIO(generate_catastro_csv(rows)),
+                1,
+                {"Habitacional": 4, "": 7},
+                rejects,
+            )
+        )
+        rejects.close()
+
+        self.assertEqual(rejects.counts, {"uso_construccion:KeyError": 2})
+        with open_catastro_csv(path) as (_, csv_file):
+            content = list(csv.reader(csv_file))
+        self.assertEqual(content[0], [*REJECT_FIELDS, *CSV_FIELDNAMES])
+        self.assertEqual(
+            content[1][:2] + content[1][3:],
+            ["5", "uso_construccion:KeyError", *CSV_ROWS[3]],
+        )
+        self.assertEqual(content[2][0], "6")
+        self.assertEqual(content[2][-1], "extra")
+
+    def test_max_errors(self):
+        rejects = RejectLog(max_errors=1)
+        reject = (2, "valor_suelo:ValueError", "error", {})
+
+        rejects.append(reject)
+        with self.assertRaisesMessage(IngestionError, "máximo de 1 filas"):
+            rejects.append(reject)
+
+        self.assertEqual(rejects.counts, {"valor_suelo:ValueError": 2})
+
+
+class ParseCatastroParallel_TestCase(SimpleTestCase):
+
+    uso_construccion_map = {"Habitacional": 4, "Industrial": 6, "": 7}
+
+    def test_csv_chunks(self):
+        content = generate_catastro_csv(CSV_ROWS * 5).encode()
+        path = self.write_file(content, ".csv")
+
+        fieldnames, chunks = csv_chunks(path, 40)
+
+        self.assertEqual(fieldnames[:2], ["codigo_postal", "uso_construccion"])
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0][0], content.index(b"\n") + 1)
+        self.assertEqual(chunks[-1][1], len(content))
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(content[end - 1 : end], b"\n")
+
+    def test_batch_roundtrip(self):
+        rows = list(
+            parse_catastro_rows(
+                StringIO(generate_catastro_csv()),
+                1,
+                self.uso_construccion_map,
+                [],
+            )
+        )
+        batch = CatastroBatch(1)
+        batch.extend(rows)
+
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(list(pickle.loads(pickle.dumps(batch))), rows)
+
+    @mock.patch("price_m2.ingestion.PARSE_CHUNK_SIZE", 64)
+    def test_read_rows_in_parallel(self):
+        rows = CSV_ROWS * 20
+        path = self.write_file(generate_catastro_zip(rows), ".zip")
+        expected_failed_rows = []
+        expected = list(
+            parse_catastro_rows(
+                StringIO(generate_catastro_csv(rows)),
+                1,
+                self.uso_construccion_map,
+                expected_failed_rows,
+            )
+        )
+        failed_rows = []
+        profile = IngestionProfile()
+
+        with read_catastro_rows(
+            path, 1, self.uso_construccion_map, failed_rows, profile, jobs=2
+        ) as (parsed_rows, nested_stages):
+            self.assertEqual(list(parsed_rows), expected)
+
+        self.assertEqual(failed_rows, expected_failed_rows)
+        self.assertEqual(nested_stages, ("parse_wait",))
+        self.assertEqual(profile["csv_parse"].rows, len(rows))
+        self.assertEqual(profile["parse_wait"].rows, len(expected))
+        self.assertEqual(
+            profile["read"].bytes + len(generate_catastro_csv(())),
+            profile["unzip"].bytes,
+        )
+
+    def write_file(self, content: bytes, suffix: str):
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.unlink, file.name)
+        return file.name
+
+
+class CsvRowsStream_TestCase(SimpleTestCase):
+
+    def test_read_by_chunks(self):
+        rows = [(1, 4, "01,219", 1.5), (1, 4, "01430", 2.0)]
+        totals = []
+        stream = CsvRowsStream(rows, batch_size=1, on_batch=totals.append)
+
+        chunks = []
+        while chunk := stream.read(5):
+            chunks.append(chunk)
+
+        self.assertEqual("".join(chunks), '1,4,"01,219",1.5\n1,4,01430,2.0\n')
+        self.assertEqual(totals, [1, 2])
+        self.assertEqual(stream.total, 2)
+
+
+class CopyWriter_TestCase(SimpleTestCase):
+
+    def test_serialize_blank_and_missing_values(self):
+        rows = [(1, 4, "", 1.5, math.nan, None, 0, "")]
+
+        content = CsvRowsStream(rows, batch_size=10).read()
+
+        # "" y None se serializan igual; `copy_sql` los distingue por columna.
+        self.assertEqual(content, "1,4,,1.5,nan,,0,\n")
+
+    def test_copy_sql_keeps_blank_text_columns(self):
+        sql = CopyWriter(connection, 10).copy_sql("staging")
+
+        quote_name = connection.ops.quote_name
+        self.assertIn(
+            f"FORCE_NOT_NULL ({quote_name('codigo_postal')},"
+            f" {quote_name('row_hash')})",
+            sql,
+        )
+        self.assertIn(f"COPY {quote_name('staging')} (", sql)
+
+
+@unittest.skipUnless(
+    connection.vendor == "postgresql", "CopyWriter requiere PostgreSQL"
+)
+class CopyWriter_PostgreSQL_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+
+    def test_copy_blank_and_nan_values(self):
+        rows = [
+            (
+                self.alcaldia.id,
+                self.uso_construccion.id,
+                "",
+                math.nan,
+                2,
+                0,
+                4,
+                None,
+                None,
+                CatastroInfo.Quality.INVALID,
+                "",
+            ),
+            (
+                self.alcaldia.id,
+                self.uso_construccion.id,
+                "30303",
+                1,
+                2,
+                3,
+                4,
+                1 / 3 - 4,
+                2 / 3 - 4,
+                CatastroInfo.Quality.VALID,
+                "abc",
+            ),
+        ]
+
+        total = CopyWriter(connection, 1).write(rows)
+
+        self.assertEqual(total, 2)
+        blank = CatastroInfo.objects.get(codigo_postal="")
+        self.assertEqual(blank.row_hash, "")
+        self.assertTrue(math.isnan(blank.superficie_terreno))
+        self.assertIsNone(blank.price_unit)
+        self.assertIsNone(blank.price_unit_construction)
+        copied = CatastroInfo.objects.get(codigo_postal="30303")
+        self.assertAlmostEqual(copied.price_unit, 1 / 3 - 4)
+        self.assertEqual(copied.quality, CatastroInfo.Quality.VALID)
+
+
+class CatastroWriter_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+
+    @unittest.skipIf(connection.vendor == "postgresql", "Sólo sin PostgreSQL")
+    def test_auto_writer_on_sqlite(self):
+        writer = get_catastro_writer(connection, 10)
+
+        self.assertIsInstance(writer, BulkCreateWriter)
+
+    @unittest.skipIf(connection.vendor == "postgresql", "Sólo sin PostgreSQL")
+    def test_copy_writer_requires_postgresql(self):
+        with self.assertRaises(IngestionError):
+            get_catastro_writer(connection, 10, "copy")
+
+    def test_bulk_create_writer(self):
+        rows = [
+            (
+                self.alcaldia.id,
+                self.uso_construccion.id,
+                "30303",
+                1,
+                2,
+                3,
+                4,
+                None,
+                None,
+                CatastroInfo.Quality.PENDING,
+                "",
+            )
+        ] * 3
+        batches = []
+
+        total = BulkCreateWriter(connection, 2).write(rows, batches.append)
+
+        self.assertEqual(total, 3)
+        self.assertEqual(batches, [2, 3])
+        self.assertEqual(
+            CatastroInfo.objects.filter(codigo_postal="30303").count(), 3
+        )
+
+
+class TransactionReplace_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+        self.writer = BulkCreateWriter(connection, 10)
+        self.rows = [
+            (
+                self.alcaldia.id,
+                self.uso_construccion.id,
+                "30303",
+                1,
+                2,
+                3,
+                4,
+                None,
+                None,
+                CatastroInfo.Quality.PENDING,
+                "",
+            )
+        ]
+
+    def test_replace(self):
+        replace = get_catastro_replace(connection, self.writer)
+
+        total = replace.replace(
+            lambda table: self.writer.write(self.rows, table=table)
+        )
+
+        self.assertIsInstance(replace, TransactionReplace)
+        self.assertEqual(total, 1)
+        self.assertEqual(
+            list(CatastroInfo.objects.values_list("codigo_postal", flat=True)),
+            ["30303"],
+        )
+
+    def test_replace_keeps_data_on_error(self):
+        def load(table):
+            self.writer.write(self.rows, table=table)
+            raise IngestionError("Error durante la carga")
+
+        with self.assertRaises(IngestionError):
+            TransactionReplace(connection).replace(load)
+
+        self.assertEqual(
+            CatastroInfo.objects.filter(codigo_postal="10101").count(), 2
+        )
+        self.assertFalse(
+            CatastroInfo.objects.filter(codigo_postal="30303").exists()
+        )
+
+
+@unittest.skipUnless(
+    connection.vendor == "postgresql", "TableSwapReplace requiere PostgreSQL"
+)
+class TableSwapReplace_TestCase(TransactionTestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+
+    def test_swap_keeps_indexes(self):
+        table = CatastroInfo._meta.db_table
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, table)
+        writer = CopyWriter(connection, 10)
+        rows = [
+            (
+                self.alcaldia.id,
+                self.uso_construccion.id,
+                "30303",
+                1,
+                2,
+                3,
+                4,
+                None,
+                None,
+                CatastroInfo.Quality.PENDING,
+                "",
+            )
+        ]
+
+        TableSwapReplace(connection).replace(
+            lambda staging: writer.write(rows, table=staging)
+        )
+
+        with connection.cursor() as cursor:
+            swapped = connection.introspection.get_constraints(cursor, table)
+        self.assertEqual(swapped.keys(), indexes.keys())
+        self.assertEqual(
+            list(CatastroInfo.objects.values_list("codigo_postal", flat=True)),
+            ["30303"],
+        )
+
+    def test_swap_keeps_index_definitions_and_sequence(self):
+        table = CatastroInfo._meta.db_table
+        before = self.table_definition(table)
+        writer = CopyWriter(connection, 10)
+
+        replace = TableSwapReplace(connection)
+        replace.prepare()
+        replace.keep_alcaldias([self.alcaldia.id])
+        replace.finish()
+
+        after = self.table_definition(table)
+        self.assertEqual(after["indexes"], before["indexes"])
+        self.assertIn(
+            "(codigo_postal, uso_construccion_id, quality)"
+            " INCLUDE (price_unit, price_unit_construction)",
+            after["indexes"]["price_m2_catastro_cp_uso_idx"],
+        )
+        self.assertEqual(after["sequence"], f"public.{table}_id_seq")
+        self.assertEqual(after["tables"], [table])
+        # La secuencia de la nueva tabla continúa la numeración.
+        self.assertEqual(CatastroInfo.objects.count(), 2)
+        max_id = max(CatastroInfo.objects.values_list("id", flat=True))
+        writer.write(
+            [
+                (
+                    self.alcaldia.id,
+                    self.uso_construccion.id,
+                    "30303",
+                    1,
+                    2,
+                    3,
+                    4,
+                    None,
+                    None,
+                    CatastroInfo.Quality.PENDING,
+                    "",
+                )
+            ]
+        )
+        self.assertGreater(
+            CatastroInfo.objects.get(codigo_postal="30303").id, max_id
+        )
+
+    def table_definition(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexname, indexdef FROM pg_indexes"
+                " WHERE tablename = %s",
+                [table],
+            )
+            indexes = dict(cursor.fetchall())
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+            (sequence,) = cursor.fetchone()
+            cursor.execute(
+                "SELECT tablename FROM pg_tables WHERE tablename LIKE %s",
+                [f"{table}%"],
+            )
+            tables = [name for (name,) in cursor.fetchall()]
+        return {"indexes": indexes, "sequence": sequence, "tables": tables}
+
+    def test_on_replace_runs_without_exclusive_lock(self):
+        writer = CopyWriter(connection, 10)
+        locks = []
+
+        def on_replace():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_locks"
+                    " WHERE pid = pg_backend_pid()"
+                    " AND mode = 'AccessExclusiveLock'"
+                    " AND relation = %s::regclass",
+                    [CatastroInfo._meta.db_table],
+                )
+                locks.append(cursor.fetchone()[0])
+
+        TableSwapReplace(connection).replace(
+            lambda staging: writer.write([], table=staging), on_replace
+        )
+
+        self.assertEqual(locks, [0])
+        self.assertFalse(connection.in_atomic_block)
+
+    def test_overlapping_loads_fail_fast(self):
+        other_connection = connections.create_connection("default")
+        self.addCleanup(other_connection.close)
+        replace = TableSwapReplace(connection)
+        other = TableSwapReplace(other_connection)
+
+        replace.prepare()
+        with self.assertRaisesMessage(IngestionError, "otra carga"):
+            other.prepare()
+        # `discard` de la carga rechazada no elimina la tabla staging.
+        other.discard()
+        replace.keep_alcaldias([self.alcaldia.id])
+        replace.finish()
+
+        other.prepare()
+        # Luego de `finish`, `discard` no elimina la tabla staging de otra
+        # carga.
+        replace.discard()
+        self.assertIn(
+            other.staging, self.table_definition(other.table)["tables"]
+        )
+        other.discard()
+        self.assertEqual(CatastroInfo.objects.count(), 2)
+
+
+class CatastroSync_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+        CatastroInfo.objects.all().delete()
+        self.writer = BulkCreateWriter(connection, 10)
+        self.writer.write(
+            [
+                self.row("10101", 1000),
+                self.row("10101", 1500),
+                self.row("20202", 300),
+                self.row("20202", 300),
+            ]
+        )
+
+    def row(self, codigo_postal, superficie_terreno):
+        values = (
+            self.alcaldia.id,
+            self.uso_construccion.id,
+            codigo_postal,
+            superficie_terreno,
+            600.0,
+            10.0,
+            23.0,
+        )
+        return catastro_row(values, QualityRules())
+
+    def test_sync(self):
+        rows = [
+            self.row("10101", 1000),
+            self.row("20202", 300),
+            self.row("20202", 300),
+            self.row("30303", 700),
+        ]
+
+        summary = CatastroSync(connection, self.writer).sync(
+            rows, self.alcaldia.id
+        )
+
+        self.assertEqual(summary.inserted, 1)
+        self.assertEqual(summary.deleted, 1)
+        self.assertEqual(summary.unchanged, 3)
+        self.assertEqual(summary.zip_codes, {"10101", "30303"})
+        self.assertEqual(
+            sorted(
+                CatastroInfo.objects.values_list(
+                    "codigo_postal", "superficie_terreno"
+                )
+            ),
+            [
+                ("10101", 1000),
+                ("20202", 300),
+                ("20202", 300),
+                ("30303", 700),
+            ],
+        )
@@ -1,4 +1,10 @@
+import unittest.mock
+
 from django.test import Client, TestCase
+from price_m2.constants import AGGREGATE_TYPES
+from price_m2.dataset_version import publish_dataset_version
+from price_m2.models import CatastroInfo, CatastroResumen, UsoConstruccion
+from price_m2.services import CatastroResumenService
 
 from .data_price_m2 import generate_price_m2_data
 
@@ -95,3 +101,276 @@ class PriceM2_Integration_TestCase(TestCase):
                 ],
             },
         )
+
+    def test_price_m2_calculate_several(self):
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/max,min?construction_type=1"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": True,
+                "payload": [
+                    {
+                        "type": "max",
+                        "price_unit": 77,
+                        "price_unit_construction": 37,
+                        "elements": 2,
+                    },
+                    {
+                        "type": "min",
+                        "price_unit": 57.23529411764706,
+                        "price_unit_construction": 21.941176470588232,
+                        "elements": 2,
+                    },
+                ],
+            },
+        )
+
+    def test_price_m2_calculate_all(self):
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/all?construction_type=1"
+        )
+
+        self.assertEqual(
+            [result["type"] for result in response.json()["payload"]],
+            list(AGGREGATE_TYPES),
+        )
+
+    def test_price_m2_calculate_repeated(self):
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/avg,avg?construction_type=1"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result["type"] for result in response.json()["payload"]],
+            ["avg"],
+        )
+
+    def test_price_m2_calculate_several_cached(self):
+        self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/max?construction_type=1"
+        )
+        CatastroResumen.objects.filter(codigo_postal="10101").update(
+            elements=5
+        )
+
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/max,avg?construction_type=1"
+        )
+
+        # "max" se lee del caché y sólo "avg" se evalúa con el resumen.
+        self.assertEqual(
+            [result["elements"] for result in response.json()["payload"]],
+            [2, 5],
+        )
+
+    def test_price_m2_calculate_invalid_aggregates(self):
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/max,sum?construction_type=1"
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_price_m2_calculate_cached(self):
+        url = "/price-m2/zip-codes/10101/aggregate/max?construction_type=1"
+        first_response = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(url)
+
+        self.assertEqual(cached_response.json(), first_response.json())
+
+    def test_price_m2_cache_invalidated_by_dataset_version(self):
+        url = "/price-m2/zip-codes/10101/aggregate/max?construction_type=1"
+        self.client.get(url)
+
+        CatastroInfo.objects.filter(superficie_terreno=1000).delete()
+        CatastroResumenService().rebuild()
+        publish_dataset_version()
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.json()["payload"]["elements"], 1)
+
+    def test_price_m2_cache_invalidated_by_zip_code(self):
+        url = "/price-m2/zip-codes/10101/aggregate/max?construction_type=1"
+        self.client.get(url)
+        CatastroResumen.objects.filter(codigo_postal="10101").update(
+            elements=5
+        )
+
+        publish_dataset_version(zip_codes=["20202"])
+        cached_response = self.client.get(url)
+        publish_dataset_version(zip_codes=["10101"])
+        response = self.client.get(url)
+
+        self.assertEqual(cached_response.json()["payload"]["elements"], 2)
+        self.assertEqual(response.json()["payload"]["elements"], 5)
+
+    def test_price_m2_calculate_batch(self):
+        response = self.client.post(
+            "/price-m2/zip-codes/aggregate",
+            {
+                "queries": [
+                    {
+                        "zip_code": "10101",
+                        "construction_type": 1,
+                        "aggregate": "max",
+                    },
+                    {
+                        "zip_code": "NOT-VALID",
+                        "construction_type": 1,
+                        "aggregate": "avg",
+                    },
+                ]
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": True,
+                "payload": [
+                    {
+                        "zip_code": "10101",
+                        "construction_type": 1,
+                        "aggregate": "max",
+                        "status": True,
+                        "payload": {
+                            "type": "max",
+                            "price_unit": 77,
+                            "price_unit_construction": 37,
+                            "elements": 2,
+                        },
+                    },
+                    {
+                        "zip_code": "NOT-VALID",
+                        "construction_type": 1,
+                        "aggregate": "avg",
+                        "status": False,
+                        "errors": ["No se halló el código zip solicitado"],
+                    },
+                ],
+            },
+        )
+
+    def test_price_m2_calculate_batch_cached(self):
+        data = {
+            "queries": [
+                {"zip_code": "10101", "construction_type": 1, "aggregate": a}
+                for a in ("avg", "max", "min")
+            ]
+        }
+        first_response = self.client.post(
+            "/price-m2/zip-codes/aggregate",
+            data,
+            content_type="application/json",
+        )
+
+        with self.assertNumQueries(0):
+            cached_response = self.client.post(
+                "/price-m2/zip-codes/aggregate",
+                data,
+                content_type="application/json",
+            )
+
+        self.assertEqual(cached_response.json(), first_response.json())
+
+    def test_price_m2_calculate_batch_invalid_aggregate(self):
+        response = self.client.post(
+            "/price-m2/zip-codes/aggregate",
+            {
+                "queries": [
+                    {
+                        "zip_code": "10101",
+                        "construction_type": 1,
+                        "aggregate": "sum",
+                    }
+                ]
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()["status"])
+        self.assertIn("aggregate", response.json()["errors"]["queries"][0])
+
+
+class PriceM2_HttpCache_Integration_TestCase(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        generate_price_m2_data(self)
+
+    def test_price_m2_calculate_headers(self):
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/avg?construction_type=1"
+        )
+
+        self.assertTrue(response.has_header("ETag"))
+        self.assertEqual(response["Cache-Control"], "public, max-age=300")
+
+    def test_price_m2_calculate_not_modified(self):
+        url = "/price-m2/zip-codes/10101/aggregate/avg?construction_type=1"
+        etag = self.client.get(url)["ETag"]
+
+        with unittest.mock.patch(
+            "price_m2.api_views.get_price_m2_service"
+        ) as service_mock:
+            response = self.client.get(url, headers={"If-None-Match": etag})
+
+        service_mock.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_price_m2_calculate_etag_by_request(self):
+        UsoConstruccion.objects.create(id=2, name="Industrial")
+
+        etags = {
+            self.client.get(url)["ETag"]
+            for url in (
+                "/price-m2/zip-codes/10101/aggregate/avg?construction_type=1",
+                "/price-m2/zip-codes/10101/aggregate/max?construction_type=1",
+                "/price-m2/zip-codes/10101/aggregate/avg?construction_type=2",
+            )
+        }
+
+        self.assertEqual(len(etags), 3)
+
+    def test_price_m2_calculate_etag_by_dataset_version(self):
+        url = "/price-m2/zip-codes/10101/aggregate/avg?construction_type=1"
+        etag = self.client.get(url)["ETag"]
+
+        publish_dataset_version(zip_codes=["20202"])
+        self.assertEqual(
+            self.client.get(url, headers={"If-None-Match": etag}).status_code,
+            304,
+        )
+
+        publish_dataset_version()
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @unittest.mock.patch("logging.warning")
+    def test_price_m2_calculate_error_not_cached(self, _):
+        response = self.client.get(
+            "/price-m2/zip-codes/NOT-VALID/aggregate/avg?construction_type=1"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header("Cache-Control"))
+
+    def test_completion_not_modified(self):
+        url = "/price-m2/completion/uso_construccion/"
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,226 @@
+import re
+
+from django.test import (
+    AsyncClient,
+    Client,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from price_m2.cache import price_m2_cache
+from price_m2.metrics import Counter, Histogram, render_metrics, stage
+
+from .data_price_m2 import generate_price_m2_data
+
+
+class Metrics_TestCase(SimpleTestCase):
+
+    def test_histogram_samples(self):
+        histogram = Histogram(
+            "latency_seconds", "Latencia.", ("stage",), buckets=(0.1, 1)
+        )
+
+        for value in (0.05, 0.5, 0.7, 3):
+            histogram.observe(value, stage='find "resumen"')
+
+        self.assertEqual(
+            list(histogram.samples()),
+            [
+                (
+                    "latency_seconds_bucket",
+                    {"stage": 'find "resumen"', "le": "0.1"},
+                    1,
+                ),
+                (
+                    "latency_seconds_bucket",
+                    {"stage": 'find "resumen"', "le": "1"},
+                    3,
+                ),
+                (
+                    "latency_seconds_bucket",
+                    {"stage": 'find "resumen"', "le": "+Inf"},
+                    4,
+                ),
+                ("latency_seconds_sum", {"stage": 'find "resumen"'}, 4.25),
+                ("latency_seconds_count", {"stage": 'find "resumen"'}, 4),
+            ],
+        )
+
+    def test_counter_samples(self):
+        counter = Counter("hits_total", "Aciertos.", ("result",))
+
+        counter.inc(result="hit")
+        counter.inc(2, result="hit")
+        counter.inc(result="miss")
+
+        self.assertEqual(
+            list(counter.samples()),
+            [
+                ("hits_total", {"result": "hit"}, 3),
+                ("hits_total", {"result": "miss"}, 1),
+            ],
+        )
+
+    def test_render_stage(self):
+        with stage('render "json"'):
+            pass
+
+        self.assertIn(
+            "# TYPE price_m2_stage_duration_seconds histogram",
+            render_metrics(),
+        )
+        self.assertIn(
+            'price_m2_stage_duration_seconds_count{stage="render \\"json\\""}',
+            render_metrics(),
+        )
+
+
+@override_settings(PRICE_M2_SERVER_TIMING=True)
+class Metrics_Integration_TestCase(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        generate_price_m2_data(self)
+        price_m2_cache().clear()
+
+    def test_server_timing(self):
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/max?construction_type=1"
+        )
+
+        server_timing = response.headers["Server-Timing"]
+        for name in ("parse", "service", "cache", "find_resumen", "render"):
+            self.assertRegex(server_timing, rf"\b{name};dur=\d+\.\d+")
+        self.assertRegex(server_timing, r'db;dur=\d+\.\d+;desc="\d+ queries"')
+        self.assertRegex(server_timing, r"total;dur=\d+\.\d+$")
+
+    def test_server_timing_of_errors(self):
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/max?construction_type=X"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(
+            "exception_handler;dur=", response.headers["Server-Timing"]
+        )
+
+    @override_settings(PRICE_M2_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        response = self.client.get(
+            "/price-m2/zip-codes/10101/aggregate/max?construction_type=1"
+        )
+
+        self.assertNotIn("Server-Timing", response.headers)
+
+    def test_metrics(self):
+        url = "/price-m2/zip-codes/10101/aggregate/max?construction_type=1"
+        before = self.metric_values()
+        self.client.get(url)
+        self.client.get(url, HTTP_ACCEPT="application/json; indent=2")
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(
+            response["Content-Type"],
+            "text/plain; version=0.0.4; charset=utf-8",
+        )
+        after = self.metric_values(response.content.decode())
+        self.assertEqual(
+            self.delta(
+                before, after, 'price_m2_cache_requests_total{result="miss"}'
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.delta(
+                before, after, 'price_m2_cache_requests_total{result="hit"}'
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.delta(
+                before,
+                after,
+                'price_m2_stage_duration_seconds_count{stage="find_resumen"}',
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.delta(
+                before,
+                after,
+                'price_m2_db_query_duration_seconds_count{alias="default",stage="find_resumen"}',
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.delta(
+                before,
+                after,
+                "price_m2_request_duration_seconds_count"
+                '{view="price_m2.api_views.aggregated_price_by_m2",status="200"}',
+            ),
+            2,
+        )
+
+    def test_metrics_only_for_allowed_ips(self):
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.7")
+
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(
+        PRICE_M2_METRICS_ALLOWED_IPS=["10.0.0.5"],
+        PRICE_M2_METRICS_TRUSTED_PROXIES=["10.0.0.1", "10.0.0.2"],
+    )
+    def test_metrics_behind_trusted_proxies(self):
+        cases = (
+            # El scraper a través de dos proxies de confianza.
+            ("10.0.0.1", "10.0.0.5, 10.0.0.2", 200),
+            # Un cliente externo a través del proxy.
+            ("10.0.0.1", "203.0.113.7", 404),
+            # Un cliente externo que envía su propio X-Forwarded-For.
+            ("10.0.0.1", "10.0.0.5, 203.0.113.7", 404),
+            # X-Forwarded-For de una IP que no es un proxy de confianza.
+            ("203.0.113.7", "10.0.0.5", 404),
+            ("10.0.0.1", "", 404),
+        )
+        for remote_addr, forwarded_for, status_code in cases:
+            with self.subTest(
+                remote_addr=remote_addr, forwarded=forwarded_for
+            ):
+                response = self.client.get(
+                    "/metrics",
+                    REMOTE_ADDR=remote_addr,
+                    HTTP_X_FORWARDED_FOR=forwarded_for,
+                )
+
+                self.assertEqual(response.status_code, status_code)
+
+    def metric_values(self, text=None):
+        text = render_metrics() if text is None else text
+        return {
+            match["sample"]: float(match["value"])
+            for match in re.finditer(
+                r"^(?P<sample>[^#\s]\S*) (?P<value>\S+)$", text, re.MULTILINE
+            )
+        }
+
+    def delta(self, before, after, sample):
+        return after.get(sample, 0) - before.get(sample, 0)
+
+
+@override_settings(PRICE_M2_SERVER_TIMING=True)
+class Metrics_Async_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+
+    async def test_server_timing_under_asgi(self):
+        response = await AsyncClient().get(
+            "/price-m2/zip-codes/10101/aggregate/min?construction_type=1"
+        )
+
+        server_timing = response.headers["Server-Timing"]
+        self.assertIn("find_resumen;dur=", server_timing)
+        self.assertIn("render;dur=", server_timing)
+        self.assertNotIn('desc="0 queries"', server_timing)
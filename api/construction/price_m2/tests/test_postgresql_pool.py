@@ -0,0 +1,211 @@
+import threading
+import unittest.mock
+
+from django.db.backends.postgresql import base as postgresql_base
+from django.test import SimpleTestCase
+from price_m2.postgresql_pool.base import DatabaseWrapper
+from price_m2.postgresql_pool.pool import ConnectionPool, PoolTimeout
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INERROR,
+    TRANSACTION_STATUS_INTRANS,
+)
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPool_TestCase(SimpleTestCase):
+
+    def test_reuses_connections(self):
+        pool = ConnectionPool(max_size=2, timeout=1)
+
+        connection = pool.getconn(FakeConnection)
+        pool.putconn(connection)
+
+        self.assertIs(pool.getconn(FakeConnection), connection)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    @unittest.mock.patch("logging.warning")
+    def test_timeout_when_exhausted(self, _):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        pool.getconn(FakeConnection)
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(FakeConnection)
+
+        stats = pool.stats()
+        self.assertEqual(stats["waits"], 1)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertGreater(stats["wait_seconds"], 0)
+
+    def test_waits_for_released_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        connection = pool.getconn(FakeConnection)
+
+        timer = threading.Timer(0.01, pool.putconn, [connection])
+        timer.start()
+        self.addCleanup(timer.join)
+
+        self.assertIs(pool.getconn(FakeConnection), connection)
+        self.assertEqual(pool.stats()["waits"], 1)
+
+    def test_discards_invalid_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=1)
+        invalid = pool.getconn(FakeConnection)
+        pool.putconn(invalid)
+
+        def check(connection):
+            raise ConnectionError()
+
+        connection = pool.getconn(FakeConnection, check=check)
+
+        self.assertTrue(invalid.closed)
+        self.assertIsNot(connection, invalid)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_failed_connect_releases_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+
+        with self.assertRaises(ConnectionError):
+            pool.getconn(unittest.mock.Mock(side_effect=ConnectionError))
+
+        self.assertIsInstance(pool.getconn(FakeConnection), FakeConnection)
+
+
+def psycopg2_connection(transaction_status=TRANSACTION_STATUS_IDLE):
+    """Retorna una conexión de psycopg2 simulada."""
+    connection = unittest.mock.MagicMock(closed=0)
+    connection.info.transaction_status = transaction_status
+    return connection
+
+
+class DatabaseWrapper_TestCase(SimpleTestCase):
+    """`postgresql_pool.base.DatabaseWrapper` con conexiones simuladas."""
+
+    def setUp(self):
+        patcher = unittest.mock.patch.object(
+            postgresql_base.DatabaseWrapper,
+            "get_new_connection",
+            side_effect=lambda conn_params: psycopg2_connection(),
+        )
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def wrapper(self, health_checks=False):
+        # Un alias por test, para no compartir el pool entre tests.
+        return DatabaseWrapper(
+            {
+                "ENGINE": "price_m2.postgresql_pool",
+                "NAME": "price_m2",
+                "USER": "",
+                "PASSWORD": "",
+                "HOST": "",
+                "PORT": "",
+                "OPTIONS": {"pool": {"max_size": 1, "timeout": 0.01}},
+                "CONN_HEALTH_CHECKS": health_checks,
+                "CONN_MAX_AGE": 0,
+                "AUTOCOMMIT": True,
+                "ATOMIC_REQUESTS": False,
+                "TIME_ZONE": None,
+                "TEST": {},
+            },
+            alias=self.id(),
+        )
+
+    def test_connection_params_without_pool(self):
+        self.assertNotIn("pool", self.wrapper().get_connection_params())
+
+    def test_returns_connection_to_pool(self):
+        wrapper = self.wrapper()
+        connection = wrapper.connection = wrapper.get_new_connection({})
+
+        wrapper._close()
+
+        connection.rollback.assert_not_called()
+        connection.close.assert_not_called()
+        self.assertEqual(wrapper.pool.stats()["idle"], 1)
+        self.assertIs(wrapper.get_new_connection({}), connection)
+        self.assertEqual(self.connect.call_count, 1)
+
+    def test_rollback_open_transaction(self):
+        for status in (TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_INERROR):
+            with self.subTest(status=status):
+                wrapper = self.wrapper()
+                wrapper.connection = wrapper.get_new_connection({})
+                wrapper.connection.info.transaction_status = status
+
+                wrapper._close()
+
+                wrapper.connection.rollback.assert_called_once_with()
+                wrapper.connection.close.assert_not_called()
+                self.assertEqual(wrapper.pool.stats()["idle"], 1)
+                wrapper.pool.close_idle()
+
+    def test_discard_when_rollback_fails(self):
+        wrapper = self.wrapper()
+        connection = wrapper.connection = wrapper.get_new_connection({})
+        connection.info.transaction_status = TRANSACTION_STATUS_INTRANS
+        connection.rollback.side_effect = InterfaceError()
+
+        wrapper._close()
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(wrapper.pool.stats()["size"], 0)
+
+    def test_discard_closed_connection(self):
+        wrapper = self.wrapper()
+        connection = wrapper.connection = wrapper.get_new_connection({})
+        connection.closed = 2
+
+        wrapper._close()
+
+        connection.rollback.assert_not_called()
+        connection.close.assert_called_once_with()
+        self.assertEqual(wrapper.pool.stats()["size"], 0)
+
+    def test_discard_in_atomic_block(self):
+        wrapper = self.wrapper()
+        connection = wrapper.connection = wrapper.get_new_connection({})
+        wrapper.in_atomic_block = True
+
+        wrapper._close()
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(wrapper.pool.stats()["size"], 0)
+
+    def test_close_without_connection(self):
+        wrapper = self.wrapper()
+
+        wrapper._close()
+
+        self.assertEqual(wrapper.pool.stats()["size"], 0)
+
+    def test_health_check_discards_unusable_connection(self):
+        wrapper = self.wrapper(health_checks=True)
+        unusable = wrapper.connection = wrapper.get_new_connection({})
+        wrapper._close()
+        cursor = unusable.cursor.return_value.__enter__.return_value
+        cursor.execute.side_effect = OperationalError()
+
+        connection = wrapper.get_new_connection({})
+
+        cursor.execute.assert_called_once_with("SELECT 1")
+        unusable.close.assert_called_once_with()
+        self.assertIsNot(connection, unusable)
+        self.assertEqual(wrapper.pool.stats()["size"], 1)
+
+    @unittest.mock.patch("logging.warning")
+    def test_pool_timeout(self, _):
+        wrapper = self.wrapper()
+        wrapper.get_new_connection({})
+
+        with self.assertRaises(wrapper.Database.OperationalError):
+            wrapper.get_new_connection({})
@@ -0,0 +1,250 @@
+import importlib
+import itertools
+import math
+import unittest.mock
+
+from django.apps import apps
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from price_m2.models import CatastroInfo, CatastroResumen
+from price_m2.quality import TRIM_IQR, TRIM_PERCENTILE, QualityRules
+from price_m2.services import CatastroQualityService, CatastroResumenService
+
+from .data_price_m2 import generate_price_m2_data
+
+Quality = CatastroInfo.Quality
+
+
+class QualityRules_TestCase(SimpleTestCase):
+
+    def test_evaluate(self):
+        rules = QualityRules(min_valor_suelo=5)
+
+        self.assertEqual(
+            rules.evaluate(1000, 600, 10, 23), (77, 37, Quality.VALID)
+        )
+        self.assertEqual(
+            rules.evaluate(1000, 600, 4, 0), (250, 150, Quality.INVALID)
+        )
+        self.assertEqual(
+            rules.evaluate(1000, 600, 0, 0), (None, None, Quality.INVALID)
+        )
+        self.assertEqual(rules.evaluate(-1, 600, 10, 0)[2], Quality.INVALID)
+        self.assertEqual(
+            rules.evaluate(math.nan, 600, 10, 0)[2], Quality.INVALID
+        )
+
+    def test_evaluate_negative_surfaces_allowed(self):
+        rules = QualityRules(non_negative_surfaces=False)
+
+        self.assertEqual(rules.evaluate(-100, 600, 10, 0)[2], Quality.VALID)
+
+    def test_trim_bounds(self):
+        iqr = QualityRules(trim=TRIM_IQR, iqr_factor=2)
+        percentile = QualityRules(trim=TRIM_PERCENTILE)
+
+        self.assertEqual(iqr.trim_bounds({"q1": 10, "q3": 20}), (-10, 40))
+        self.assertEqual(percentile.trim_bounds({"low": 1, "high": 9}), (1, 9))
+
+    def test_invalid_trim(self):
+        with self.assertRaises(ValueError):
+            QualityRules(trim="zscore")
+
+
+class CatastroQualityService_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+
+    def create(self, codigo_postal, price, valor_suelo=1):
+        return CatastroInfo.objects.create(
+            alcaldia=self.alcaldia,
+            uso_construccion=self.uso_construccion,
+            codigo_postal=codigo_postal,
+            superficie_terreno=price * valor_suelo,
+            superficie_construccion=price * valor_suelo,
+            valor_suelo=valor_suelo,
+            subsidio=0,
+        )
+
+    def test_evaluate_pending(self):
+        valid = self.create("20202", 10)
+        invalid = self.create("20202", 10, valor_suelo=0.5)
+
+        CatastroQualityService(QualityRules(min_valor_suelo=1)).apply(
+            CatastroInfo.objects.all()
+        )
+
+        valid.refresh_from_db()
+        invalid.refresh_from_db()
+        self.assertEqual(valid.quality, Quality.VALID)
+        self.assertAlmostEqual(valid.price_unit, 10)
+        self.assertAlmostEqual(valid.price_unit_construction, 10)
+        self.assertEqual(invalid.quality, Quality.INVALID)
+
+    def non_finite_rows(self):
+        """Crea filas con "nan" (sólo en PostgreSQL) e "inf" en cada columna.
+
+        Retorna los pares (fila, calidad de `QualityRules.evaluate`).
+        """
+        # SQLite registra "nan" como NULL.
+        values = (math.inf, -math.inf) + (
+            (math.nan,) if connection.vendor == "postgresql" else ()
+        )
+        fields = (
+            "superficie_terreno",
+            "superficie_construccion",
+            "valor_suelo",
+            "subsidio",
+        )
+        rows = []
+        for field, value in itertools.product(fields, values):
+            row = {
+                "superficie_terreno": 10,
+                "superficie_construccion": 10,
+                "valor_suelo": 2,
+                "subsidio": 0,
+                field: value,
+            }
+            rows.append(
+                (
+                    CatastroInfo.objects.create(
+                        alcaldia=self.alcaldia,
+                        uso_construccion=self.uso_construccion,
+                        codigo_postal="20202",
+                        **row,
+                    ),
+                    QualityRules(min_valor_suelo=1).evaluate(**row)[2],
+                )
+            )
+        return rows
+
+    def test_evaluate_pending_non_finite(self):
+        rows = self.non_finite_rows()
+
+        CatastroQualityService(QualityRules(min_valor_suelo=1)).apply(
+            CatastroInfo.objects.all()
+        )
+
+        for catastro_info, quality in rows:
+            catastro_info.refresh_from_db()
+            self.assertEqual(catastro_info.quality, quality, catastro_info)
+
+    def test_migration_non_finite(self):
+        migration = importlib.import_module(
+            "price_m2.migrations.0009_catastroinfo_quality"
+        )
+        rows = self.non_finite_rows()
+
+        migration.evaluate_catastro_quality(apps, None)
+
+        for catastro_info, quality in rows:
+            catastro_info.refresh_from_db()
+            self.assertEqual(catastro_info.quality, quality, catastro_info)
+
+    def test_iqr_trim(self):
+        for price in (10, 11, 12, 13, 14, 15, 16, 17, 18, 1000):
+            self.create("20202", price)
+        rules = QualityRules(trim=TRIM_IQR, trim_min_elements=10)
+
+        total = CatastroQualityService(rules).apply(CatastroInfo.objects.all())
+
+        self.assertEqual(total, 1)
+        self.assertEqual(
+            CatastroInfo.objects.get(quality=Quality.OUTLIER).price_unit, 1000
+        )
+        # "10101" tiene menos de `trim_min_elements` filas.
+        self.assertFalse(
+            CatastroInfo.objects.filter(
+                codigo_postal="10101", quality=Quality.OUTLIER
+            ).exists()
+        )
+
+        # Sin recorte, los atípicos vuelven a ser válidos.
+        CatastroQualityService(QualityRules()).apply(
+            CatastroInfo.objects.all()
+        )
+        self.assertFalse(
+            CatastroInfo.objects.filter(quality=Quality.OUTLIER).exists()
+        )
+
+    def test_trim_in_one_update(self):
+        zip_codes = ("20202", "30303", "40404")
+        for codigo_postal in zip_codes:
+            for price in (10, 11, 12, 13, 14, 15, 16, 17, 18, 1000):
+                self.create(codigo_postal, price)
+        rules = QualityRules(trim=TRIM_IQR, trim_min_elements=10)
+
+        with CaptureQueriesContext(connection) as queries:
+            total = CatastroQualityService(rules).apply(
+                CatastroInfo.objects.all()
+            )
+
+        self.assertEqual(total, 3)
+        self.assertEqual(
+            sorted(
+                CatastroInfo.objects.filter(
+                    quality=Quality.OUTLIER
+                ).values_list("codigo_postal", "price_unit")
+            ),
+            [(codigo_postal, 1000) for codigo_postal in zip_codes],
+        )
+        self.assertEqual(
+            sum(
+                "VALUES" in query["sql"] for query in queries.captured_queries
+            ),
+            1,
+        )
+
+    def test_trim_in_batches(self):
+        for codigo_postal in ("20202", "30303", "40404"):
+            for price in (10, 11, 12, 13, 14, 15, 16, 17, 18, 1000):
+                self.create(codigo_postal, price)
+        rules = QualityRules(trim=TRIM_IQR, trim_min_elements=10)
+
+        # Una llave por UPDATE.
+        with unittest.mock.patch.object(
+            connection.features, "max_query_params", 10
+        ):
+            total = CatastroQualityService(rules).apply(
+                CatastroInfo.objects.all()
+            )
+
+        self.assertEqual(total, 3)
+        self.assertEqual(
+            CatastroInfo.objects.filter(quality=Quality.OUTLIER).count(), 3
+        )
+
+    def test_percentile_trim(self):
+        for price in range(1, 21):
+            self.create("20202", price)
+        rules = QualityRules(
+            trim=TRIM_PERCENTILE,
+            trim_percentiles=(0.1, 0.9),
+            trim_min_elements=10,
+        )
+
+        CatastroQualityService(rules).apply(CatastroInfo.objects.all())
+
+        self.assertEqual(
+            sorted(
+                CatastroInfo.objects.filter(
+                    quality=Quality.OUTLIER
+                ).values_list("price_unit", flat=True)
+            ),
+            [1, 2, 19, 20],
+        )
+
+    def test_rebuild_excludes_invalid_and_outliers(self):
+        for price in (10, 11, 12, 13, 14, 15, 16, 17, 18, 1000):
+            self.create("20202", price)
+        self.create("20202", 10, valor_suelo=0)
+
+        CatastroResumenService().rebuild(
+            rules=QualityRules(trim=TRIM_IQR, trim_min_elements=10)
+        )
+
+        resumen = CatastroResumen.objects.get(codigo_postal="20202")
+        self.assertEqual(resumen.elements, 9)
+        self.assertAlmostEqual(resumen.price_unit_max, 18)
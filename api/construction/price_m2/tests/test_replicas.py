@@ -0,0 +1,81 @@
+import unittest.mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, override_settings
+from price_m2 import replicas
+from price_m2.dataset_version import (
+    current_dataset_version,
+    publish_dataset_version,
+)
+from price_m2.models import CatastroResumen, DatasetVersion
+from price_m2.replicas import ReplicaRouter, read_from_replica, replica_reads
+
+
+@override_settings(PRICE_M2_DB_REPLICAS=["replica_0"])
+class ReplicaRouter_TestCase(TestCase):
+
+    def setUp(self):
+        publish_dataset_version()
+        replicas._memo.clear()
+        self.addCleanup(replicas._memo.clear)
+        self.router = ReplicaRouter()
+
+        replica_version = unittest.mock.patch.object(
+            replicas,
+            "replica_dataset_version",
+            return_value=current_dataset_version(),
+        )
+        self.replica_version_mock = replica_version.start()
+        self.addCleanup(replica_version.stop)
+
+    def test_reads_from_replica(self):
+        self.assertIsNone(self.router.db_for_read(CatastroResumen))
+
+        with replica_reads():
+            self.assertEqual(
+                self.router.db_for_read(CatastroResumen), "replica_0"
+            )
+            self.assertIsNone(self.router.db_for_read(DatasetVersion))
+
+        self.assertFalse(self.router.allow_migrate("replica_0", "price_m2"))
+        self.assertIsNone(self.router.allow_migrate("default", "price_m2"))
+
+    @unittest.mock.patch("logging.info")
+    def test_lagging_replica_reads_from_default(self, _):
+        self.replica_version_mock.return_value = "OLD-VERSION"
+
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(CatastroResumen))
+
+    def test_replica_version_memoized(self):
+        with replica_reads():
+            self.router.db_for_read(CatastroResumen)
+            self.router.db_for_read(CatastroResumen)
+
+        self.replica_version_mock.assert_called_once_with("replica_0")
+
+    @unittest.mock.patch("logging.info")
+    def test_new_version_checks_replica(self, _):
+        with replica_reads():
+            self.router.db_for_read(CatastroResumen)
+            publish_dataset_version()
+
+            self.assertIsNone(self.router.db_for_read(CatastroResumen))
+
+        self.assertEqual(self.replica_version_mock.call_count, 2)
+
+
+class ReadFromReplica_TestCase(SimpleTestCase):
+
+    def test_sync_view(self):
+        view = read_from_replica(lambda: replicas._replica_reads.get())
+
+        self.assertTrue(view())
+        self.assertFalse(replicas._replica_reads.get())
+
+    def test_async_view(self):
+        @read_from_replica
+        async def view():
+            return replicas._replica_reads.get()
+
+        self.assertTrue(async_to_sync(view)())
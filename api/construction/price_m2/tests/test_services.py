@@ -1,7 +1,19 @@
+import importlib
+import statistics
 import unittest.mock
 
+from django.apps import apps
+from django.db import connection
+from django.db.models import Avg
 from django.test import TestCase
-from price_m2.services import PriceM2Service, ServiceError
+from price_m2.constants import PERCENTILES
+from price_m2.models import CatastroInfo, CatastroResumen, UsoConstruccion
+from price_m2.services import (
+    CatastroResumenService,
+    PriceM2Service,
+    ServiceError,
+    percentile_cont,
+)
 
 from .data_price_m2 import generate_price_m2_data
 
@@ -63,6 +75,53 @@ class PriceM2Service_Agreggation_TestCase(TestCase):
             result["price_unit_construction"], expected_price_unit_construction
         )
 
+    def test_calculate_percentiles(self):
+        for aggregate, expected_price_unit in (
+            ("p25", 62.17647058823529),
+            ("median", 67.11764705882354),
+            ("p75", 72.05882352941177),
+            ("p90", 75.02352941176471),
+        ):
+            with self.subTest(aggregate=aggregate):
+                result = self.price_m2_service.calculate(
+                    zip_code="10101",
+                    aggregate=aggregate,
+                    construction_type=1,
+                )
+
+                self.assertEqual(result["type"], aggregate)
+                self.assertAlmostEqual(
+                    result["price_unit"], expected_price_unit
+                )
+
+    def test_calculate_stddev(self):
+        result = self.price_m2_service.calculate(
+            zip_code="10101",
+            aggregate="stddev",
+            construction_type=1,
+        )
+
+        self.assertAlmostEqual(result["price_unit"], 9.882352941176471)
+        self.assertAlmostEqual(
+            result["price_unit_construction"], 7.529411764705884
+        )
+
+    def test_calculate_histogram(self):
+        result = self.price_m2_service.calculate(
+            zip_code="10101",
+            aggregate="histogram",
+            construction_type=1,
+        )
+
+        histogram = result["price_unit"]
+        self.assertEqual(len(histogram), 10)
+        self.assertEqual(
+            [bin["count"] for bin in histogram], [1, 0, 0, 0, 0, 0, 0, 0, 0, 1]
+        )
+        self.assertAlmostEqual(histogram[0]["from"], 57.23529411764706)
+        self.assertAlmostEqual(histogram[0]["to"], 59.21176470588235)
+        self.assertEqual(histogram[-1]["to"], 77)
+
     @unittest.mock.patch("logging.warning")
     def test_invalid_zip_code(self, warning_mock):
         with self.assertRaises(ServiceError) as ctx_error:
@@ -98,3 +157,253 @@ class PriceM2Service_Agreggation_TestCase(TestCase):
             "10101",
             "avg",
         )
+
+    def test_calculate_single_query(self):
+        with self.assertNumQueries(1):
+            self.price_m2_service.calculate(
+                zip_code="10101", aggregate="avg", construction_type=1
+            )
+
+    @unittest.mock.patch("logging.warning")
+    def test_calculate_errors_single_query(self, _):
+        for zip_code, construction_type in (("NOT-VALID", 1), ("10101", 99)):
+            with self.subTest(zip_code=zip_code), self.assertNumQueries(1):
+                with self.assertRaises(ServiceError):
+                    self.price_m2_service.calculate(
+                        zip_code=zip_code,
+                        aggregate="avg",
+                        construction_type=construction_type,
+                    )
+
+    def test_calculate_without_elements(self):
+        UsoConstruccion.objects.create(id=2, name="Industrial")
+
+        with self.assertNumQueries(1):
+            result = self.price_m2_service.calculate(
+                zip_code="10101", aggregate="max", construction_type=2
+            )
+
+        self.assertDictEqual(
+            result,
+            {
+                "type": "max",
+                "price_unit": None,
+                "price_unit_construction": None,
+                "elements": 0,
+            },
+        )
+
+    def test_calculate_aggregates(self):
+        with self.assertNumQueries(1):
+            results = self.price_m2_service.calculate_aggregates(
+                zip_code="10101",
+                aggregates=["max", "avg", "min"],
+                construction_type=1,
+            )
+
+        self.assertEqual(
+            results,
+            [
+                self.price_m2_service.calculate("10101", aggregate, 1)
+                for aggregate in ("max", "avg", "min")
+            ],
+        )
+
+    @unittest.mock.patch("logging.warning")
+    def test_calculate_aggregates_errors(self, warning_mock):
+        with self.assertRaisesMessage(
+            ServiceError, "No se halló el código zip solicitado"
+        ):
+            self.price_m2_service.calculate_aggregates(
+                zip_code="NOT-VALID",
+                aggregates=["avg", "max"],
+                construction_type=1,
+            )
+
+        warning_mock.assert_called_once_with(
+            "Error buscando zip_code=%s. Info: aggregate=%s, construction_type=%s",
+            "NOT-VALID",
+            "avg,max",
+            1,
+        )
+
+    @unittest.mock.patch("logging.warning")
+    def test_calculate_many(self, warning_mock):
+        UsoConstruccion.objects.create(id=2, name="Industrial")
+
+        with self.assertNumQueries(2):
+            results = self.price_m2_service.calculate_many(
+                [
+                    ("10101", "max", 1),
+                    ("10101", "min", 2),
+                    ("NOT-VALID", "avg", 1),
+                    ("10101", "avg", 99),
+                ]
+            )
+
+        self.assertEqual(results[0]["price_unit"], 77)
+        self.assertEqual(results[1]["elements"], 0)
+        self.assertIsInstance(results[2], ServiceError)
+        self.assertEqual(
+            str(results[2]), "No se halló el código zip solicitado"
+        )
+        self.assertEqual(
+            str(results[3]), "No se halló el tipo de construcción"
+        )
+        self.assertEqual(warning_mock.call_count, 2)
+
+    def test_calculate_many_single_query(self):
+        with self.assertNumQueries(1):
+            results = self.price_m2_service.calculate_many(
+                [
+                    ("10101", aggregate, 1)
+                    for aggregate in ("avg", "max", "min")
+                ]
+            )
+
+        self.assertEqual(
+            results,
+            [
+                self.price_m2_service.calculate("10101", aggregate, 1)
+                for aggregate in ("avg", "max", "min")
+            ],
+        )
+
+
+class CatastroResumenService_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+
+    def test_rebuild(self):
+        CatastroInfo.objects.create(
+            alcaldia=self.alcaldia,
+            uso_construccion=self.uso_construccion,
+            codigo_postal="20202",
+            superficie_terreno=300,
+            superficie_construccion=200,
+            valor_suelo=10,
+            subsidio=5,
+        )
+
+        total = CatastroResumenService().rebuild()
+
+        self.assertEqual(total, 2)
+        resumen = CatastroResumen.objects.get(codigo_postal="20202")
+        self.assertEqual(resumen.elements, 1)
+        self.assertAlmostEqual(resumen.price_unit_sum, 25)
+        self.assertAlmostEqual(resumen.price_unit_construction_max, 15)
+
+    def test_rebuild_distribution(self):
+        prices = (3, 8, 1, 20, 5, 13, 2)
+        for price in prices:
+            CatastroInfo.objects.create(
+                alcaldia=self.alcaldia,
+                uso_construccion=self.uso_construccion,
+                codigo_postal="20202",
+                superficie_terreno=price,
+                superficie_construccion=price,
+                valor_suelo=1,
+                subsidio=0,
+            )
+
+        CatastroResumenService().rebuild()
+
+        resumen = CatastroResumen.objects.get(codigo_postal="20202")
+        sorted_prices = sorted(prices)
+        for name, fraction in PERCENTILES.items():
+            self.assertAlmostEqual(
+                getattr(resumen, f"price_unit_{name}"),
+                percentile_cont(sorted_prices, fraction),
+            )
+        self.assertAlmostEqual(resumen.price_unit_median, 5)
+        self.assertAlmostEqual(
+            resumen.price_unit_stddev, statistics.pstdev(prices)
+        )
+        self.assertEqual(
+            resumen.price_unit_histogram, [2, 1, 1, 1, 0, 0, 1, 0, 0, 1]
+        )
+        self.assertEqual(sum(resumen.price_unit_construction_histogram), 7)
+
+    def test_rebuild_zip_codes(self):
+        CatastroInfo.objects.filter(superficie_terreno=1000).delete()
+        CatastroResumen.objects.filter(codigo_postal="10101").update(
+            price_unit_max=0
+        )
+        CatastroInfo.objects.create(
+            alcaldia=self.alcaldia,
+            uso_construccion=self.uso_construccion,
+            codigo_postal="20202",
+            superficie_terreno=300,
+            superficie_construccion=200,
+            valor_suelo=10,
+            subsidio=5,
+        )
+
+        total = CatastroResumenService().rebuild(zip_codes={"20202"})
+
+        self.assertEqual(total, 1)
+        # El resumen de "10101" no se reconstruye.
+        self.assertEqual(
+            CatastroResumen.objects.get(codigo_postal="10101").price_unit_max,
+            0,
+        )
+        self.assertEqual(
+            CatastroResumen.objects.get(codigo_postal="20202").elements, 1
+        )
+
+    def test_migration_build_resumen(self):
+        migration = importlib.import_module(
+            "price_m2.migrations.0002_catastroresumen"
+        )
+        expected = CatastroResumenService().rebuild()
+        resumen = CatastroResumen.objects.get()
+        CatastroResumen.objects.all().delete()
+
+        migration.build_catastro_resumen(apps, None)
+
+        self.assertEqual(CatastroResumen.objects.count(), expected)
+        built = CatastroResumen.objects.get()
+        for field in ("elements", "price_unit_sum", "price_unit_max"):
+            self.assertAlmostEqual(
+                getattr(built, field), getattr(resumen, field), msg=field
+            )
+        result = PriceM2Service().calculate(
+            zip_code="10101", aggregate="avg", construction_type=1
+        )
+        self.assertEqual(result["elements"], resumen.elements)
+
+
+class CatastroInfoIndex_TestCase(TestCase):
+
+    def setUp(self):
+        generate_price_m2_data(self)
+
+    def test_aggregation_uses_cp_uso_index(self):
+        catastro_infos = CatastroInfo.objects.filter(
+            codigo_postal="10101",
+            uso_construccion=self.uso_construccion,
+            quality=CatastroInfo.Quality.VALID,
+        )
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # Con tan pocas filas el planner prefiere leer la tabla.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("SET LOCAL enable_bitmapscan = off")
+            plan = catastro_infos.explain()
+            aggregate_plan = (
+                catastro_infos.values("uso_construccion")
+                .annotate(
+                    price_unit=Avg("price_unit"),
+                    price_unit_construction=Avg("price_unit_construction"),
+                )
+                .explain()
+            )
+
+        self.assertIn("price_m2_catastro_cp_uso_idx", plan)
+        if connection.vendor == "postgresql":
+            # El índice incluye los precios precalculados.
+            self.assertIn("Index Only Scan", aggregate_plan)
+        else:
+            self.assertIn("price_m2_catastro_cp_uso_idx", aggregate_plan)
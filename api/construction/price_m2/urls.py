@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path, re_path
 from drf_spectacular.views import (
     SpectacularAPIView,
@@ -6,7 +7,10 @@ from drf_spectacular.views import (
 )
 from rest_framework import routers
 
-from . import api_views, viewsets
+from . import api_views, async_views, viewsets
+from .constants import AGGREGATE_TYPES
+
+AGGREGATE_PATTERN = f"(?:{'|'.join(AGGREGATE_TYPES)})"
 
 
 def completion_routes():
@@ -25,14 +29,43 @@ def completion_routes():
     return router.urls
 
 
+def async_routes():
+    # Tienen los mismos paths que las vistas de DRF (incluidas las de
+    # `completion_routes`), que quedan detrás y sólo documentan la API.
+    return [
+        re_path(
+            r"zip-codes/(?P<zip_code>.{1,10})/aggregate/"
+            rf"(?P<aggregate>all|{AGGREGATE_PATTERN}(?:,{AGGREGATE_PATTERN})*)$",
+            async_views.aggregated_price_by_m2,
+        ),
+        path("completion/alcaldia/", async_views.alcaldia_completion_list),
+        path(
+            "completion/alcaldia/<str:pk>/",
+            async_views.alcaldia_completion_detail,
+        ),
+        path(
+            "completion/uso_construccion/",
+            async_views.uso_construccion_completion_list,
+        ),
+        path(
+            "completion/uso_construccion/<str:pk>/",
+            async_views.uso_construccion_completion_detail,
+        ),
+    ]
+
+
 urlpatterns = [
+    # Con ASGI, ver `settings.PRICE_M2_ASYNC_VIEWS`.
+    *(async_routes() if settings.PRICE_M2_ASYNC_VIEWS else []),
     # TODO: el max_length de `zip_code` se fija a 10 para evitar búsquedas innecesarias
     #       hacia db, dado que los códigos postales suelen tener 5 caracteres.
     # Revisitar para definir el formato de zip_code junto con el equipo de producto.
     re_path(
-        r"zip-codes/(?P<zip_code>.{1,10})/aggregate/(?P<aggregate>avg|max|min)",
+        r"zip-codes/(?P<zip_code>.{1,10})/aggregate/"
+        rf"(?P<aggregate>all|{AGGREGATE_PATTERN}(?:,{AGGREGATE_PATTERN})*)$",
         api_views.aggregated_price_by_m2,
     ),
+    path("zip-codes/aggregate", api_views.aggregated_prices_by_m2),
     path("completion/", include(completion_routes())),
     # api-doc
     path("doc/schema/download", SpectacularAPIView.as_view(), name="schema"),
@@ -0,0 +1,10 @@
+"""Utilidades sin dependencias de los demás módulos del django-app `price_m2`."""
+
+from itertools import islice
+
+
+def batched(iterable, size: int):
+    """Agrupa `iterable` en listas de a lo más `size` elementos."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
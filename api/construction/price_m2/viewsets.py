@@ -1,5 +1,6 @@
 import logging
 
+from django.utils.decorators import method_decorator
 from rest_framework import viewsets
 
 from .constants import (
@@ -8,13 +9,16 @@ from .constants import (
     USO_CONSTRUCCION_ACTUAL_LIMIT,
     USO_CONSTRUCCION_LIMIT_WARNING,
 )
+from .http_cache import dataset_cached
 from .models import Alcaldia, UsoConstruccion
+from .replicas import read_from_replica
 from .serializers import (
     AlcaldiaCompletionSerializer,
     UsoConstruccionCompletionSerializer,
 )
 
 
+@method_decorator([dataset_cached, read_from_replica], name="dispatch")
 class AlcaldiaCompletionViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = AlcaldiaCompletionSerializer
 
@@ -23,16 +27,14 @@ class AlcaldiaCompletionViewSet(viewsets.ReadOnlyModelViewSet):
             :ALCALDIA_ACTUAL_LIMIT
         ]
 
-        if len(alcaldias) >= ALCALDIA_LIMIT_WARNING:
-            logging.warning(
-                "Se está superando el límite de elementos para retornar Alcaldia: valor_actual=%s, warning_limit=%s",
-                len(alcaldias),
-                ALCALDIA_LIMIT_WARNING,
-            )
+        warn_completion_limit(
+            "Alcaldia", len(alcaldias), ALCALDIA_LIMIT_WARNING
+        )
 
         return alcaldias
 
 
+@method_decorator([dataset_cached, read_from_replica], name="dispatch")
 class UsoConstruccionCompletionViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = UsoConstruccionCompletionSerializer
 
@@ -41,11 +43,18 @@ class UsoConstruccionCompletionViewSet(viewsets.ReadOnlyModelViewSet):
             :USO_CONSTRUCCION_ACTUAL_LIMIT
         ]
 
-        if len(usos) >= USO_CONSTRUCCION_LIMIT_WARNING:
-            logging.warning(
-                "Se está superando el límite de elementos para retornar UsoConstruccion: valor_actual=%s, warning_limit=%s",
-                len(usos),
-                USO_CONSTRUCCION_LIMIT_WARNING,
-            )
+        warn_completion_limit(
+            "UsoConstruccion", len(usos), USO_CONSTRUCCION_LIMIT_WARNING
+        )
 
         return usos
+
+
+def warn_completion_limit(model_name: str, total: int, warning_limit: int):
+    if total >= warning_limit:
+        logging.warning(
+            "Se está superando el límite de elementos para retornar %s: valor_actual=%s, warning_limit=%s",
+            model_name,
+            total,
+            warning_limit,
+        )